@@ -1,19 +1,123 @@
 import re
 import os
-import emoji
 
-
-url_pattern = (
-    r"(?i)\b(?:[a-z][\w-]+:(?:/{1,3}|[a-z0-9%])|www\d{0,3}[.]|[a-z0-9.\-]+[.]"
-    r"[a-z]{2,4}/)(?:[^\s()<>\|]+|\([^\s()<>\|]+|\([^\s()<>\|]+\)*\))+(?:\([^"
-    r"""\s()<>\|]+|\([^\s()<>\|]+\)*\)|[^\s`!()\[\]{};:'".,<>\|?«»“”‘’])"""
+from markslack import tokens, urls
+from markslack.cache import LRUCache
+from markslack.links import LinkTemplates
+from markslack.stats import Recorder, timer
+from markslack.patterns import LazyPattern
+from markslack.patterns import url_pattern, emoji_pattern  # noqa: F401
+
+_emoji_re = LazyPattern(emoji_pattern)
+
+_channel_re = LazyPattern(r"<#[a-zA-Z0-9-]+\|(.+?)>")
+_announcement_re = LazyPattern(r"<\!(.+?)>")
+
+_url_wrapped_named_re = LazyPattern(r"<~([^~]+)~\|(.+)>")
+_url_wrapped_re = LazyPattern(r"<~([^~]+)~>")
+_markdown_link_re = LazyPattern(r"\[(.+)\]\((.+)\)")
+
+_user_re = LazyPattern(r"<@(.+?)>")
+_user_bare_re = LazyPattern(r"<(@.+?)>")
+
+_pair_pattern = r"(?<![\\|a-zA-Z0-9])\{0}(.+?)(?<!\\)\{0}(?![a-zA-Z0-9])"
+_bold_re = LazyPattern(_pair_pattern.format("*"))
+_italic_re = LazyPattern(_pair_pattern.format("_"))
+_strike_re = LazyPattern(_pair_pattern.format("~"))
+_asterisk_re = LazyPattern(r"(?<![\|\\])\*")
+_placeholder_re = LazyPattern(r"\|\*")
+_word_start_re = LazyPattern(r"\w", re.U)
+
+_bullet_word_re = LazyPattern(u"•([a-zA-Z0-9])")
+_bullet_space_re = LazyPattern(u"•(\\s)")
+
+_CONFIG = (
+    "markslack_links",
+    "replace_emoji",
+    "remove_bad_emoji",
+    "link_templates",
+    "user_templates",
+    "image_template",
+    "image_extensions",
+    "engine",
+    "cache_size",
+    "instrument",
+    "max_length",
+    "time_limit",
+    "fallback",
 )
 
+# The regex engine's stages, in the order Converter.convert runs them.
+STAGES = (
+    "mark_emoji",
+    "mark_image",
+    "mark_channel",
+    "mark_announcements",
+    "mark_named_hyperlink",
+    "mark_unnamed_hyperlink",
+    "mark_user",
+    "mark_emphasis",
+    "mark_strikethrough",
+    "mark_bullet",
+)
 
-emoji_pattern = u":[a-zA-Z0-9\+\-_&.ô’Åéãíç()!#*]+:"
-
+# The characters each stage needs to find in a message to have anything
+# to do. A message with none of them is already Markdown.
+_STAGE_TRIGGERS = {
+    "mark_emoji": u":",
+    "mark_image": u"<",
+    "mark_channel": u"<",
+    "mark_announcements": u"<",
+    "mark_named_hyperlink": u"<",
+    "mark_unnamed_hyperlink": u"<",
+    "mark_user": u"<",
+    "mark_emphasis": u"*_",
+    "mark_strikethrough": u"~",
+    "mark_bullet": u"•",
+}
+_TRIGGERS = frozenset(u"".join(_STAGE_TRIGGERS.values()) + u"[")
+
+
+def _triggers(text):
+    # A substring test per trigger is much faster than building a set
+    # of the text's characters.
+    return frozenset([char for char in _TRIGGERS if char in text])
+
+
+ENGINES = ("regex", "tokens")
+
+# Cheaper ways to convert messages over a converter's limits. See
+# markslack.budget.
+FALLBACKS = ("basic", "escape")
+
+
+class Converter(object):
+    """
+    A compiled, immutable MarkSlack configuration.
+
+    Every pattern and template a configuration needs is built once, when
+    the converter is created, so converting a message does no regex
+    compilation. Converters can't be modified after they're built and are
+    picklable, so one can be shared freely or shipped to other processes.
+    A converter built with a cache_size also keeps a bounded LRU cache of
+    its results, and one built with instrument set records per-stage
+    timings and counts. One built with max_length or time_limit counts
+    the messages it converts with its fallback instead.
+
+    Converting a message runs only the stages whose trigger characters
+    it contains.
+
+    Use ``MarkSlack.compile()`` to build one.
+    """
+
+    __slots__ = _CONFIG + (
+        "image_re",
+        "plan",
+        "cache",
+        "recorder",
+        "fallbacks",
+    )
 
-class MarkSlack(object):
     def __init__(
         self,
         markslack_links=True,
@@ -22,30 +126,129 @@ class MarkSlack(object):
         link_templates=None,
         user_templates=None,
         image_template=None,
-        image_extensions=[".jpg", ".png"],
+        image_extensions=(".jpg", ".png"),
+        engine="regex",
+        cache_size=None,
+        instrument=False,
+        max_length=None,
+        time_limit=None,
+        fallback="basic",
     ):
-        self.user_templates = user_templates
-        self.markslack_links = markslack_links
-        self.replace_emoji = replace_emoji
-        self.remove_bad_emoji = remove_bad_emoji
-        self.image_extensions = image_extensions
-        self.image_template = image_template
-        self.link_templates = link_templates
+        if engine not in ENGINES:
+            raise ValueError(
+                "engine must be one of {0}, not {1!r}".format(ENGINES, engine)
+            )
+        if fallback not in FALLBACKS:
+            raise ValueError(
+                "fallback must be one of {0}, not {1!r}".format(
+                    FALLBACKS, fallback
+                )
+            )
+        init = super(Converter, self).__setattr__
+        init("markslack_links", markslack_links)
+        init("replace_emoji", replace_emoji)
+        init("remove_bad_emoji", remove_bad_emoji)
+        init(
+            "link_templates",
+            LinkTemplates(link_templates) if link_templates else None,
+        )
+        # User templates are only looked up, so the caller's dictionary
+        # or UserDirectory is kept rather than copied, and changes to it
+        # apply to messages converted afterwards.
+        init("user_templates", user_templates)
+        init("image_template", image_template)
+        init("image_extensions", tuple(image_extensions))
+        init("engine", engine)
+        init("cache_size", cache_size)
+        # The cache is the one piece of mutable state a converter holds.
+        # It is never pickled; each copy starts with an empty cache.
+        init("cache", LRUCache(cache_size) if cache_size else None)
+        init("instrument", instrument)
+        # Like the cache, recorded stats stay with this copy.
+        init(
+            "recorder",
+            Recorder(None if instrument is True else instrument)
+            if instrument
+            else None,
+        )
+        init("max_length", max_length)
+        init("time_limit", time_limit)
+        init("fallback", fallback)
+        fallbacks = None
+        if max_length is not None or time_limit is not None:
+            from markslack import budget
 
-    def mark_emoji(self):
-        if self.replace_emoji:
-            self.marked = emoji.emojize(self.marked, use_aliases=True)
+            # Like the cache, fallback counts stay with this copy.
+            fallbacks = budget.Fallbacks()
+        init("fallbacks", fallbacks)
 
-        if self.remove_bad_emoji:
-            # Emojis at the end of text
-            p1 = re.compile(u"(\s*)((?:{0})+)(\s*|\.*)$".format(emoji_pattern))
-            self.marked = p1.sub(r"\3", self.marked)
+        regex_ext = "|".join([s[1:] for s in self.image_extensions])
+        init("image_re", re.compile(u"<(.*\\.(?:{0}))>".format(regex_ext)))
+        init("plan", self._plan())
+
+    def _plan(self):
+        """
+        Pair each stage this configuration can use with the characters
+        that trigger it.
+        """
+        plan = []
+        for stage in STAGES:
+            triggers = _STAGE_TRIGGERS[stage]
+            if stage == "mark_emoji" and not (
+                self.replace_emoji or self.remove_bad_emoji
+            ):
+                continue
+            if stage == "mark_named_hyperlink" and self.link_templates:
+                # Templates also apply to Markdown links, [name](url).
+                triggers += u"["
+            plan.append((stage, frozenset(triggers)))
+        return tuple(plan)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Converter objects are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Converter objects are immutable")
+
+    def __reduce__(self):
+        return (Converter, (), self.__getstate__())
+
+    def __getstate__(self):
+        state = dict((name, getattr(self, name)) for name in _CONFIG)
+        if state["link_templates"] is not None:
+            state["link_templates"] = dict(state["link_templates"].items)
+        return state
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def replace(self, **changes):
+        """
+        Return a new converter with the given options changed. Like a
+        copy, it starts with an empty cache, stats and fallback counts.
+        """
+        state = self.__getstate__()
+        state.update(changes)
+        return Converter(**state)
+
+    def __repr__(self):
+        return "Converter({0})".format(
+            ", ".join(
+                "{0}={1!r}".format(name, value)
+                for name, value in sorted(self.__getstate__().items())
+            )
+        )
 
-            # Emojis throughout text
-            p2 = re.compile(u"(\s*)((?:{0})+)(\s*)".format(emoji_pattern))
-            self.marked = p2.sub(r"\1", self.marked)
+    def _mark_emoji(self, text):
+        if ":" not in text or not (
+            self.replace_emoji or self.remove_bad_emoji
+        ):
+            return text, 0
+        return tokens.emojize_count(
+            text, replace=self.replace_emoji, remove=self.remove_bad_emoji
+        )
 
-    def mark_image(self):
+    def _mark_image(self, text):
         def sub_image(match):
             url = match.group(1)
             extension = os.path.splitext(url)[1]
@@ -55,80 +258,73 @@ class MarkSlack(object):
                 return "![]({0})".format(url)
             return "<{0}>".format(url)
 
-        regex_ext = "|".join([s[1:] for s in self.image_extensions])
-        self.marked = re.sub(
-            "<(.*\.(?:{0}))>".format(regex_ext), sub_image, self.marked
-        )
+        return self.image_re.subn(sub_image, text)
 
-    def mark_channel(self):
-        self.marked = re.sub(r"<#[a-zA-Z0-9-]+\|(.+?)>", r"#\1", self.marked)
+    def _mark_channel(self, text):
+        return _channel_re.subn(r"#\1", text)
 
-    def mark_announcements(self):
-        self.marked = re.sub(
-            r"<\!(.+?)>",
-            r'<span class="slack-announcement">@\1</span>',
-            self.marked,
+    def _mark_announcements(self, text):
+        return _announcement_re.subn(
+            r'<span class="slack-announcement">@\1</span>', text
         )
 
-    def mark_named_hyperlink(self):
+    def template_link(self, url):
+        """
+        Return the rendered link template for a URL, or None if no
+        template key is found in it.
+        """
+        template = self.link_templates.find(url)
+        if template is None:
+            return None
+        return template.format(url)
+
+    def _mark_named_hyperlink(self, text):
         # Wrap All URLs in ~
-        self.marked = re.sub(
-            "<({0})".format(url_pattern), r"<~\1~", self.marked
-        )
+        text = urls.sub(u"~{0}~".format, urls.opened(text), text)[0]
 
         # If a URL name follows a ~-wrapped URL, replace the URL and name
         # with markdown
-        self.marked = re.sub("<~([^~]+)~\|(.+)>", r"[\2](\1)", self.marked)
+        text, count = _url_wrapped_named_re.subn(r"[\2](\1)", text)
 
         # If a URL has no name, remove the ~ wraps
-        self.marked = re.sub("<~([^~]+)~>", r"<\1>", self.marked)
+        text = _url_wrapped_re.sub(r"<\1>", text)
 
         # Markslack links use a markdown-like syntax
         # to allow users to create named hyperlinks.
         # e.g., [my name]<http://...>
         if self.markslack_links:
-            self.marked = re.sub(
-                "\[([\w ']+?)\]<({0})>".format(url_pattern),
-                r"[\1](\2)",
-                self.marked,
+            text, marked = urls.sub(
+                u"[{0}]({1})".format, urls.labelled(text), text
             )
+            count += marked
 
         # Handle Link Templates
         if self.link_templates:
 
             def sub_link(match):
-                link_keys = list(self.link_templates.keys())
                 name = match.group(1)
                 url = match.group(2)
-                for key in link_keys:
-                    if key in url:
-                        return self.link_templates[key].format(url)
+                templated = self.template_link(url)
+                if templated is not None:
+                    return templated
                 return "[{0}]({1})".format(name, url)
 
-            self.marked = re.sub(
-                "\[(.+)\]\((.+)\)".format(url_pattern), sub_link, self.marked
-            )
+            text = _markdown_link_re.sub(sub_link, text)
+        return text, count
 
-    def mark_unnamed_hyperlink(self):
+    def _mark_unnamed_hyperlink(self, text):
         if not self.link_templates:
-            self.marked = re.sub(
-                "<({0})>".format(url_pattern), r"[\1](\1)", self.marked
-            )
-            return
+            return urls.sub(u"[{0}]({0})".format, urls.bracketed(text), text)
 
-        def sub_link(match):
-            link_keys = list(self.link_templates.keys())
-            url = match.group(1)
-            for key in link_keys:
-                if key in url:
-                    return self.link_templates[key].format(url)
+        def sub_link(url):
+            templated = self.template_link(url)
+            if templated is not None:
+                return templated
             return "[{0}]({0})".format(url)
 
-        self.marked = re.sub(
-            "<({0})>".format(url_pattern), sub_link, self.marked
-        )
+        return urls.sub(sub_link, urls.bracketed(text), text)
 
-    def mark_emphasis(self):
+    def _mark_emphasis(self, text):
         """
         Mark bold and italic text.
 
@@ -139,60 +335,529 @@ class MarkSlack(object):
         remaining underscores and asterisks. Finally, we replace the
         placeholders with asterisks.
         """
-        # Pattern catches matched pairs
-        regex = r"(?<![\\|a-zA-Z0-9])\{0}(.+?)(?<!\\)\{0}(?![a-zA-Z0-9])"
+        text, count = self._mark_pairs(text)
+        lines = urls.split(text)
+        for i, line in enumerate(lines):
+            # Every other piece is a URL, and one starting on a word
+            # character is still a URL on its own.
+            if i % 2 and _word_start_re.match(line):
+                continue
+            if urls.search(line) is None and not _emoji_re.search(line):
+                count += line.count("_")
+                lines[i] = line.replace("_", "\\_")
+        text = "".join(lines)
+        # Replace matched pair placeholders
+        return _placeholder_re.sub("*", text), count
+
+    def _mark_pairs(self, text):
         # Replace bold paired asterisks with placeholder
-        self.marked = re.sub(regex.format("*"), r"|*|*\1|*|*", self.marked)
+        text, bold = _bold_re.subn(r"|*|*\1|*|*", text)
         # Replace italic paired underscores with placeholder
-        self.marked = re.sub(regex.format("_"), r"|*\1|*", self.marked)
+        text, italic = _italic_re.subn(r"|*\1|*", text)
 
         # Escape unmatched, unescaped asterisks
-        self.marked = re.sub(r"(?<![\|\\])\*", "\*", self.marked)
-
-        self.marked = "".join(
-            [
-                re.sub(r"\_", "\_", line)
-                if not re.search(url_pattern, line)
-                and not re.search(emoji_pattern, line)
-                else line
-                for line in re.split("({0})".format(url_pattern), self.marked)
-            ]
-        )
-        # Replace matched pair placeholders
-        self.marked = re.sub(r"\|\*", "*", self.marked)
-
-    def mark_strikethrough(self):
-        regex = r"(?<![\\|a-zA-Z0-9])\~(.+?)(?<!\\)\~(?![a-zA-Z0-9])"
-        self.marked = re.sub(regex, r"~~\1~~", self.marked)
+        text, escaped = _asterisk_re.subn(r"\*", text)
+        return text, bold + italic + escaped
 
-    def mark_bullet(self):
+    def breaks(self, line):
+        """
+        Return whether a line has a URL that mark_emphasis splits the
+        text at, which ends the stretch of text whose unmatched
+        underscores are escaped together.
+        """
+        if self.engine == "tokens":
+            return tokens.breaks(self, line)
+        for stage in STAGES:
+            if stage == "mark_emphasis":
+                break
+            line = getattr(self, "_" + stage)(line)[0]
+        return urls.search(self._mark_pairs(line)[0]) is not None
+
+    def _mark_strikethrough(self, text):
+        return _strike_re.subn(r"~~\1~~", text)
+
+    def _mark_bullet(self, text):
         # Add whitespace if none
-        self.marked = re.sub(r"•([a-zA-Z0-9])", r"+ \1", self.marked)
+        text, count = _bullet_word_re.subn(r"+ \1", text)
         # Preserve whitespace
-        self.marked = re.sub(r"•(\s)", r"+\1", self.marked)
+        text, spaced = _bullet_space_re.subn(r"+\1", text)
+        return text, count + spaced
+
+    def _mark_user(self, text):
+        if not self.user_templates:
+            return _user_bare_re.subn(r"\1", text)
 
-    def mark_user(self):
         def sub_user(match):
             return self.user_templates.get(
                 match.group(1), "@{0}".format(match.group(1))
             )
 
-        if self.user_templates:
-            self.marked = re.sub(r"<@(.+?)>", sub_user, self.marked)
-        else:
-            self.marked = re.sub(r"<(@.+?)>", r"\1", self.marked)
+        return _user_re.subn(sub_user, text)
+
+    def mark_emoji(self, text):
+        return self._mark_emoji(text)[0]
+
+    def mark_image(self, text):
+        return self._mark_image(text)[0]
+
+    def mark_channel(self, text):
+        return self._mark_channel(text)[0]
+
+    def mark_announcements(self, text):
+        return self._mark_announcements(text)[0]
+
+    def mark_named_hyperlink(self, text):
+        return self._mark_named_hyperlink(text)[0]
+
+    def mark_unnamed_hyperlink(self, text):
+        return self._mark_unnamed_hyperlink(text)[0]
+
+    def mark_emphasis(self, text):
+        return self._mark_emphasis(text)[0]
+
+    def mark_strikethrough(self, text):
+        return self._mark_strikethrough(text)[0]
+
+    def mark_bullet(self, text):
+        return self._mark_bullet(text)[0]
+
+    def mark_user(self, text):
+        return self._mark_user(text)[0]
+
+    def cache_info(self):
+        """
+        Return hit, miss and eviction counts for the result cache, or
+        None if caching is off.
+        """
+        if self.cache is None:
+            return None
+        return self.cache.info()
+
+    def stats(self):
+        """
+        Return a dictionary of StageStats (calls, seconds, substitutions)
+        keyed by stage, or None if instrumentation is off.
+        """
+        if self.recorder is None:
+            return None
+        return self.recorder.snapshot()
+
+    def reset_stats(self):
+        if self.recorder is not None:
+            self.recorder.reset()
+
+    def fallback_info(self):
+        """
+        Return counts of the messages converted with the fallback, by
+        the limit they went over, or None if there are no limits.
+        """
+        if self.fallbacks is None:
+            return None
+        return self.fallbacks.info()
+
+    def _fall_back(self, slack, limit, lexed=None):
+        from markslack import budget
+
+        start = timer()
+        marked = budget.fallback(self, slack, lexed)
+        self.fallbacks.record(limit)
+        if self.recorder is not None:
+            self.recorder.record("fallback", timer() - start, 0)
+        return marked, False
 
     def mark(self, slack):
-        self.slack = slack
-        self.marked = slack
-        self.mark_emoji()
-        self.mark_image()
-        self.mark_channel()
-        self.mark_announcements()
-        self.mark_named_hyperlink()
-        self.mark_unnamed_hyperlink()
-        self.mark_user()
-        self.mark_emphasis()
-        self.mark_strikethrough()
-        self.mark_bullet()
-        return self.marked
+        if self.cache is None:
+            return self._convert(slack)[0]
+        marked = self.cache.get(slack)
+        if marked is None:
+            marked, full = self._convert(slack)
+            # Fallback output isn't cached, so a message that ran out of
+            # time once is converted in full the next time.
+            if full:
+                self.cache.put(slack, marked)
+        return marked
+
+    def mark_result(self, slack):
+        """
+        Return the Markdown for a message, as mark() does, and whether it
+        was converted in full rather than with the fallback. Keep the
+        Markdown only if it was, as the result cache does.
+        """
+        if self.cache is None:
+            return self._convert(slack)
+        marked = self.cache.get(slack)
+        if marked is not None:
+            return marked, True
+        marked, full = self._convert(slack)
+        if full:
+            self.cache.put(slack, marked)
+        return marked, full
+
+    def convert(self, slack):
+        """
+        Convert a message, bypassing the result cache.
+        """
+        return self._convert(slack)[0]
+
+    def _convert(self, slack):
+        """
+        Return the Markdown for a message and whether it was converted
+        in full rather than with the fallback.
+        """
+        deadline = None
+        if self.fallbacks is not None:
+            if self.max_length is not None and len(slack) > self.max_length:
+                return self._fall_back(slack, "length")
+            if self.time_limit is not None:
+                deadline = timer() + self.time_limit
+        present = _triggers(slack)
+        if not present:
+            return slack, True
+        if self.engine == "tokens":
+            lexed = tokens.prepare(self, slack, self.recorder)
+            if deadline is not None and timer() > deadline:
+                # The fallback renders what's been lexed, not lex again.
+                return self._fall_back(slack, "time", lexed)
+            return tokens.finish(lexed, self.recorder), True
+        record = None if self.recorder is None else self.recorder.record
+        marked = slack
+        for stage, triggers in self.plan:
+            if present.isdisjoint(triggers):
+                continue
+            # A stage that finishes late is kept, but none starts late.
+            if deadline is not None and timer() > deadline:
+                return self._fall_back(slack, "time")
+            if record is None:
+                text = getattr(self, "_" + stage)(marked)[0]
+            else:
+                start = timer()
+                text, count = getattr(self, "_" + stage)(marked)
+                record(stage, timer() - start, count)
+            # Templates and Markdown can bring in new trigger characters.
+            if text != marked:
+                present = _triggers(text)
+            marked = text
+        return marked, True
+
+    def prefetch(self, messages):
+        """
+        Resolve the users mentioned in messages in one lookup, if
+        user_templates is a markslack.users.UserDirectory.
+        """
+        prefetch = getattr(self.user_templates, "prefetch", None)
+        if prefetch is not None:
+            from markslack import users
+
+            prefetch(users.mentions(messages))
+
+    def parse(self, slack):
+        """
+        Parse a message into a list of nodes. See markslack.nodes.
+
+        Parsing is done by the tokens engine, whatever engine is set, so
+        nodes.to_markdown() gives what mark() gives with engine="tokens".
+        With the regex engine, mark() can differ; see markslack.tokens.
+        """
+        return tokens.parse(self, slack)
+
+    def extract(self, slack):
+        """
+        Convert a message and collect its entities. See
+        markslack.entities.extract.
+        """
+        from markslack import entities
+
+        return entities.extract(self, slack)
+
+    def mark_blocks(self, blocks):
+        """
+        Render Block Kit rich_text blocks. See markslack.blockkit.render.
+        """
+        # Modules for optional features are imported on first use, to keep
+        # `import markslack` fast.
+        from markslack import blockkit
+
+        return blockkit.render(self, blocks)
+
+    def mark_stream(self, source, output, chunksize=256):
+        """
+        Convert text from source to output a line at a time. See
+        markslack.stream.mark_stream.
+        """
+        from markslack import stream
+
+        stream.mark_stream(self, source, output, chunksize)
+
+    def remark(self, old_source, old_output, new_source):
+        """
+        Convert an edited message, reusing the output for the lines the
+        edit can't change. See markslack.incremental.remark.
+        """
+        from markslack import incremental
+
+        return incremental.remark(self, old_source, old_output, new_source)
+
+    def amark(self, text, executor=None):
+        """
+        Convert a message from asyncio code. See markslack.aio.amark.
+        """
+        # Imported here, since markslack.aio needs Python 3.5.
+        from markslack import aio
+
+        return aio.amark(self, text, executor)
+
+    def amark_many(self, messages, concurrency=4, executor=None):
+        """
+        Convert messages from asyncio code. See
+        markslack.aio.AsyncConverter.mark_many.
+        """
+        from markslack import aio
+
+        marker = aio.AsyncConverter(self, concurrency, executor)
+        return marker.mark_many(messages)
+
+    def mark_many(
+        self, messages, workers=None, chunksize=64, ordered=True, dedup=None
+    ):
+        """
+        Convert an iterable of messages across worker processes. See
+        markslack.batch.mark_many.
+        """
+        from markslack import batch
+
+        return batch.mark_many(
+            self, messages, workers, chunksize, ordered, dedup
+        )
+
+
+class MarkSlack(object):
+    def __init__(
+        self,
+        markslack_links=True,
+        replace_emoji=True,
+        remove_bad_emoji=False,
+        link_templates=None,
+        user_templates=None,
+        image_template=None,
+        image_extensions=[".jpg", ".png"],
+        engine="regex",
+        cache_size=None,
+        instrument=False,
+        max_length=None,
+        time_limit=None,
+        fallback="basic",
+    ):
+        self.user_templates = user_templates
+        self.markslack_links = markslack_links
+        self.replace_emoji = replace_emoji
+        self.remove_bad_emoji = remove_bad_emoji
+        self.image_extensions = image_extensions
+        self.image_template = image_template
+        self.link_templates = link_templates
+        self.engine = engine
+        self.cache_size = cache_size
+        self.instrument = instrument
+        self.max_length = max_length
+        self.time_limit = time_limit
+        self.fallback = fallback
+        self._converter = self.compile()
+
+    def __setattr__(self, name, value):
+        super(MarkSlack, self).__setattr__(name, value)
+        # Changing any option invalidates the compiled converter.
+        if name in _CONFIG:
+            super(MarkSlack, self).__setattr__("_converter", None)
+
+    @property
+    def converter(self):
+        """
+        The compiled Converter for the current configuration, rebuilt
+        after any option is reassigned or recompile() is called.
+        """
+        converter = self._converter
+        if converter is None:
+            # Racing threads may each compile, but they build identical
+            # converters, so whichever is stored last is fine.
+            converter = self._converter = self.compile()
+        return converter
+
+    def recompile(self):
+        """
+        Rebuild the converter, for instance after link_templates is
+        changed in place. This also empties its cache and stats.
+        """
+        super(MarkSlack, self).__setattr__("_converter", None)
+
+    def compile(self):
+        """
+        Build an immutable, picklable Converter from this configuration.
+        It shares the user_templates dictionary, but later in-place
+        changes to link_templates don't affect it.
+        """
+        config = dict((name, getattr(self, name)) for name in _CONFIG)
+        return Converter(**config)
+
+    def mark_emoji(self, text):
+        return self.converter.mark_emoji(text)
+
+    def mark_image(self, text):
+        return self.converter.mark_image(text)
+
+    def mark_channel(self, text):
+        return self.converter.mark_channel(text)
+
+    def mark_announcements(self, text):
+        return self.converter.mark_announcements(text)
+
+    def mark_named_hyperlink(self, text):
+        return self.converter.mark_named_hyperlink(text)
+
+    def mark_unnamed_hyperlink(self, text):
+        return self.converter.mark_unnamed_hyperlink(text)
+
+    def mark_emphasis(self, text):
+        return self.converter.mark_emphasis(text)
+
+    def mark_strikethrough(self, text):
+        return self.converter.mark_strikethrough(text)
+
+    def mark_bullet(self, text):
+        return self.converter.mark_bullet(text)
+
+    def mark_user(self, text):
+        return self.converter.mark_user(text)
+
+    def cache_info(self):
+        """
+        Return hit, miss and eviction counts for the result cache, or
+        None if caching is off.
+        """
+        return self.converter.cache_info()
+
+    def stats(self):
+        """
+        Return a dictionary of StageStats (calls, seconds, substitutions)
+        keyed by stage, or None if instrumentation is off. Stats start
+        over when an option is reassigned.
+        """
+        return self.converter.stats()
+
+    def reset_stats(self):
+        self.converter.reset_stats()
+
+    def fallback_info(self):
+        """
+        Return how many messages went over max_length or time_limit and
+        were converted with the fallback, or None if there are no
+        limits. Counts start over when an option is reassigned.
+        """
+        return self.converter.fallback_info()
+
+    def mark(self, slack):
+        """
+        Convert a Slack message to Markdown.
+
+        All working state is local to the call, so one MarkSlack can be
+        shared by any number of threads.
+        """
+        return self.converter.mark(slack)
+
+    def prefetch(self, messages):
+        """
+        Look up the users mentioned in an iterable of messages in one
+        call to the resolver, when user_templates is a UserDirectory, so
+        converting them doesn't look users up one at a time. mark_many,
+        convert_export and the command line do this for each chunk.
+        """
+        self.converter.prefetch(messages)
+
+    def parse(self, slack):
+        """
+        Parse a Slack message once into a list of nodes, which the
+        renderers in markslack.nodes turn into Markdown, HTML or plain
+        text.
+
+        The nodes come from the tokens engine, whatever engine is set.
+        Their Markdown is what mark() gives with engine="tokens", so set
+        that engine if you mix parse() with mark(). The default regex
+        engine can differ on some messages; see the README's Engines
+        section.
+        """
+        return self.converter.parse(slack)
+
+    def extract(self, slack):
+        """
+        Convert a Slack message and, in the same pass, collect the users,
+        channels, links, URLs, images and emoji in it with their offsets.
+        Returns an Extraction of the Markdown and the list of entities.
+        """
+        return self.converter.extract(slack)
+
+    def mark_blocks(self, blocks):
+        """
+        Convert a message's Block Kit ``blocks`` to Markdown. Its
+        rich_text blocks are rendered directly, without parsing mrkdwn,
+        and blocks of other types are skipped.
+        """
+        return self.converter.mark_blocks(blocks)
+
+    def mark_stream(self, source, output, chunksize=256):
+        """
+        Convert a document too large to hold in memory, reading Slack
+        text from source, a file-like object or iterable of lines, and
+        writing Markdown to output as it goes. The Markdown is the
+        tokens engine's, whatever engine is set.
+        """
+        self.converter.mark_stream(source, output, chunksize)
+
+    def remark(self, old_source, old_output, new_source):
+        """
+        Convert new_source, an edit of old_source, to Markdown, given
+        old_output, the Markdown for old_source. Only the lines around
+        the edit are converted again.
+        """
+        return self.converter.remark(old_source, old_output, new_source)
+
+    def amark(self, text, executor=None):
+        """
+        Convert a message from asyncio code: ``await marker.amark(text)``.
+        Long messages are converted in executor, the event loop's default
+        executor if None, so they don't block the loop. Each loop converts
+        at most markslack.aio.CONCURRENCY of them at once.
+        """
+        return self.converter.amark(text, executor)
+
+    def amark_many(self, messages, concurrency=4, executor=None):
+        """
+        Convert an iterable or async iterable of messages from asyncio
+        code, yielding Markdown in input order with ``async for``. At most
+        concurrency messages are read ahead and converted at once.
+        """
+        return self.converter.amark_many(messages, concurrency, executor)
+
+    def mark_many(
+        self, messages, workers=None, chunksize=64, ordered=True, dedup=None
+    ):
+        """
+        Convert an iterable of messages across worker processes, yielding
+        Markdown in input order or, if ordered is False, (index, markdown)
+        pairs as they finish. The compiled converter is sent to each
+        worker once. Pass a markslack.dedup.Deduplicator as dedup to
+        convert repeated messages once.
+        """
+        return self.converter.mark_many(
+            messages, workers, chunksize, ordered, dedup
+        )
+
+
+def convert_export(
+    marker, archive, output, format="jsonl", workers=1, dedup=None
+):
+    """
+    Convert a Slack export archive. See markslack.export.convert_export.
+    """
+    from markslack import export
+
+    return export.convert_export(
+        marker, archive, output, format, workers, dedup
+    )
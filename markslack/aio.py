@@ -0,0 +1,150 @@
+"""
+Convert messages from asyncio code without blocking the event loop.
+
+Short messages convert in well under a millisecond, faster than handing
+them to another thread, so they are converted inline. Longer ones are
+sent to an executor. Requires Python 3.5 or later.
+"""
+import asyncio
+import collections
+import weakref
+
+try:
+    _running_loop = asyncio.get_running_loop
+except AttributeError:  # Python < 3.7
+    _running_loop = asyncio.get_event_loop
+
+_END = object()
+
+# Messages with fewer characters than this are converted on the event
+# loop. At this length, conversion takes about a millisecond.
+INLINE_LIMIT = 2000
+
+# Long messages that amark() has in the executor at once, per event loop.
+CONCURRENCY = 4
+
+_semaphores = weakref.WeakKeyDictionary()
+
+
+async def amark(converter, text, executor=None, inline_limit=INLINE_LIMIT):
+    """
+    Convert text with converter, in executor if text is at least
+    inline_limit characters long. executor defaults to the event loop's
+    default executor. Each event loop sends at most CONCURRENCY messages
+    to executors at once; later callers wait for a turn.
+    """
+    if len(text) < inline_limit:
+        return converter.mark(text)
+    loop = _running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(CONCURRENCY)
+    async with semaphore:
+        return await _run(loop, converter, text, executor)
+
+
+async def _run(loop, converter, text, executor):
+    return await loop.run_in_executor(executor, converter.mark, text)
+
+
+class AsyncConverter(object):
+    """
+    Convert messages from asyncio code with at most concurrency long
+    messages in the executor at once. Callers past the limit wait for
+    a turn rather than queueing more work in the executor.
+
+    Use one AsyncConverter with one event loop.
+    """
+
+    def __init__(
+        self,
+        converter,
+        concurrency=CONCURRENCY,
+        executor=None,
+        inline_limit=INLINE_LIMIT,
+    ):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.converter = converter
+        self.concurrency = concurrency
+        self.executor = executor
+        self.inline_limit = inline_limit
+        self._semaphore = None
+
+    async def mark(self, text):
+        if len(text) < self.inline_limit:
+            return self.converter.mark(text)
+        if self._semaphore is None:
+            # Made here so it belongs to the running loop.
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            return await _run(
+                _running_loop(), self.converter, text, self.executor
+            )
+
+    def mark_many(self, messages):
+        """
+        Return an async iterator of Markdown for messages, an iterable or
+        async iterable, in input order. No more than concurrency
+        messages are read ahead of the one being yielded.
+        """
+        return _Batch(self, messages)
+
+
+class _Batch(object):
+    def __init__(self, marker, messages):
+        self._marker = marker
+        if hasattr(messages, "__aiter__"):
+            self._messages = messages.__aiter__()
+            self._sync = False
+        else:
+            self._messages = iter(messages)
+            self._sync = True
+        self._pending = collections.deque()
+        self._exhausted = False
+
+    def __aiter__(self):
+        return self
+
+    async def _read(self):
+        if self._sync:
+            return next(self._messages, _END)
+        try:
+            return await self._messages.__anext__()
+        except StopAsyncIteration:
+            return _END
+
+    async def __anext__(self):
+        while (
+            not self._exhausted
+            and len(self._pending) < self._marker.concurrency
+        ):
+            message = await self._read()
+            if message is _END:
+                self._exhausted = True
+                break
+            self._pending.append(
+                asyncio.ensure_future(self._marker.mark(message))
+            )
+        if not self._pending:
+            raise StopAsyncIteration
+        try:
+            return await self._pending.popleft()
+        except BaseException:
+            self._drop()
+            raise
+
+    def _drop(self):
+        # Cancel what is still running and retrieve errors from what has
+        # finished, so asyncio doesn't report them as never retrieved.
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.cancel() and not future.cancelled():
+                future.exception()
+        self._exhausted = True
+
+    async def aclose(self):
+        """
+        Cancel conversions that have started but not been yielded.
+        """
+        self._drop()
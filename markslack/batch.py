@@ -0,0 +1,210 @@
+"""
+Convert large collections of messages across processes.
+"""
+import multiprocessing
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+# Chunks per worker submitted to a pool and not yet consumed. More keep
+# the workers busy; fewer bound what a slow consumer leaves in memory.
+IN_FLIGHT = 2
+
+# Each worker process holds its own copy of the converter, sent once by
+# the pool initializer rather than pickled along with every message.
+_converter = None
+
+
+def _init_worker(converter):
+    global _converter
+    _converter = converter
+
+
+def worker_pool(converter, workers):
+    """
+    Return a process pool whose workers each hold a copy of converter.
+    """
+    return multiprocessing.Pool(
+        workers, initializer=_init_worker, initargs=(converter,)
+    )
+
+
+def worker_converter():
+    """
+    Return the converter held by the current worker process.
+    """
+    return _converter
+
+
+def chunks(iterable, size):
+    """
+    Yield lists of up to size items from iterable.
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def read_ahead(converter, chunksize):
+    """
+    Return how many messages to read before converting any of them in
+    this process: chunksize if the users they mention are looked up in
+    bulk, or else one, so messages stream through.
+    """
+    if hasattr(converter.user_templates, "prefetch"):
+        return chunksize
+    return 1
+
+
+def _call(func, item):
+    # Errors come back as values, so every submission calls back.
+    try:
+        return True, func(item)
+    except Exception as error:
+        return False, error
+
+
+def imap(pool, func, items, workers, ordered=True):
+    """
+    Yield func(item) for each of items, computed in pool, in order or,
+    if ordered is False, as (index, result) pairs as each finishes.
+
+    Unlike pool.imap, which reads items as fast as the workers take
+    them, at most IN_FLIGHT items per worker are submitted and not yet
+    yielded, so a slow consumer holds back reading instead of piling up
+    results in memory.
+    """
+    limit = workers * IN_FLIGHT
+    items = iter(items)
+    finished = queue.Queue()
+    # Results that finished ahead of the next one due, when ordered.
+    early = {}
+    submitted = 0
+    consumed = 0
+    exhausted = False
+    while True:
+        while not exhausted and submitted - consumed < limit:
+            try:
+                item = next(items)
+            except StopIteration:
+                exhausted = True
+                break
+            pool.apply_async(
+                _call,
+                (func, item),
+                callback=lambda result, index=submitted: finished.put(
+                    (index, result)
+                ),
+            )
+            submitted += 1
+        if consumed == submitted:
+            return
+        index, (ok, value) = finished.get()
+        if not ok:
+            raise value
+        if not ordered:
+            consumed += 1
+            yield index, value
+            continue
+        early[index] = value
+        while consumed in early:
+            value = early.pop(consumed)
+            consumed += 1
+            yield value
+
+
+def _mark_chunk(messages):
+    _converter.prefetch(messages)
+    return [_converter.mark(message) for message in messages]
+
+
+def _mark_chunk_results(messages):
+    _converter.prefetch(messages)
+    return [_converter.mark_result(message) for message in messages]
+
+
+def _deduplicated(converter, pool, workers, batches, ordered, dedup):
+    """
+    Yield the Markdown for each chunk of mark_many's messages, as imap
+    does, sending the workers only the messages in each chunk that
+    dedup hasn't converted or sent already.
+    """
+    pending = {}
+
+    def jobs():
+        for number, chunk in enumerate(batches):
+            keys, new = dedup.claim(chunk)
+            pending[number] = (chunk, keys, new)
+            yield new
+
+    # imap numbers chunks in the order it reads them from jobs().
+    results = imap(pool, _mark_chunk_results, jobs(), workers, ordered)
+    if ordered:
+        results = enumerate(results)
+    for number, converted in results:
+        chunk, keys, new = pending.pop(number)
+        fallbacks = dedup.store(new, converted)
+        markdown = dedup.resolve(converter, chunk, keys, fallbacks)
+        yield markdown if ordered else (number, markdown)
+
+
+def mark_many(
+    converter, messages, workers=None, chunksize=64, ordered=True, dedup=None
+):
+    """
+    Convert an iterable of messages with a pool of worker processes.
+
+    Yields Markdown in input order or, if ordered is False, (index,
+    markdown) pairs as soon as each chunk finishes. workers defaults to
+    the number of CPUs; with one worker, messages are converted in this
+    process. Messages are read only a few chunks ahead of the results
+    consumed; see imap. The users mentioned in each chunk are resolved
+    together; see Converter.prefetch. Given a markslack.dedup.Deduplicator,
+    each distinct message is converted once and its copies share the
+    result.
+    """
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+
+    if workers <= 1:
+        index = 0
+        for chunk in chunks(messages, read_ahead(converter, chunksize)):
+            converter.prefetch(chunk)
+            for message in chunk:
+                if dedup is None:
+                    markdown = converter.mark(message)
+                else:
+                    markdown = dedup.mark(converter, message)
+                yield markdown if ordered else (index, markdown)
+                index += 1
+        return
+
+    pool = worker_pool(converter, workers)
+    try:
+        batches = chunks(messages, chunksize)
+        if dedup is None:
+            results = imap(pool, _mark_chunk, batches, workers, ordered)
+        else:
+            results = _deduplicated(
+                converter, pool, workers, batches, ordered, dedup
+            )
+        if ordered:
+            for converted in results:
+                for markdown in converted:
+                    yield markdown
+        else:
+            for number, converted in results:
+                start = number * chunksize
+                for offset, markdown in enumerate(converted):
+                    yield start + offset, markdown
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,418 @@
+"""
+Benchmark MarkSlack.mark() on a synthetic Slack corpus.
+
+Run ``python -m markslack.benchmark`` to time every configuration in
+CONFIGURATIONS and print the results as JSON, so runs can be saved and
+compared. See ``--help`` for the corpus options. With ``--adversarial``
+it times the inputs in ADVERSARIAL instead, at growing lengths, to show
+that the time per character stays flat. With ``--imports`` it times
+the statements in IMPORTS, each in a fresh interpreter, to track the
+cold-start cost of importing markslack and converting a first message.
+"""
+import argparse
+import json
+import platform
+import random
+import string
+import subprocess
+import sys
+import timeit
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+from markslack import MarkSlack
+
+
+WORDS = (
+    "the a and of to in is for on that with as at by from this we our "
+    "story editor draft publish update desk breaking election senate "
+    "house vote poll results reporter photo chart live blog deadline "
+    "tonight tomorrow review copy headline sources confirmed statement"
+).split()
+
+EMOJI = (
+    ":thumbsup:",
+    ":+1:",
+    ":slightly_smiling_face:",
+    ":tada:",
+    ":eyes:",
+    ":wave::skin-tone-3:",
+    ":party_parrot:",
+    ":this_is_fine:",
+)
+
+TEMPLATES = {
+    "user_templates": {
+        "U024BE7LH": '<a href="https://staff.example.com/1">Some One</a>',
+        "U0G9QF9C6": '<a href="https://staff.example.com/2">Another</a>',
+    },
+    "link_templates": {
+        "twitter.com": (
+            '<blockquote class="twitter-tweet" data-lang="en">'
+            '<a href="{}"></a></blockquote>'
+        ),
+        "youtube.com": '<iframe src="{}"></iframe>',
+    },
+    "image_template": '<figure><img src="{}"/></figure>',
+}
+
+CONFIGURATIONS = {
+    "default": {},
+    "no_replace_emoji": {"replace_emoji": False},
+    "remove_bad_emoji": {"remove_bad_emoji": True},
+    "no_markslack_links": {"markslack_links": False},
+    "templates": TEMPLATES,
+    "tokens": {"engine": "tokens"},
+    "tokens_templates": dict(TEMPLATES, engine="tokens"),
+}
+
+
+# Inputs that made url_pattern backtrack for seconds or more, keyed by
+# name, as functions of the rough length of message to build.
+# Each input has an underscore or angle bracket, so that the regex engine
+# runs a stage that looks for URLs, rather than returning the text as it
+# is.
+ADVERSARIAL = {
+    "trailing_punctuation": lambda length: (
+        "_ see http://example.com/a" + "." * length + " now"
+    ),
+    "unclosed_parenthesis": lambda length: (
+        "<http://example.com/(a" + "!" * length + ">"
+    ),
+    "closed_parentheses": lambda length: (
+        "_ http://example.com/"
+        + "(a)" * (length // 6)
+        + "!" * (length // 2)
+    ),
+    "dotted_word": lambda length: "_ " + "a." * (length // 2),
+    "hyphenated_word": lambda length: "_ " + "a-" * (length // 2),
+    "bare_urls": lambda length: (
+        "x_y " + "see http://example.com/page " * (length // 28)
+    ),
+    "nested_parentheses": lambda length: (
+        "_ " + "http://a.com/((a)" * (length // 17)
+    ),
+}
+
+ADVERSARIAL_LENGTHS = (100, 1000, 10000)
+
+
+# Cold-start statements, keyed by name, each timed in a new interpreter.
+IMPORTS = {
+    "import": "import markslack",
+    "first_mark": (
+        "import markslack; markslack.MarkSlack().mark(':wave: *hi* <@U1>')"
+    ),
+    "first_mark_no_emoji": (
+        "import markslack; "
+        "markslack.MarkSlack(replace_emoji=False).mark('*hi* <@U1>')"
+    ),
+}
+
+# Runs a statement and prints how long it took, in seconds.
+_IMPORT_SCRIPT = (
+    "import time\n"
+    "start = time.time()\n"
+    "{0}\n"
+    "print(time.time() - start)\n"
+)
+
+
+def _long_url(rng):
+    query = "".join(
+        rng.choice(string.ascii_letters + string.digits) for _ in range(200)
+    )
+    return "http://site.com?id={0}".format(query)
+
+
+def _emoji(rng):
+    return rng.choice(EMOJI)
+
+
+def _link(rng):
+    story = rng.randint(1, 99999)
+    return rng.choice(
+        (
+            "<https://www.politico.com/story/{0}|a story>",
+            "<https://www.politico.com/story/{0}>",
+            "<https://twitter.com/jack/status/{0}>",
+            "[named link]<https://www.politico.com/story/{0}>",
+            "<https://images.example.com/photo_{0}.jpg>",
+        )
+    ).format(story)
+
+
+def _emphasis(rng):
+    words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+    return rng.choice(("*{0}*", "_{0}_", "~{0}~", "*{0}", "{0}_x")).format(
+        words
+    )
+
+
+def _mention(rng):
+    return rng.choice(
+        ("<@U024BE7LH>", "<@U0G9QF9C6>", "<#C024BE7LB|general>", "<!here>")
+    )
+
+
+SHARES = {
+    "emoji": 0.4,
+    "links": 0.3,
+    "long_urls": 0.05,
+    "emphasis": 0.4,
+    "mentions": 0.3,
+}
+
+FEATURES = (
+    ("emoji", _emoji),
+    ("links", _link),
+    ("long_urls", lambda rng: "<{0}>".format(_long_url(rng))),
+    ("emphasis", _emphasis),
+    ("mentions", _mention),
+)
+
+
+def generate_corpus(count=1000, seed=0, shares=None, bullets=0.1,
+                    words=(4, 60)):
+    """
+    Return a reproducible list of synthetic Slack messages.
+
+    shares maps each feature in SHARES to the share of messages that
+    contain it, overriding the defaults; a message with a feature gets one
+    to three of them placed among its words. bullets is the share of
+    messages ending in a bulleted list and words the range of plain words
+    per message.
+    """
+    rng = random.Random(seed)
+    shares = dict(SHARES, **(shares or {}))
+    corpus = []
+    for _ in range(count):
+        parts = [rng.choice(WORDS) for _ in range(rng.randint(*words))]
+        for name, make in FEATURES:
+            if rng.random() < shares[name]:
+                for _ in range(rng.randint(1, 3)):
+                    parts.insert(rng.randint(0, len(parts)), make(rng))
+        message = " ".join(parts)
+        if rng.random() < bullets:
+            message += "".join(
+                u"\n\u2022 {0}".format(rng.choice(WORDS))
+                for _ in range(rng.randint(2, 5))
+            )
+        corpus.append(message)
+    return corpus
+
+
+def _peak_memory(marker, corpus):
+    if tracemalloc is None:
+        return None
+    tracemalloc.start()
+    try:
+        for message in corpus:
+            marker.mark(message)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(corpus, configurations=None, repeat=3):
+    """
+    Time MarkSlack.mark() over corpus under each configuration and return
+    a list of result dictionaries. Throughput is taken from the fastest
+    of repeat passes.
+    """
+    if configurations is None:
+        configurations = CONFIGURATIONS
+    size = sum(len(message.encode("utf-8")) for message in corpus)
+    results = []
+    for name in sorted(configurations):
+        marker = MarkSlack(**configurations[name])
+        best = None
+        for _ in range(repeat):
+            start = timeit.default_timer()
+            for message in corpus:
+                marker.mark(message)
+            elapsed = timeit.default_timer() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results.append(
+            {
+                "config": name,
+                "seconds": best,
+                "messages_per_second": len(corpus) / best,
+                "bytes_per_second": size / best,
+                "peak_memory_bytes": _peak_memory(marker, corpus),
+            }
+        )
+    return results
+
+
+def run_adversarial(lengths=ADVERSARIAL_LENGTHS, engines=("regex", "tokens"),
+                    repeat=3):
+    """
+    Time MarkSlack.mark() on each ADVERSARIAL input at each length with
+    each engine, and return a list of result dictionaries.
+    """
+    results = []
+    for name in sorted(ADVERSARIAL):
+        for engine in engines:
+            marker = MarkSlack(engine=engine)
+            for length in lengths:
+                message = ADVERSARIAL[name](length)
+                best = min(
+                    timeit.repeat(
+                        lambda: marker.mark(message), number=1, repeat=repeat
+                    )
+                )
+                results.append(
+                    {
+                        "input": name,
+                        "engine": engine,
+                        "length": len(message),
+                        "seconds": best,
+                        "microseconds_per_char": best * 1e6 / len(message),
+                    }
+                )
+    return results
+
+
+def _import_times(stderr):
+    """
+    Return a dictionary of self and cumulative import microseconds by
+    module, parsed from the output of ``python -X importtime``.
+    """
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            self_time, cumulative = int(fields[0]), int(fields[1])
+        except ValueError:  # The header
+            continue
+        times[fields[2].strip()] = (self_time, cumulative)
+    return times
+
+
+def _run_script(script):
+    """
+    Run an _IMPORT_SCRIPT in a new interpreter and return its time in
+    seconds and its import times.
+    """
+    process = subprocess.Popen(
+        [sys.executable, "-X", "importtime", "-c", script],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    stdout, stderr = process.communicate()
+    if process.returncode:
+        raise RuntimeError(stderr)
+    return float(stdout.split()[-1]), _import_times(stderr)
+
+
+def run_imports(statements=None, repeat=5, modules=10):
+    """
+    Run each statement in IMPORTS repeat times, each time in a new
+    interpreter, and return a list of result dictionaries for the fastest
+    run, with the slowest modules it imported by self time. Import times
+    come from ``-X importtime`` and are missing before Python 3.7.
+
+    Modules are compiled to bytecode the first time they're imported,
+    which is left out of the timings unless bytecode can't be written.
+    """
+    if statements is None:
+        statements = IMPORTS
+    results = []
+    for name in sorted(statements):
+        script = _IMPORT_SCRIPT.format(statements[name])
+        # The first run writes bytecode and isn't counted.
+        runs = [_run_script(script) for _ in range(repeat + 1)][1:]
+        seconds, times = min(runs, key=lambda run: run[0])
+        slowest = sorted(times, key=lambda module: -times[module][0])
+        results.append(
+            {
+                "statement": name,
+                "seconds": seconds,
+                "import_microseconds": (
+                    times["markslack"][1] if "markslack" in times else None
+                ),
+                "slowest_modules": [
+                    {"module": module, "microseconds": times[module][0]}
+                    for module in slowest[:modules]
+                ],
+            }
+        )
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m markslack.benchmark", description=__doc__
+    )
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--adversarial",
+        action="store_true",
+        help="Time the adversarial inputs instead of the corpus.",
+    )
+    parser.add_argument(
+        "--imports",
+        action="store_true",
+        help="Time importing markslack in new interpreters instead.",
+    )
+    parser.add_argument(
+        "--config",
+        action="append",
+        choices=sorted(CONFIGURATIONS),
+        help="Configuration to time; may be repeated. Defaults to all.",
+    )
+    for name in sorted(SHARES):
+        parser.add_argument(
+            "--{0}".format(name.replace("_", "-")),
+            type=float,
+            help="Share of messages with {0}".format(name.replace("_", " ")),
+        )
+    args = parser.parse_args(argv)
+
+    if args.adversarial or args.imports:
+        if args.imports:
+            results = run_imports(repeat=args.repeat)
+        else:
+            results = run_adversarial(repeat=args.repeat)
+        report = {"python": platform.python_version(), "results": results}
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+        return
+
+    shares = dict(
+        (name, getattr(args, name))
+        for name in SHARES
+        if getattr(args, name) is not None
+    )
+    corpus = generate_corpus(args.count, args.seed, shares)
+    configurations = CONFIGURATIONS
+    if args.config:
+        configurations = dict(
+            (name, CONFIGURATIONS[name]) for name in args.config
+        )
+
+    report = {
+        "python": platform.python_version(),
+        "corpus": {
+            "messages": len(corpus),
+            "bytes": sum(len(message.encode("utf-8")) for message in corpus),
+            "seed": args.seed,
+            "shares": dict(SHARES, **shares),
+        },
+        "results": run(corpus, configurations, args.repeat),
+    }
+    json.dump(report, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
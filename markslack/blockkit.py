@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+Render Block Kit rich_text blocks straight to Markdown.
+
+Messages written in Slack's composer carry their content twice: as the
+mrkdwn ``text`` that mark() parses and as ``blocks``. rich_text blocks
+already say which spans are bold, linked or mentions, so they are
+rendered in a single walk, with no patterns to match and no guessing at
+which asterisks and underscores pair up. The Markdown is in the same
+dialect mark() writes, using the same templates and emoji options.
+Blocks of other types are skipped.
+"""
+import os
+import struct
+
+from markslack import shortcodes, urls
+
+# Markers for each text style, outermost first.
+STYLES = (
+    ("bold", u"**"),
+    ("italic", u"*"),
+    ("strike", u"~~"),
+    ("code", u"`"),
+)
+
+_ANNOUNCEMENT = u'<span class="slack-announcement">@{0}</span>'
+
+
+def _character(point):
+    # unichr can't make astral characters on narrow Python 2 builds.
+    return struct.pack("<I", int(point, 16)).decode("utf-32-le")
+
+
+def _escape(text):
+    """
+    Escape the asterisks and underscores in plain text, leaving URLs as
+    they are.
+    """
+    if u"*" not in text and u"_" not in text:
+        return text
+    pieces = urls.split(text)
+    for i in range(0, len(pieces), 2):
+        pieces[i] = pieces[i].replace(u"*", u"\\*").replace(u"_", u"\\_")
+    return u"".join(pieces)
+
+
+def _style(text, style):
+    """
+    Wrap text in the markers for style, keeping whitespace at either
+    end outside them, where Markdown expects it.
+    """
+    if not style:
+        return text
+    core = text.strip()
+    if not core:
+        return text
+    opening = u"".join(mark for name, mark in STYLES if style.get(name))
+    if not opening:
+        return text
+    start = text.index(core)
+    end = start + len(core)
+    closing = opening[::-1]
+    return u"".join([text[:start], opening, core, closing, text[end:]])
+
+
+def _link(converter, element):
+    url = element.get("url", u"")
+    label = element.get("text")
+    if not label:
+        extension = os.path.splitext(url)[1]
+        if extension.lower() in converter.image_extensions:
+            if converter.image_template:
+                return converter.image_template.format(url)
+            return u"![]({0})".format(url)
+    if converter.link_templates:
+        templated = converter.template_link(url)
+        if templated is not None:
+            return templated
+    if not label:
+        return u"[{0}]({0})".format(url)
+    return u"[{0}]({1})".format(_escape(label), url)
+
+
+def _emoji(converter, element):
+    codes = [u":{0}:".format(element.get("name", u""))]
+    if element.get("skin_tone"):
+        codes.append(u":skin-tone-{0}:".format(element["skin_tone"]))
+    if converter.replace_emoji:
+        index = shortcodes.index()
+        if all(code in index for code in codes):
+            return u"".join(index[code] for code in codes)
+        if element.get("unicode"):
+            return u"".join(
+                _character(point) for point in element["unicode"].split("-")
+            )
+    if converter.remove_bad_emoji:
+        return u""
+    return u"".join(codes)
+
+
+def _user(converter, element):
+    user = element.get("user_id", u"")
+    if converter.user_templates:
+        return converter.user_templates.get(user, u"@{0}".format(user))
+    return u"@{0}".format(user)
+
+
+def _inline(converter, element, raw):
+    """
+    Return the Markdown for one element of a section. In raw sections,
+    like preformatted ones, text is written as is.
+    """
+    kind = element.get("type")
+    if kind == "text":
+        text = element.get("text", u"")
+        if raw:
+            return text
+        style = element.get("style")
+        if not (style and style.get("code")):
+            text = _escape(text)
+        return _style(text, style)
+    if kind == "link":
+        if raw:
+            return element.get("text") or element.get("url", u"")
+        return _style(_link(converter, element), element.get("style"))
+    if kind == "emoji":
+        return _emoji(converter, element)
+    if kind == "user":
+        return _user(converter, element)
+    if kind == "channel":
+        return u"#{0}".format(element.get("channel_id", u""))
+    if kind == "usergroup":
+        return _ANNOUNCEMENT.format(
+            u"subteam^{0}".format(element.get("usergroup_id", u""))
+        )
+    if kind == "broadcast":
+        return _ANNOUNCEMENT.format(element.get("range", u""))
+    if kind == "date":
+        return element.get("fallback") or element.get("timestamp", u"")
+    if kind == "color":
+        return element.get("value", u"")
+    return element.get("text", u"")
+
+
+def _section(converter, section, raw=False):
+    return u"".join(
+        _inline(converter, element, raw)
+        for element in section.get("elements", ())
+    )
+
+
+def _list(converter, element):
+    indent = u"    " * element.get("indent", 0)
+    ordered = element.get("style") == "ordered"
+    number = element.get("offset", 0)
+    items = []
+    for item in element.get("elements", ()):
+        number += 1
+        marker = u"{0}. ".format(number) if ordered else u"+ "
+        text = _section(converter, item).rstrip(u"\n")
+        items.append(indent + marker + text.replace(u"\n", u"\n" + indent))
+    return u"\n".join(items)
+
+
+def _element(converter, element):
+    kind = element.get("type")
+    if kind == "rich_text_list":
+        return _list(converter, element)
+    if kind == "rich_text_preformatted":
+        text = _section(converter, element, raw=True).strip(u"\n")
+        return u"```\n{0}\n```".format(text)
+    if kind == "rich_text_quote":
+        text = _section(converter, element).rstrip(u"\n")
+        return u"> " + text.replace(u"\n", u"\n> ")
+    return _section(converter, element)
+
+
+def render(converter, blocks):
+    """
+    Return the Markdown for the rich_text blocks in a list of Block Kit
+    blocks. Lists, quotes and preformatted text each start on a line of
+    their own.
+    """
+    out = []
+    for block in blocks:
+        if block.get("type") != "rich_text":
+            continue
+        for element in block.get("elements", ()):
+            text = _element(converter, element)
+            if out and not out[-1].endswith(u"\n"):
+                out.append(u"\n")
+            out.append(text)
+    return u"".join(out)
@@ -0,0 +1,78 @@
+"""
+Limits on the work spent converting one message.
+
+A converter built with max_length converts messages longer than that
+with a fallback, and one built with time_limit switches to the fallback
+when a message is still converting that many seconds in. The fallbacks
+take time linear in the length of a message:
+
+- "basic" lexes the message once with the tokens engine and keeps its
+  links, mentions, channels and emoji, but doesn't pair emphasis:
+  asterisks, underscores and tildes are escaped instead.
+- "escape" escapes every character Markdown treats specially, so the
+  message reads exactly as it was written.
+
+The time limit is checked between stages, so a stage that has started
+runs to its end. max_length bounds how long that can take. When the
+tokens engine runs out of time after lexing, "basic" renders the tokens
+it has rather than lexing again. Fallback output is never cached.
+"""
+import collections
+import threading
+
+from markslack import tokens
+from markslack.patterns import LazyPattern
+
+FallbackInfo = collections.namedtuple("FallbackInfo", ["length", "time"])
+
+_special_re = LazyPattern(r"([\\`*_{}\[\]<>()#+\-!|~])")
+
+
+def escape(text):
+    """
+    Return text as Markdown that renders it literally.
+    """
+    return _special_re.sub(r"\\\1", text)
+
+
+def basic(converter, text, lexed=None):
+    """
+    Convert text without pairing emphasis. See tokens.render_basic.
+    Pass lexed, the tokens from tokens.prepare(), if text has been lexed
+    already.
+    """
+    if lexed is None:
+        lexed = tokens.prepare(converter, text)
+    return tokens.render_basic(lexed)
+
+
+def fallback(converter, text, lexed=None):
+    """
+    Convert text with converter's fallback, reusing lexed if given.
+    """
+    if converter.fallback == "escape":
+        return escape(text)
+    return basic(converter, text, lexed)
+
+
+class Fallbacks(object):
+    """
+    Count the messages converted with a fallback, by the limit they
+    went over. Safe to share between threads.
+    """
+
+    def __init__(self):
+        self.length = 0
+        self.time = 0
+        self._lock = threading.Lock()
+
+    def record(self, limit):
+        with self._lock:
+            if limit == "length":
+                self.length += 1
+            else:
+                self.time += 1
+
+    def info(self):
+        with self._lock:
+            return FallbackInfo(self.length, self.time)
@@ -0,0 +1,289 @@
+"""
+Convert streams of Slack messages to Markdown from the command line.
+
+``markslack`` reads JSON lines or raw text from files or stdin and
+writes to stdout. For JSON lines, each record gets its Markdown added
+under --output-field. For raw text, each line is a message. A document
+is one message, however large, converted a line at a time with
+MarkSlack.mark_stream. Run ``markslack --help`` for the converter
+options.
+"""
+import argparse
+import collections
+import errno
+import functools
+import io
+import json
+import os
+import sys
+
+from markslack import ENGINES, FALLBACKS, MarkSlack, batch
+
+FORMATS = ("jsonl", "text", "document")
+
+# Output is written through a buffer this large.
+BUFFER_SIZE = 1 << 20
+
+
+def convert_line(converter, format, field, output_field, item):
+    """
+    Convert one numbered input line and return its output line.
+    """
+    number, line = item
+    if format == "text":
+        return converter.mark(line.rstrip(u"\n")) + u"\n"
+    try:
+        record = json.loads(line)
+    except ValueError as error:
+        raise ValueError("line {0}: {1}".format(number, error))
+    if not isinstance(record, dict):
+        raise ValueError("line {0}: not a JSON object".format(number))
+    text = record.get(field)
+    if text is None:
+        text = u""
+    elif not isinstance(text, type(u"")):
+        raise ValueError("line {0}: {1} is not a string".format(number, field))
+    record[output_field] = converter.mark(text)
+    return json.dumps(record, ensure_ascii=False) + u"\n"
+
+
+def convert_chunk(converter, format, field, output_field, items):
+    """
+    Convert a list of numbered input lines, looking up the users they
+    mention together first.
+    """
+    converter.prefetch(line for _, line in items)
+    return [
+        convert_line(converter, format, field, output_field, item)
+        for item in items
+    ]
+
+
+def _convert_in_worker(format, field, output_field, items):
+    return convert_chunk(
+        batch.worker_converter(), format, field, output_field, items
+    )
+
+
+def convert_lines(
+    converter,
+    lines,
+    format="jsonl",
+    field="text",
+    output_field="markdown",
+    workers=1,
+    chunksize=256,
+):
+    """
+    Yield an output line for each input line, in order. Blank lines are
+    skipped in JSON lines input. With more than one worker, lines are
+    parsed, converted and serialized in worker processes, chunksize
+    lines at a time, and read only a few chunks ahead of the output
+    consumed; see batch.imap.
+    """
+    items = enumerate(lines, 1)
+    if format == "jsonl":
+        items = (item for item in items if item[1].strip())
+    if workers <= 1:
+        size = batch.read_ahead(converter, chunksize)
+        for chunk in batch.chunks(items, size):
+            for line in convert_chunk(
+                converter, format, field, output_field, chunk
+            ):
+                yield line
+        return
+
+    pool = batch.worker_pool(converter, workers)
+    try:
+        convert = functools.partial(
+            _convert_in_worker, format, field, output_field
+        )
+        chunks = batch.chunks(items, chunksize)
+        for converted in batch.imap(pool, convert, chunks, workers):
+            for line in converted:
+                yield line
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _open(path):
+    if path == "-":
+        return io.open(sys.stdin.fileno(), encoding="utf-8", closefd=False)
+    return io.open(path, encoding="utf-8")
+
+
+def read_lines(paths):
+    for path in paths:
+        with _open(path) as source:
+            for line in source:
+                yield line
+
+
+def _load_json(path):
+    with io.open(path, encoding="utf-8") as source:
+        # Link templates are matched in the order they're listed.
+        return json.load(source, object_pairs_hook=collections.OrderedDict)
+
+
+def add_converter_options(parser):
+    """
+    Add flags for MarkSlack's options to an argparse parser.
+    """
+    options = parser.add_argument_group("converter options")
+    options.add_argument(
+        "--no-markslack-links",
+        dest="markslack_links",
+        action="store_false",
+    )
+    options.add_argument(
+        "--no-replace-emoji", dest="replace_emoji", action="store_false"
+    )
+    options.add_argument("--remove-bad-emoji", action="store_true")
+    options.add_argument(
+        "--link-templates",
+        type=_load_json,
+        metavar="JSON_FILE",
+        help="JSON object of link templates keyed by URL substring.",
+    )
+    options.add_argument(
+        "--user-templates",
+        type=_load_json,
+        metavar="JSON_FILE",
+        help="JSON object of user templates keyed by user ID.",
+    )
+    options.add_argument("--image-template", metavar="TEMPLATE")
+    options.add_argument(
+        "--image-extensions", nargs="+", metavar="EXTENSION"
+    )
+    options.add_argument("--engine", choices=ENGINES, default="regex")
+    options.add_argument("--cache-size", type=int)
+    options.add_argument(
+        "--max-length",
+        type=int,
+        help="Convert longer messages with the fallback.",
+    )
+    options.add_argument(
+        "--time-limit",
+        type=float,
+        metavar="SECONDS",
+        help="Switch to the fallback for messages still converting after "
+        "this long.",
+    )
+    options.add_argument("--fallback", choices=FALLBACKS, default="basic")
+
+
+def make_converter(args):
+    """
+    Return a compiled converter for the options parsed from the flags
+    add_converter_options added.
+    """
+    config = dict(
+        markslack_links=args.markslack_links,
+        replace_emoji=args.replace_emoji,
+        remove_bad_emoji=args.remove_bad_emoji,
+        link_templates=args.link_templates,
+        user_templates=args.user_templates,
+        image_template=args.image_template,
+        engine=args.engine,
+        cache_size=args.cache_size,
+        max_length=args.max_length,
+        time_limit=args.time_limit,
+        fallback=args.fallback,
+    )
+    if args.image_extensions:
+        config["image_extensions"] = args.image_extensions
+    return MarkSlack(**config).compile()
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog="markslack", description=__doc__.strip().splitlines()[0]
+    )
+    parser.add_argument(
+        "files",
+        nargs="*",
+        default=["-"],
+        metavar="FILE",
+        help="Files to convert, or - for stdin. Defaults to stdin.",
+    )
+    parser.add_argument("--format", choices=FORMATS, default="jsonl")
+    parser.add_argument(
+        "--field", default="text", help="JSON field to convert."
+    )
+    parser.add_argument(
+        "--output-field",
+        default="markdown",
+        help="JSON field to write the Markdown to.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes to convert with. Not for --format "
+        "document, which is converted in this process.",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=256,
+        help="Lines sent to a worker at a time.",
+    )
+    add_converter_options(parser)
+    return parser
+
+
+def _write(converter, args, output):
+    if args.format == "document":
+        converter.mark_stream(read_lines(args.files), output, args.chunksize)
+        return
+    lines = convert_lines(
+        converter,
+        read_lines(args.files),
+        args.format,
+        args.field,
+        args.output_field,
+        args.workers,
+        args.chunksize,
+    )
+    try:
+        for line in lines:
+            output.write(line)
+    finally:
+        lines.close()
+
+
+def main(argv=None):
+    parser = _parser()
+    args = parser.parse_args(argv)
+    if args.format == "document" and args.workers > 1:
+        parser.error("--workers can't be used with --format document")
+    converter = make_converter(args)
+
+    output = io.open(
+        sys.stdout.fileno(),
+        "w",
+        encoding="utf-8",
+        buffering=BUFFER_SIZE,
+        closefd=False,
+    )
+    try:
+        try:
+            _write(converter, args, output)
+        finally:
+            output.flush()
+    except ValueError as error:
+        sys.stderr.write("markslack: {0}\n".format(error))
+        return 1
+    except IOError as error:
+        # Stop quietly when the reader goes away, as in `markslack | head`,
+        # sending whatever is left in the buffer nowhere.
+        if error.errno != errno.EPIPE:
+            raise
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+import functools
+
+import pytest
+
+from markslack import MarkSlack, nodes
+
+
+class ParsedMarkSlack(MarkSlack):
+    """
+    A MarkSlack whose mark() renders the Markdown from parse().
+    """
+
+    def mark(self, slack):
+        return nodes.to_markdown(self.parse(slack))
+
+
+ENGINES = {
+    "regex": MarkSlack,
+    "tokens": functools.partial(MarkSlack, engine="tokens"),
+    "parse": ParsedMarkSlack,
+}
+
+
+@pytest.fixture(params=sorted(ENGINES))
+def engine(request, monkeypatch):
+    """
+    Run a test with each engine, and through parse() and to_markdown(),
+    by swapping in a MarkSlack for the module's MarkSlack and marker.
+    """
+    make = ENGINES[request.param]
+    monkeypatch.setattr(request.module, "MarkSlack", make)
+    monkeypatch.setattr(request.module, "marker", make())
+    return request.param
@@ -0,0 +1,168 @@
+"""
+Convert each distinct message once in bulk conversions.
+
+Exports repeat a lot of text word for word: bot alerts, deploy notices,
+cross-posted links. A Deduplicator keeps the Markdown for each distinct
+message under a digest of its text, so a repeat costs a hash rather
+than a conversion, and every copy shares one Markdown string. Unlike
+the result cache, which is keyed by the text itself, it holds no
+message text, and mark_many uses it to keep repeats from being sent to
+worker processes at all.
+"""
+import collections
+import hashlib
+import threading
+
+DedupInfo = collections.namedtuple(
+    "DedupInfo", ["messages", "converted", "ratio"]
+)
+
+
+def digest(text):
+    """
+    Return the key a message is deduplicated by.
+    """
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+class Deduplicator(object):
+    """
+    Map digests of message text to converted Markdown, keeping at most
+    maxsize entries, least recently used evicted first, or every entry
+    if maxsize is None. Safe to share between threads.
+
+    info() reports how many messages went through it, how many of them
+    were converted and the share that were repeats.
+    """
+
+    def __init__(self, maxsize=None):
+        if maxsize is not None and maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self.messages = 0
+        self.converted = 0
+        self._entries = collections.OrderedDict()
+        # Digests of messages sent off to be converted, not yet stored.
+        self._claimed = set()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"maxsize": self.maxsize}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _get(self, key):
+        entries = self._entries
+        markdown = entries.get(key)
+        if markdown is not None and self.maxsize is not None:
+            # Re-inserting moves the entry to the most recent end.
+            del entries[key]
+            entries[key] = markdown
+        return markdown
+
+    def _put(self, key, markdown):
+        entries = self._entries
+        markdown = entries.setdefault(key, markdown)
+        if self.maxsize is not None:
+            while len(entries) > self.maxsize:
+                entries.popitem(last=False)
+        return markdown
+
+    def mark(self, converter, text):
+        """
+        Return converter's Markdown for text, converting it only if no
+        copy of it has been converted. Fallback output isn't kept, so the
+        next copy is converted again.
+        """
+        key = digest(text)
+        with self._lock:
+            self.messages += 1
+            markdown = self._get(key)
+        if markdown is not None:
+            return markdown
+        markdown, full = converter.mark_result(text)
+        with self._lock:
+            self.converted += 1
+            return self._put(key, markdown) if full else markdown
+
+    def claim(self, messages):
+        """
+        Return the digests of a list of messages and the distinct ones
+        among them that are neither converted nor claimed, claiming
+        those. Pass their Markdown to store() once converted.
+        """
+        keys = [digest(text) for text in messages]
+        new = []
+        with self._lock:
+            for key, text in zip(keys, messages):
+                if key not in self._entries and key not in self._claimed:
+                    self._claimed.add(key)
+                    new.append(text)
+        return keys, new
+
+    def store(self, messages, results):
+        """
+        Store the Markdown for claimed messages, given as the (markdown,
+        full) pairs from Converter.mark_result. Fallback output isn't
+        stored; it is returned in a dict by digest, for resolve().
+        """
+        fallbacks = {}
+        with self._lock:
+            for text, (converted, full) in zip(messages, results):
+                key = digest(text)
+                self._claimed.discard(key)
+                if full:
+                    self._put(key, converted)
+                else:
+                    fallbacks[key] = converted
+            self.converted += len(messages)
+        return fallbacks
+
+    def resolve(self, converter, messages, keys, fallbacks=None):
+        """
+        Return the Markdown for messages, whose digests are keys, from
+        the stored entries or fallbacks, as returned by store(). Messages
+        whose entry was evicted, or is still being converted elsewhere,
+        are converted here.
+        """
+        with self._lock:
+            self.messages += len(messages)
+            found = [self._get(key) for key in keys]
+        if fallbacks:
+            for i, key in enumerate(keys):
+                if found[i] is None:
+                    found[i] = fallbacks.get(key)
+        missing = [i for i, markdown in enumerate(found) if markdown is None]
+        if missing:
+            converted = [converter.mark_result(messages[i]) for i in missing]
+            with self._lock:
+                self.converted += len(missing)
+                for i, (markdown, full) in zip(missing, converted):
+                    if full:
+                        markdown = self._put(keys[i], markdown)
+                    found[i] = markdown
+        return found
+
+    def count(self, messages, converted):
+        """
+        Add counts from a Deduplicator in another process.
+        """
+        with self._lock:
+            self.messages += messages
+            self.converted += converted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._claimed.clear()
+
+    def info(self):
+        with self._lock:
+            messages = self.messages
+            converted = self.converted
+        ratio = 1 - float(converted) / messages if messages else 0.0
+        return DedupInfo(messages, converted, ratio)
@@ -0,0 +1,90 @@
+"""
+Collect the entities in a message while converting it.
+
+extract() lexes a message once with the tokens engine, renders the
+Markdown from those tokens and lists the entities among them, with
+their offsets in the message, in a walk over the tokens rather than
+another scan of the text. The Markdown is the tokens engine's, whatever
+engine is set.
+
+Each Entity is (kind, value, label, start, end), where text[start:end]
+is the Slack markup it came from and kind is one of the node kinds in
+markslack.nodes:
+
+- USER: value is the user ID.
+- CHANNEL: value is the channel ID and label its name.
+- ANNOUNCEMENT: value is the target, like "here" or "channel".
+- LINK: value is the URL and label the link text.
+- URL: a bare URL, its value.
+- IMAGE: value is the image URL.
+- EMOJI: value is the shortcode and label the emoji, or None if it
+  wasn't replaced.
+"""
+import collections
+
+from markslack import nodes, shortcodes, tokens
+
+Entity = collections.namedtuple(
+    "Entity", ["kind", "value", "label", "start", "end"]
+)
+Extraction = collections.namedtuple("Extraction", ["markdown", "entities"])
+
+
+def _entity(node, source, start):
+    kind, value = node
+    end = start + len(source)
+    if kind == nodes.USER:
+        return Entity(kind, value[0], None, start, end)
+    if kind == nodes.CHANNEL:
+        # Channels are written <#ID|name>.
+        channel = source[2:source.index(u"|")]
+        return Entity(kind, channel, value, start, end)
+    if kind == nodes.LINK:
+        return Entity(kind, value[0], value[1], start, end)
+    if kind == nodes.IMAGE:
+        return Entity(kind, value[0], None, start, end)
+    return Entity(kind, value, None, start, end)
+
+
+def collect(text, lexed):
+    """
+    Return the entities in lexed, the tokens of text, before any bad
+    emoji are dropped.
+    """
+    found = []
+    pos = 0
+    url = None
+    for kind, value in lexed:
+        if kind == tokens.ENTITY:
+            source = value[3]
+            found.append(_entity(value[2], source, pos))
+            pos += len(source)
+        elif kind == tokens.EMOJI:
+            end = pos + len(value[1])
+            found.append(Entity(nodes.EMOJI, value[1], value[0], pos, end))
+            pos = end
+        elif kind == tokens.SHORTCODE:
+            end = pos + len(value)
+            # Shortcodes left as they are count only if they're emoji.
+            if value in shortcodes.index():
+                found.append(Entity(nodes.EMOJI, value, None, pos, end))
+            pos = end
+        elif kind == tokens.URL_START:
+            url = pos
+        elif kind == tokens.URL_END:
+            found.append(Entity(nodes.URL, text[url:pos], None, url, pos))
+        else:
+            pos += len(value)
+    return found
+
+
+def extract(converter, text):
+    """
+    Convert text and collect its entities, returning an Extraction of
+    the Markdown and the list of entities in the order they appear.
+    """
+    lexed = tokens.lex(converter, text)
+    found = collect(text, lexed)
+    if converter.remove_bad_emoji:
+        tokens.drop_bad_emoji(lexed)
+    return Extraction(tokens.render(lexed), found)
@@ -0,0 +1,200 @@
+"""
+Convert Slack workspace export archives.
+
+A Slack export is a zip archive with a directory for each channel, holding
+one JSON file of messages per day. The archive is read in place, one day
+at a time, so memory use is bounded by the largest day file rather than
+by the whole export.
+"""
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+
+from markslack import batch
+
+
+FORMATS = ("jsonl", "markdown")
+
+
+def channel_days(archive):
+    """
+    Return (channel, [(date, entry name), ...]) pairs for an open export
+    archive, sorted by channel and day.
+    """
+    channels = {}
+    for name in archive.namelist():
+        parts = name.split("/")
+        if len(parts) != 2 or not parts[1].endswith(".json"):
+            continue
+        channels.setdefault(parts[0], []).append((parts[1][:-5], name))
+    return [
+        (channel, sorted(days))
+        for channel, days in sorted(channels.items())
+    ]
+
+
+def iter_days(archive, days):
+    """
+    Yield (date, messages) pairs for a channel's day files.
+    """
+    for date, name in days:
+        with archive.open(name) as day:
+            yield date, json.loads(day.read().decode("utf-8"))
+
+
+def iter_messages(archive, days):
+    """
+    Yield (date, message) pairs for a channel's day files.
+    """
+    for date, messages in iter_days(archive, days):
+        for message in messages:
+            yield date, message
+
+
+def _mentions(messages):
+    for message in messages:
+        yield message.get("text", u"")
+        if message.get("user"):
+            yield u"<@{0}>".format(message["user"])
+
+
+def write_channel(
+    converter, archive, channel, days, output, format, dedup=None
+):
+    """
+    Convert one channel's messages and write them to a text stream,
+    through a Deduplicator if dedup is given. Returns the number of
+    messages written.
+    """
+    count = 0
+    date = None
+    if format == "markdown":
+        output.write(u"# {0}\n".format(channel))
+    for day, messages in iter_days(archive, days):
+        # Look up the day's mentioned users and authors together.
+        converter.prefetch(_mentions(messages))
+        for message in messages:
+            text = message.get("text", u"")
+            if dedup is None:
+                markdown = converter.mark(text)
+            else:
+                markdown = dedup.mark(converter, text)
+            if format == "jsonl":
+                record = dict(message, channel=channel, date=day)
+                record["markdown"] = markdown
+                output.write(json.dumps(record, ensure_ascii=False))
+                output.write(u"\n")
+            else:
+                if day != date:
+                    output.write(u"\n## {0}\n".format(day))
+                    date = day
+                user = message.get("user")
+                if user:
+                    author = converter.mark_user(u"<@{0}>".format(user))
+                    output.write(u"\n{0}: {1}\n".format(author, markdown))
+                else:
+                    output.write(u"\n{0}\n".format(markdown))
+            count += 1
+    if format == "markdown":
+        output.write(u"\n")
+    return count
+
+
+# Each worker process deduplicates the channels it converts against
+# its own table.
+_dedup = None
+
+
+def _convert_channel(job):
+    global _dedup
+    path, channel, days, format, dedup = job
+    if dedup is not None:
+        # The Deduplicator arrives without its table, so the first one
+        # is kept for every later channel.
+        if _dedup is None:
+            _dedup = dedup
+        dedup = _dedup
+        before = dedup.info()
+    handle, part = tempfile.mkstemp(suffix=".part")
+    with io.open(handle, "w", encoding="utf-8") as output:
+        with zipfile.ZipFile(path) as archive:
+            count = write_channel(
+                batch.worker_converter(),
+                archive,
+                channel,
+                days,
+                output,
+                format,
+                dedup,
+            )
+    counts = None
+    if dedup is not None:
+        after = dedup.info()
+        counts = (
+            after.messages - before.messages,
+            after.converted - before.converted,
+        )
+    return part, count, counts
+
+
+def convert_export(
+    marker, archive, output, format="jsonl", workers=1, dedup=None
+):
+    """
+    Convert every message in a Slack export archive and write it, channel
+    by channel and day by day, to the text stream output.
+
+    marker is a MarkSlack or Converter and archive is a path or a binary
+    file object. format is "jsonl", one JSON record per message with a
+    "markdown" field added, or "markdown", one document with a section
+    per channel and day. With more than one worker, channels are
+    converted in parallel, which requires archive to be a path. Returns
+    the number of messages converted.
+
+    Given a markslack.dedup.Deduplicator, each distinct message text is
+    converted once. Workers each keep a table of their own, and their
+    counts are added to dedup's.
+    """
+    if format not in FORMATS:
+        raise ValueError(
+            "format must be one of {0}, not {1!r}".format(FORMATS, format)
+        )
+    if workers > 1 and hasattr(archive, "read"):
+        raise ValueError("Converting in parallel needs an archive path")
+    converter = getattr(marker, "converter", marker)
+
+    with zipfile.ZipFile(archive) as export:
+        channels = channel_days(export)
+        if workers <= 1:
+            return sum(
+                write_channel(
+                    converter, export, channel, days, output, format, dedup
+                )
+                for channel, days in channels
+            )
+
+    jobs = [
+        (archive, channel, days, format, dedup) for channel, days in channels
+    ]
+    total = 0
+    pool = batch.worker_pool(converter, workers)
+    try:
+        # Channels are written to temporary files by the workers and
+        # copied out in order, so no channel is held in memory.
+        for part, count, counts in pool.imap(_convert_channel, jobs):
+            if counts is not None:
+                dedup.count(*counts)
+            try:
+                with io.open(part, encoding="utf-8") as converted:
+                    shutil.copyfileobj(converted, output)
+            finally:
+                os.remove(part)
+            total += count
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+    return total
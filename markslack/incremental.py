@@ -0,0 +1,150 @@
+"""
+Re-convert edited messages by converting only the lines around an edit.
+
+Every stage works within a line except for one step of mark_emphasis,
+which leaves the unmatched underscores in a stretch of text between two
+URLs unescaped if the stretch has an unreplaced shortcode in it, and
+those stretches can run across lines. Without such a shortcode, only the
+edited lines are converted again. With one, an edit can change the
+output of the lines up to the nearest line with a URL on either side,
+and of those lines themselves. The lines past them keep their previous
+output.
+"""
+from markslack import urls, users
+from markslack.patterns import LazyPattern, emoji_pattern
+
+_shortcode_re = LazyPattern(emoji_pattern)
+
+
+def _templates(converter, sources):
+    if converter.image_template:
+        yield converter.image_template
+    if converter.user_templates:
+        # Only the users mentioned can bring their templates in.
+        for user in users.mentions(sources):
+            template = converter.user_templates.get(user)
+            if template:
+                yield template
+    if converter.link_templates:
+        for _, template in converter.link_templates.items:
+            yield template
+
+
+def _line_local(converter, sources):
+    """
+    Return whether converting sources keeps each line's output on the
+    line it came from.
+    """
+    # Dropping a bad emoji takes the whitespace around it, newlines
+    # included.
+    if converter.remove_bad_emoji:
+        return False
+    if any(u"\n" in template for template in _templates(converter, sources)):
+        return False
+    # mark_named_hyperlink wraps URLs in <~ ~> and its patterns for
+    # those can run across lines.
+    return not any(u"<~" in source for source in sources)
+
+
+def _may_break(line):
+    # Only entities bring in text that wasn't in the line, so a line
+    # without one has a URL after the stages only if it has one before.
+    return u"<" in line or urls.search(line) is not None
+
+
+def _edge(converter, lines, indexes):
+    """
+    Return the index of the second line, taken in the order given, that
+    has a URL in it, or None.
+    """
+    found = 0
+    for index in indexes:
+        line = lines[index]
+        if _may_break(line) and converter.breaks(line):
+            found += 1
+            if found == 2:
+                return index
+    return None
+
+
+def remark(converter, old_source, old_output, new_source):
+    """
+    Return converter's Markdown for new_source, given old_output, its
+    Markdown for old_source. Lines the edit can't change are spliced in
+    from old_output rather than converted again. Options that can move
+    output across lines fall back to converting the whole message.
+    """
+    # Users are looked up first, since their templates decide whether
+    # the edit can be converted line by line.
+    converter.prefetch((old_source, new_source))
+    if not _line_local(converter, (old_source, new_source)):
+        return converter.mark(new_source)
+    old = old_source.split(u"\n")
+    new = new_source.split(u"\n")
+    output = old_output.split(u"\n")
+    if len(output) != len(old):
+        return converter.mark(new_source)
+
+    shorter = min(len(old), len(new))
+    head = 0
+    while head < shorter and old[head] == new[head]:
+        head += 1
+    if head == len(old) == len(new):
+        return old_output
+    tail = 0
+    while tail < shorter - head and old[-1 - tail] == new[-1 - tail]:
+        tail += 1
+
+    # Unreplaced shortcodes are left in the output as they are, so the
+    # edited lines convert on their own unless the old output or theirs
+    # has one.
+    low = head
+    if tail == 0 and low:
+        # A bullet ending a line is only one if whitespace follows it, so
+        # the line before the edit changes if it starts or stops ending
+        # the message.
+        low -= 1
+    high = len(new) - tail
+    window = new[low:high]
+    lines = []
+    if window:
+        # Bullets ending the window are followed by a newline.
+        following = u"\n" if high < len(new) else u""
+        lines = converter.mark(u"\n".join(window) + following).split(u"\n")
+        if len(lines) != len(window) + len(following):
+            return converter.mark(new_source)
+        del lines[len(window):]
+    if _shortcode_re.search(old_output) is None and not any(
+        _shortcode_re.search(line) for line in lines
+    ):
+        suffix = high + len(old) - len(new)
+        return u"\n".join(output[:low] + lines + output[suffix:])
+
+    # The window to convert runs from one edge line to the other. The
+    # edge lines themselves lose context, so their output is kept. Once
+    # the window would cover most of the message, converting all of it
+    # is cheaper than looking further for an edge.
+    reach = len(new) // 2
+    before = range(head - 1, max(head - 1 - reach, -1), -1)
+    start = _edge(converter, new, before)
+    if start is None and head > reach:
+        return converter.mark(new_source)
+    reach -= len(before) if start is None else head - start
+    after = range(len(new) - tail, min(len(new) - tail + reach, len(new)))
+    stop = _edge(converter, new, after)
+    if stop is None and tail > reach:
+        return converter.mark(new_source)
+    low = 0 if start is None else start
+    high = len(new) if stop is None else stop + 1
+    window = new[low:high]
+    lines = converter.mark(u"\n".join(window)).split(u"\n")
+    if len(lines) != len(window):
+        return converter.mark(new_source)
+    if start is not None:
+        lines.pop(0)
+        low += 1
+    if stop is not None:
+        lines.pop()
+        high -= 1
+    suffix = high + len(old) - len(new)
+    return u"\n".join(output[:low] + lines + output[suffix:])
@@ -0,0 +1,89 @@
+"""
+Indexed lookup of link templates.
+"""
+import re
+
+# Tables this small are faster to scan key by key.
+SCAN_LIMIT = 16
+
+_END = None
+
+
+def _trie_pattern(node):
+    """
+    Return a pattern matching any key in a trie. A key that ends at a node
+    makes the rest of that branch redundant, since the pattern only has
+    to find where some key starts.
+    """
+    if _END in node:
+        return ""
+    branches = [
+        re.escape(char) + _trie_pattern(child)
+        for char, child in sorted(node.items())
+    ]
+    if len(branches) == 1:
+        return branches[0]
+    return "(?:{0})".format("|".join(branches))
+
+
+class LinkTemplates(object):
+    """
+    Link templates keyed by a string to look for in a URL.
+
+    find() returns the template of the first key, in the table's order,
+    found anywhere in a URL. Large tables are indexed with a trie of their
+    keys: one regex scan finds every position where some key starts, and
+    the trie lists the keys starting there.
+    """
+
+    __slots__ = ("items", "_trie", "_starts")
+
+    def __init__(self, templates):
+        self.items = tuple(templates.items())
+        self._trie = None
+        self._starts = None
+        if len(self.items) <= SCAN_LIMIT:
+            return
+
+        trie = {}
+        for order, (key, _) in enumerate(self.items):
+            node = trie
+            for char in key:
+                node = node.setdefault(char, {})
+            node.setdefault(_END, order)
+        self._trie = trie
+        self._starts = re.compile(u"(?={0})".format(_trie_pattern(trie)))
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    __nonzero__ = __bool__
+
+    def find(self, url):
+        """
+        Return the template for the first key found in url, or None.
+        """
+        if self._trie is None:
+            for key, template in self.items:
+                if key in url:
+                    return template
+            return None
+
+        first = None
+        for match in self._starts.finditer(url):
+            node = self._trie
+            pos = match.start()
+            while node is not None:
+                order = node.get(_END)
+                if order is not None and (first is None or order < first):
+                    first = order
+                if pos == len(url):
+                    break
+                node = node.get(url[pos])
+                pos += 1
+        if first is None:
+            return None
+        return self.items[first][1]
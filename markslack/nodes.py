@@ -0,0 +1,324 @@
+"""
+A parsed Slack message, as a flat list of nodes, and renderers for it.
+
+``MarkSlack.parse()`` turns Slack text into nodes once, and each of
+to_markdown, to_html and to_text renders them without parsing again.
+Parsing is done by the tokens engine's lexer, whatever engine is set,
+so to_markdown gives the same Markdown as ``mark()`` with the tokens
+engine.
+
+Every node is a (kind, value) tuple:
+
+- (TEXT, text): literal text, newlines included.
+- (BOLD, opens), (ITALIC, opens), (STRIKE, opens): the start of a span
+  if opens is True, its end if False. Spans of different kinds may
+  overlap without nesting.
+- (URL, url): the start of a bare URL, whose text follows as TEXT and
+  emphasis nodes, then (URL, None) at its end.
+- (LINK, (url, label, templated)), (IMAGE, (url, templated)) and
+  (USER, (user_id, templated)), where templated is the output of the
+  converter's matching template, or None.
+- (CHANNEL, name) and (ANNOUNCEMENT, name), like "general" and "here".
+- (EMOJI, (shortcode, emoji)), where emoji is None if it wasn't
+  replaced.
+- (BULLET, space): a bullet point, followed by any space Markdown needs
+  after it.
+"""
+import re
+
+from markslack import urls
+from markslack.patterns import LazyPattern
+
+TEXT = "text"
+BOLD = "bold"
+ITALIC = "italic"
+STRIKE = "strike"
+URL = "url"
+LINK = "link"
+IMAGE = "image"
+USER = "user"
+CHANNEL = "channel"
+ANNOUNCEMENT = "announcement"
+EMOJI = "emoji"
+BULLET = "bullet"
+
+# Markers used in an entity's Markdown pieces. UNDERSCORE is an
+# underscore that may need escaping; BREAK marks where a URL starts or
+# ends.
+UNDERSCORE = object()
+BREAK = object()
+
+_MARKDOWN_MARKS = {BOLD: u"**", ITALIC: u"*", STRIKE: u"~~"}
+_HTML_TAGS = {BOLD: u"strong", ITALIC: u"em", STRIKE: u"del"}
+_ANNOUNCEMENT = u'<span class="slack-announcement">@{0}</span>'
+
+_tag_re = LazyPattern(r"<[^>]*>")
+# URLs to_html links to. Others, like javascript: and data: URLs, are
+# written as text.
+_safe_url_re = LazyPattern(r"(?:https?://|mailto:|www\d{0,3}[.])", re.I)
+
+
+def _escapable(text):
+    parts = text.split("_")
+    pieces = [parts[0]]
+    for part in parts[1:]:
+        pieces.append(UNDERSCORE)
+        pieces.append(part)
+    return tuple(piece for piece in pieces if piece)
+
+
+def _label(name):
+    if urls.search(name) is not None:
+        return (BREAK, name, BREAK)
+    return _escapable(name)
+
+
+def pieces(node):
+    """
+    Return the Markdown for an entity node (LINK, IMAGE, USER, CHANNEL
+    or ANNOUNCEMENT) as a tuple of strings, UNDERSCOREs and BREAKs.
+    """
+    kind, value = node
+    if kind == LINK:
+        url, label, templated = value
+        if templated is not None:
+            return (BREAK, templated, BREAK)
+        return (u"[",) + _label(label) + (u"](", BREAK, url, BREAK, u")")
+    if kind == IMAGE:
+        url, templated = value
+        if templated is not None:
+            return (BREAK, templated, BREAK)
+        return (u"![](", BREAK, url, BREAK, u")")
+    if kind == USER:
+        user, templated = value
+        if templated is not None:
+            return (templated,)
+        return (u"@",) + _escapable(user)
+    if kind == CHANNEL:
+        return (u"#",) + _escapable(value)
+    return (
+        (u'<span class="slack-announcement">@',)
+        + _escapable(value)
+        + (u"</span>",)
+    )
+
+
+class Writer(object):
+    """
+    Collects Markdown, deciding whether unmatched underscores are escaped
+    once the URL-delimited segment they belong to is complete. Like the
+    regex engine, a segment with an unreplaced shortcode is left as is.
+    """
+
+    __slots__ = ("out", "underscores", "exempt", "in_url")
+
+    def __init__(self):
+        self.out = []
+        self.underscores = []
+        self.exempt = False
+        self.in_url = False
+
+    def write(self, text):
+        self.out.append(text)
+
+    def underscore(self):
+        if not self.in_url:
+            self.underscores.append(len(self.out))
+        self.out.append(u"_")
+
+    def shortcode(self, text):
+        self.exempt = True
+        self.out.append(text)
+
+    def pieces(self, pieces):
+        for piece in pieces:
+            if piece is UNDERSCORE:
+                self.underscore()
+            elif piece is BREAK:
+                self.boundary()
+            else:
+                self.out.append(piece)
+
+    def boundary(self):
+        if not self.exempt:
+            for index in self.underscores:
+                self.out[index] = u"\\_"
+        self.underscores = []
+        self.exempt = False
+
+    def getvalue(self):
+        self.boundary()
+        return u"".join(self.out)
+
+
+def _markdown_text(writer, text):
+    # The asterisks and underscores in text are the ones left unpaired.
+    if u"*" not in text and u"_" not in text:
+        writer.write(text)
+        return
+    previous = None
+    for piece in reversed(writer.out):
+        if piece:
+            previous = piece[-1]
+            break
+    start = 0
+    for i, char in enumerate(text):
+        if char == u"_":
+            writer.write(text[start:i])
+            writer.underscore()
+            start = i + 1
+        elif char == u"*" and previous not in (u"\\", u"|"):
+            writer.write(text[start:i] + u"\\")
+            start = i
+        previous = char
+    writer.write(text[start:])
+
+
+def to_markdown(nodes):
+    """
+    Render nodes as Markdown, the same Markdown as mark() gives with the
+    tokens engine.
+    """
+    writer = Writer()
+    for kind, value in nodes:
+        if kind == TEXT:
+            _markdown_text(writer, value)
+        elif kind in _MARKDOWN_MARKS:
+            writer.write(_MARKDOWN_MARKS[kind])
+        elif kind == URL:
+            writer.boundary()
+            writer.in_url = value is not None
+        elif kind == EMOJI:
+            if value[1] is None:
+                writer.shortcode(value[0])
+            else:
+                writer.write(value[1])
+        elif kind == BULLET:
+            writer.write(u"+" + value)
+        else:
+            writer.pieces(pieces((kind, value)))
+    return writer.getvalue()
+
+
+def _escape_html(text):
+    return (
+        text.replace(u"&", u"&amp;")
+        .replace(u"<", u"&lt;")
+        .replace(u">", u"&gt;")
+        .replace(u'"', u"&quot;")
+    )
+
+
+def _html_entity(kind, value):
+    if kind == LINK:
+        url, label, templated = value
+        if templated is not None:
+            return templated
+        if not _safe_url_re.match(url):
+            return _escape_html(label)
+        return u'<a href="{0}">{1}</a>'.format(
+            _escape_html(url), _escape_html(label)
+        )
+    if kind == IMAGE:
+        url, templated = value
+        if templated is not None:
+            return templated
+        if not _safe_url_re.match(url):
+            return _escape_html(url)
+        return u'<img src="{0}" alt="">'.format(_escape_html(url))
+    if kind == USER:
+        user, templated = value
+        if templated is not None:
+            return templated
+        return u"@" + _escape_html(user)
+    if kind == CHANNEL:
+        return u"#" + _escape_html(value)
+    return _ANNOUNCEMENT.format(_escape_html(value))
+
+
+def _close(out, spans, kind):
+    """
+    Close the innermost open span of kind, reopening the spans inside it.
+    """
+    inside = []
+    while spans:
+        span = spans.pop()
+        if span[2]:
+            out.append(u"</{0}>".format(span[2]))
+        if span[0] == kind:
+            break
+        inside.append(span)
+    for span in reversed(inside):
+        spans.append(span)
+        out.append(span[1])
+
+
+def to_html(nodes):
+    """
+    Render nodes as an HTML fragment. Newlines become <br> tags and
+    overlapping spans are closed and reopened so tags nest. Only http,
+    https, mailto and www. URLs become links and images; others are
+    written as text. Template output is markup already and is written
+    as is.
+    """
+    out = []
+    spans = []
+    for kind, value in nodes:
+        if kind == TEXT:
+            out.append(_escape_html(value).replace(u"\n", u"<br>\n"))
+        elif kind in _HTML_TAGS or kind == URL:
+            if not value:
+                _close(out, spans, kind)
+                continue
+            if kind == URL and not _safe_url_re.match(value):
+                # Kept as a span without a tag, so its end closes it.
+                tag = opening = u""
+            elif kind == URL:
+                tag = u"a"
+                opening = u'<a href="{0}">'.format(_escape_html(value))
+            else:
+                tag = _HTML_TAGS[kind]
+                opening = u"<{0}>".format(tag)
+            spans.append((kind, opening, tag))
+            out.append(opening)
+        elif kind == EMOJI:
+            out.append(value[1] or _escape_html(value[0]))
+        elif kind == BULLET:
+            out.append(u"•" + value)
+        else:
+            out.append(_html_entity(kind, value))
+    while spans:
+        tag = spans.pop()[2]
+        if tag:
+            out.append(u"</{0}>".format(tag))
+    return u"".join(out)
+
+
+def to_text(nodes):
+    """
+    Render nodes as plain text, for search indexes and the like: links
+    become their labels and templated users their template's text.
+    """
+    out = []
+    for kind, value in nodes:
+        if kind == TEXT:
+            out.append(value)
+        elif kind == LINK:
+            out.append(value[1])
+        elif kind == IMAGE:
+            out.append(value[0])
+        elif kind == USER:
+            user, templated = value
+            if templated is None:
+                out.append(u"@" + user)
+            else:
+                out.append(_tag_re.sub(u"", templated))
+        elif kind == CHANNEL:
+            out.append(u"#" + value)
+        elif kind == ANNOUNCEMENT:
+            out.append(u"@" + value)
+        elif kind == EMOJI:
+            out.append(value[1] or value[0])
+        elif kind == BULLET:
+            out.append(u"•" + value)
+    return u"".join(out)
@@ -0,0 +1,40 @@
+import re
+
+
+class LazyPattern(object):
+    """
+    A regular expression compiled the first time one of its attributes,
+    like match or sub, is used, so importing a module full of patterns
+    is cheap. Each attribute is then stored on the LazyPattern itself,
+    so later lookups cost no more than on the compiled pattern.
+    """
+
+    def __init__(self, pattern, flags=0):
+        self._pattern = pattern
+        self._flags = flags
+        self._compiled = None
+
+    def __getattr__(self, name):
+        # Only called for attributes not already stored.
+        if self._compiled is None:
+            # Threads racing here compile identical patterns.
+            self._compiled = re.compile(self._pattern, self._flags)
+        value = getattr(self._compiled, name)
+        setattr(self, name, value)
+        return value
+
+
+url_pattern = (
+    r"(?i)\b(?:[a-z][\w-]+:(?:/{1,3}|[a-z0-9%])|www\d{0,3}[.]|[a-z0-9.\-]+[.]"
+    r"[a-z]{2,4}/)(?:[^\s()<>\|]+|\([^\s()<>\|]+|\([^\s()<>\|]+\)*\))+(?:\([^"
+    r"""\s()<>\|]+|\([^\s()<>\|]+\)*\)|[^\s`!()\[\]{};:'".,<>\|?«»“”‘’])"""
+)
+
+
+emoji_pattern = u":[a-zA-Z0-9\+\-_&.ô’Åéãíç()!#*]+:"
+
+
+# Python 3.11+ only accepts global flags at the very start of an expression,
+# so patterns that embed url_pattern drop its inline flag and are compiled
+# with re.IGNORECASE instead.
+url_pattern_body = url_pattern[len("(?i)"):]
@@ -0,0 +1,575 @@
+"""
+Serve conversions over HTTP, for services that aren't written in Python.
+
+``markslack-server`` runs one converter behind a small HTTP/1.1 server
+built on the standard library. Connections are kept alive between
+requests.
+
+- ``POST /convert`` with ``{"text": "..."}`` returns ``{"markdown":
+  "..."}``. With ``{"texts": [...]}``, it returns a list of Markdown in
+  the same order.
+- ``GET /status`` returns counts, throughput and latency percentiles.
+
+Each connection is handled on its own thread, but conversion is done by
+a single dispatcher, which takes every request queued while it was busy
+as one batch of up to max_batch messages. A batch costs one user lookup
+for the users it mentions, see Converter.prefetch, and, with workers,
+one round trip to a worker process. A lone request is converted right
+away, unless batch_wait is set to hold each batch open that many
+seconds for more.
+
+One slow message holds up every request batched with it, so the server
+converts with limits on the work any one message can take: messages
+over MAX_LENGTH characters, or still converting after TIME_LIMIT
+seconds, are converted with the converter's fallback. See
+markslack.budget. An error converting one message is reported for that
+message alone, and a batch lost with a worker process fails its messages
+after TIMEOUT seconds.
+"""
+import argparse
+import collections
+import json
+import sys
+import threading
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+from markslack import batch, cli
+from markslack.stats import timer
+
+# Request bodies larger than this many bytes are refused.
+MAX_BODY = 16 << 20
+
+# Latencies kept for the percentiles on the status page.
+LATENCY_WINDOW = 10000
+
+PERCENTILES = (50, 90, 99)
+
+# Limits on each message, unless the server is given others. Slack
+# recommends keeping message text under 4,000 characters, and at that
+# length the slowest regex stage, pairing a long run of unmatched
+# asterisks, takes about 50ms rather than seconds.
+MAX_LENGTH = 4000
+TIME_LIMIT = 0.25
+
+# Seconds a request waits for its messages before they are reported as
+# failed, so a batch lost with a worker process, which never calls back,
+# can't hold its requests or its place in the pool forever.
+TIMEOUT = 60
+
+# Python 2's Pool.apply_async has no error_callback.
+_ERROR_CALLBACK = sys.version_info[0] > 2
+
+
+class _Pending(object):
+    """
+    A request's messages, waiting on the dispatcher.
+    """
+
+    __slots__ = ("texts", "results", "done")
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.results = None
+        self.done = threading.Event()
+
+    def finish(self, results):
+        self.results = results
+        self.done.set()
+
+
+class _Task(object):
+    """
+    A batch of requests sent to the worker pool.
+    """
+
+    __slots__ = ("requests", "size", "deadline")
+
+    def __init__(self, requests, size, deadline):
+        self.requests = requests
+        self.size = size
+        self.deadline = deadline
+
+
+def _failed(count, error):
+    return [(None, error)] * count
+
+
+def mark_each(converter, texts):
+    """
+    Convert a list of messages, returning a (markdown, error) pair for
+    each, where error is None or describes why that message couldn't be
+    converted.
+    """
+    try:
+        converter.prefetch(texts)
+    except Exception:
+        # Messages whose users couldn't be looked up together get their
+        # own lookup, and their own error if that fails too.
+        pass
+    results = []
+    for text in texts:
+        try:
+            results.append((converter.mark(text), None))
+        except Exception as error:
+            results.append((None, repr(error)))
+    return results
+
+
+def _mark_in_worker(texts):
+    return mark_each(batch.worker_converter(), texts)
+
+
+def _distribute(requests, results):
+    start = 0
+    for request in requests:
+        stop = start + len(request.texts)
+        request.finish(results[start:stop])
+        start = stop
+
+
+def limit(marker, max_length=MAX_LENGTH, time_limit=TIME_LIMIT):
+    """
+    Return marker's converter with max_length and time_limit in place of
+    its own limits. None turns a limit off.
+    """
+    converter = getattr(marker, "converter", marker)
+    if (converter.max_length, converter.time_limit) == (
+        max_length,
+        time_limit,
+    ):
+        return converter
+    return converter.replace(max_length=max_length, time_limit=time_limit)
+
+
+class ConversionService(object):
+    """
+    Convert the messages of concurrent requests in shared batches, in
+    this process or, with more than one worker, in a pool of worker
+    processes, each holding a copy of the converter. Messages are
+    converted with max_length and time_limit in place of the marker's
+    own limits; see limit().
+    """
+
+    def __init__(
+        self,
+        marker,
+        workers=1,
+        max_batch=256,
+        batch_wait=0,
+        max_length=MAX_LENGTH,
+        time_limit=TIME_LIMIT,
+        timeout=TIMEOUT,
+    ):
+        if max_batch < 1:
+            raise ValueError("max_batch must be at least 1")
+        self.converter = limit(marker, max_length, time_limit)
+        self.workers = workers
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait
+        self.timeout = timeout
+        self.started = timer()
+        self.requests = 0
+        self.messages = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched = 0
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self._queue = collections.deque()
+        self._queued = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._lock = threading.Lock()
+        self._pool = None
+        # Batches with the workers, and whether any were lost.
+        self._tasks = set()
+        self._lost = False
+        if workers > 1:
+            self._pool = batch.worker_pool(self.converter, workers)
+        self._dispatcher = threading.Thread(target=self._dispatch)
+        self._dispatcher.daemon = True
+        self._dispatcher.start()
+
+    def convert(self, texts):
+        """
+        Convert a list of messages along with those of other requests,
+        returning a (markdown, error) pair for each; see mark_each().
+        Messages not converted within timeout seconds get an error.
+        Raises RuntimeError if the service is closed.
+        """
+        start = timer()
+        request = _Pending(texts)
+        if texts:
+            with self._condition:
+                if self._closed:
+                    raise RuntimeError("The service is closed")
+                self._queue.append(request)
+                self._queued += len(texts)
+                self._condition.notify()
+            if request.done.wait(self.timeout):
+                results = request.results
+            else:
+                results = _failed(len(texts), "Timed out")
+        else:
+            results = []
+        errors = sum(1 for _, error in results if error is not None)
+        with self._lock:
+            self.requests += 1
+            self.messages += len(texts)
+            self.errors += errors
+            self._latencies.append(timer() - start)
+        return results
+
+    def _take(self):
+        """
+        Wait for a batch of requests, or return None once closed.
+        """
+        with self._condition:
+            while not self._queue and not self._closed:
+                self._condition.wait()
+            if not self._queue:
+                return None
+            deadline = timer() + self.batch_wait
+            while self._queued < self.max_batch and not self._closed:
+                remaining = deadline - timer()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            # Requests are never split, so a batch can exceed max_batch
+            # when its first request does.
+            requests = [self._queue.popleft()]
+            size = len(requests[0].texts)
+            while (
+                self._queue
+                and size + len(self._queue[0].texts) <= self.max_batch
+            ):
+                request = self._queue.popleft()
+                requests.append(request)
+                size += len(request.texts)
+            self._queued -= size
+        with self._lock:
+            self.batches += 1
+            self.batched += size
+        return requests
+
+    def _dispatch(self):
+        while True:
+            requests = self._take()
+            if requests is None:
+                return
+            texts = [text for request in requests for text in request.texts]
+            if self._pool is None:
+                _distribute(requests, mark_each(self.converter, texts))
+                continue
+
+            # Two batches per worker keep them busy without queueing
+            # unbounded work in the pool.
+            self._settle(self.workers * 2)
+            task = _Task(requests, len(texts), timer() + self.timeout)
+            with self._condition:
+                self._tasks.add(task)
+
+            def finished(results, task=task):
+                self._finish(task, results)
+
+            def failed(error, task=task):
+                self._finish(task, _failed(task.size, repr(error)))
+
+            callbacks = {"callback": finished}
+            if _ERROR_CALLBACK:
+                callbacks["error_callback"] = failed
+            self._pool.apply_async(_mark_in_worker, (texts,), **callbacks)
+
+    def _finish(self, task, results):
+        with self._condition:
+            if task not in self._tasks:
+                # Already failed as lost.
+                return
+            self._tasks.remove(task)
+            self._condition.notify()
+        _distribute(task.requests, results)
+
+    def _settle(self, most):
+        """
+        Wait until fewer than most batches are with the workers, failing
+        those past their deadline as lost.
+        """
+        lost = []
+        with self._condition:
+            while len(self._tasks) >= most:
+                now = timer()
+                overdue = [t for t in self._tasks if t.deadline <= now]
+                if not overdue:
+                    deadline = min(t.deadline for t in self._tasks)
+                    self._condition.wait(deadline - now)
+                    continue
+                for task in overdue:
+                    self._tasks.remove(task)
+                lost.extend(overdue)
+                self._lost = True
+        for task in lost:
+            _distribute(task.requests, _failed(task.size, "Timed out"))
+
+    def stats(self):
+        """
+        Return a dictionary of counts since the service started, with
+        throughput in messages per second and latency percentiles, in
+        milliseconds, over the last LATENCY_WINDOW requests. errors
+        counts messages. Without workers, fallbacks counts the messages
+        converted with the fallback, by the limit they went over.
+        """
+        with self._lock:
+            uptime = timer() - self.started
+            latencies = sorted(self._latencies)
+            stats = {
+                "uptime": uptime,
+                "requests": self.requests,
+                "messages": self.messages,
+                "errors": self.errors,
+                "batches": self.batches,
+                "mean_batch": (
+                    float(self.batched) / self.batches if self.batches else 0
+                ),
+                "messages_per_second": (
+                    self.messages / uptime if uptime > 0 else 0
+                ),
+                "workers": self.workers,
+            }
+        latency = {}
+        if latencies:
+            last = len(latencies) - 1
+            for percentile in PERCENTILES:
+                index = int(round(last * percentile / 100.0))
+                latency["p{0}".format(percentile)] = latencies[index] * 1000
+            latency["max"] = latencies[-1] * 1000
+        stats["latency_ms"] = latency
+        cache_info = self.converter.cache_info()
+        if cache_info is not None:
+            stats["cache"] = cache_info._asdict()
+        fallback_info = self.converter.fallback_info()
+        if fallback_info is not None and self._pool is None:
+            stats["fallbacks"] = fallback_info._asdict()
+        return stats
+
+    def close(self):
+        """
+        Convert what's queued, then stop the dispatcher and any workers.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._dispatcher.join()
+        if self._pool is not None:
+            self._settle(1)
+            if self._lost:
+                # A pool with lost tasks never finishes closing.
+                self._pool.terminate()
+            else:
+                self._pool.close()
+            self._pool.join()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "markslack"
+    # Headers and body are written separately, and with Nagle's algorithm
+    # on, the body waits on the client's delayed ACK of the headers.
+    disable_nagle_algorithm = True
+
+    def _send(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status, message):
+        self._send(status, {"error": message})
+
+    def _read(self):
+        """
+        Return the list of messages in the request body and whether it
+        held a single one, or None if an error was sent instead.
+        """
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_BODY:
+            self.close_connection = True
+            self._error(413, "Body must be at most {0} bytes".format(MAX_BODY))
+            return None
+        try:
+            request = json.loads(self.rfile.read(length).decode("utf-8"))
+        except ValueError as error:
+            self._error(400, "Invalid JSON: {0}".format(error))
+            return None
+        if isinstance(request, dict):
+            if isinstance(request.get("text"), type(u"")):
+                return [request["text"]], True
+            texts = request.get("texts")
+            if isinstance(texts, list) and all(
+                isinstance(text, type(u"")) for text in texts
+            ):
+                return texts, False
+        self._error(400, 'Send {"text": "..."} or {"texts": ["...", ...]}')
+        return None
+
+    def do_POST(self):
+        if self.path != "/convert":
+            self._error(404, "Not found")
+            return
+        read = self._read()
+        if read is None:
+            return
+        texts, single = read
+        try:
+            results = self.server.service.convert(texts)
+        except RuntimeError as error:
+            self._error(500, str(error))
+            return
+        if single:
+            markdown, error = results[0]
+            if error is not None:
+                self._error(500, error)
+            else:
+                self._send(200, {"markdown": markdown})
+            return
+        # Messages that couldn't be converted get null Markdown and an
+        # entry in errors.
+        body = {"markdown": [markdown for markdown, _ in results]}
+        errors = [
+            {"index": index, "error": error}
+            for index, (_, error) in enumerate(results)
+            if error is not None
+        ]
+        if errors:
+            body["errors"] = errors
+        self._send(200, body)
+
+    def do_GET(self):
+        if self.path != "/status":
+            self._error(404, "Not found")
+            return
+        self._send(200, self.server.service.stats())
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    # Many clients connect at once to a sidecar. The default backlog of
+    # five resets the connections past it.
+    request_queue_size = 128
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        self.service.close()
+
+
+def make_server(
+    marker,
+    host="127.0.0.1",
+    port=8080,
+    workers=1,
+    max_batch=256,
+    batch_wait=0,
+    verbose=False,
+    max_length=MAX_LENGTH,
+    time_limit=TIME_LIMIT,
+    timeout=TIMEOUT,
+):
+    """
+    Return an HTTP server for marker, a MarkSlack or Converter, with the
+    ConversionService it uses as its service attribute. Call its
+    serve_forever() method to run it and server_close() to stop
+    converting. Port 0 picks a free port; see server_address. Messages
+    are converted with max_length and time_limit in place of marker's
+    own limits; pass None to turn either off. Messages not converted
+    within timeout seconds get an error.
+    """
+    service = ConversionService(
+        marker,
+        workers,
+        max_batch,
+        batch_wait,
+        max_length,
+        time_limit,
+        timeout,
+    )
+    try:
+        server = _Server((host, port), _Handler)
+    except Exception:
+        service.close()
+        raise
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="markslack-server", description=__doc__.strip().splitlines()[0]
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes to convert with.",
+    )
+    parser.add_argument(
+        "--max-batch",
+        type=int,
+        default=256,
+        help="Most messages converted in one batch.",
+    )
+    parser.add_argument(
+        "--batch-wait",
+        type=float,
+        default=0,
+        help="Milliseconds to wait for more requests to batch together.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=TIMEOUT,
+        help="Seconds a request waits for its messages to be converted.",
+    )
+    parser.add_argument("--verbose", action="store_true")
+    cli.add_converter_options(parser)
+    parser.set_defaults(max_length=MAX_LENGTH, time_limit=TIME_LIMIT)
+    args = parser.parse_args(argv)
+
+    server = make_server(
+        cli.make_converter(args),
+        args.host,
+        args.port,
+        args.workers,
+        args.max_batch,
+        args.batch_wait / 1000.0,
+        args.verbose,
+        args.max_length,
+        args.time_limit,
+        args.timeout,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
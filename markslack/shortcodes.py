@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+The emoji shortcode index.
+
+Built on first use from the emoji package's alias table, plus the
+Slack names it lacks and Slack's skin-tone modifiers, which follow an
+emoji as a second shortcode, e.g. ":wave::skin-tone-3:". Loading the
+emoji package takes longer than importing the rest of markslack, so
+programs that never replace emoji never pay for it.
+"""
+
+
+SLACK_ALIASES = {
+    u":-1:": u"\U0001F44E",
+    u":exploding_head:": u"\U0001F92F",
+    u":face_palm:": u"\U0001F926",
+    u":face_with_head_bandage:": u"\U0001F915",
+    u":facepalm:": u"\U0001F926",
+    u":fist_raised:": u"✊",
+    u":hand_with_index_and_middle_fingers_crossed:": u"\U0001F91E",
+    u":hugs:": u"\U0001F917",
+    u":large_green_circle:": u"\U0001F7E2",
+    u":man-facepalming:": u"\U0001F926‍♂️",
+    u":man-shrugging:": u"\U0001F937‍♂️",
+    u":money_mouth_face:": u"\U0001F911",
+    u":partying_face:": u"\U0001F973",
+    u":shrug:": u"\U0001F937",
+    u":simple_smile:": u"\U0001F642",
+    u":spock-hand:": u"\U0001F596",
+    u":star-struck:": u"\U0001F929",
+    u":the_horns:": u"\U0001F918",
+    u":upside_down_face:": u"\U0001F643",
+    u":woman-facepalming:": u"\U0001F926‍♀️",
+    u":woman-shrugging:": u"\U0001F937‍♀️",
+    u":zany_face:": u"\U0001F92A",
+    u":zipper_mouth_face:": u"\U0001F910",
+}
+
+SKIN_TONES = {
+    u":skin-tone-2:": u"\U0001F3FB",
+    u":skin-tone-3:": u"\U0001F3FC",
+    u":skin-tone-4:": u"\U0001F3FD",
+    u":skin-tone-5:": u"\U0001F3FE",
+    u":skin-tone-6:": u"\U0001F3FF",
+}
+
+
+def build_index():
+    """
+    Return a dictionary mapping every known shortcode to its emoji.
+    """
+    from emoji import unicode_codes
+
+    index = dict(unicode_codes.EMOJI_ALIAS_UNICODE)
+    for table in (SLACK_ALIASES, SKIN_TONES):
+        for code, emoji in table.items():
+            index.setdefault(code, emoji)
+    return index
+
+
+_index = None
+
+
+def index():
+    """
+    Return the shortcode index, building it the first time.
+    """
+    global _index
+    if _index is None:
+        # Threads racing here build identical indexes.
+        _index = build_index()
+    return _index
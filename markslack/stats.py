@@ -0,0 +1,52 @@
+"""
+Per-stage timing and counters for instrumented converters.
+"""
+import collections
+import threading
+import timeit
+
+
+StageStats = collections.namedtuple(
+    "StageStats", ["calls", "seconds", "substitutions"]
+)
+
+timer = timeit.default_timer
+
+
+class Recorder(object):
+    """
+    Accumulate call counts, wall time and substitution counts for each
+    conversion stage, and optionally pass every measurement to a callback
+    as callback(stage, seconds, substitutions). Safe to share between
+    threads.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, substitutions):
+        with self._lock:
+            totals = self._stages.get(stage)
+            if totals is None:
+                totals = self._stages[stage] = [0, 0.0, 0]
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += substitutions
+        if self.callback is not None:
+            self.callback(stage, seconds, substitutions)
+
+    def snapshot(self):
+        """
+        Return a dictionary of StageStats keyed by stage name.
+        """
+        with self._lock:
+            return dict(
+                (stage, StageStats(*totals))
+                for stage, totals in self._stages.items()
+            )
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
@@ -0,0 +1,216 @@
+"""
+Convert documents too large to hold in memory, a line at a time.
+
+mark() builds the whole Markdown in memory, along with copies of the
+text from every stage. mark_stream() reads text from a file-like object
+and writes Markdown to another as it goes, so its memory use is bounded
+by the longest line rather than the whole document.
+
+Lines are converted by the tokens engine, whatever engine is set, so
+the output is what ``mark()`` gives with the tokens engine. Emphasis
+pairs within a line, so most lines are written out once converted. Two
+things reach across lines:
+
+- Unmatched underscores are escaped unless an unreplaced shortcode
+  comes before the next URL. Output with such underscores in it is held
+  back, written both escaped and as is, until a URL or shortcode
+  decides which copy to send on. Past SPOOL_SIZE characters, the copies
+  are spilled to temporary files.
+- With remove_bad_emoji, a dropped shortcode takes the whitespace on
+  one side of it, newlines included. Lines around one are converted
+  together.
+"""
+import io
+import os
+import shutil
+import tempfile
+
+from markslack import batch, nodes, tokens
+
+# Characters of held output kept in memory before spilling to disk.
+SPOOL_SIZE = 1 << 20
+
+
+class _Spool(object):
+    """
+    Text held back from output, in memory up to SPOOL_SIZE characters
+    and in a temporary file after that.
+    """
+
+    def __init__(self):
+        self.pieces = []
+        self.size = 0
+        self.file = None
+        self.path = None
+
+    def write(self, text):
+        if self.file is None:
+            self.pieces.append(text)
+            self.size += len(text)
+            if self.size <= SPOOL_SIZE:
+                return
+            handle, self.path = tempfile.mkstemp(suffix=".part")
+            self.file = io.open(handle, "w+", encoding="utf-8")
+            text = u"".join(self.pieces)
+            self.pieces = []
+        self.file.write(text)
+
+    def copy(self, output):
+        if self.file is None:
+            for piece in self.pieces:
+                output.write(piece)
+        else:
+            self.file.seek(0)
+            shutil.copyfileobj(self.file, output)
+
+    def clear(self):
+        self.pieces = []
+        self.size = 0
+        if self.file is not None:
+            self.file.close()
+            os.remove(self.path)
+            self.file = None
+
+
+class _Writer(nodes.Writer):
+    """
+    A nodes.Writer that sends Markdown to output as soon as nothing
+    later can change it.
+    """
+
+    __slots__ = ("output", "plain", "escaped", "holding")
+
+    def __init__(self, output):
+        super(_Writer, self).__init__()
+        self.output = output
+        self.plain = _Spool()
+        self.escaped = _Spool()
+        self.holding = False
+
+    def _release(self, escape):
+        if self.holding:
+            (self.escaped if escape else self.plain).copy(self.output)
+            self.plain.clear()
+            self.escaped.clear()
+            self.holding = False
+
+    def _send(self):
+        if self.out:
+            self.output.write(u"".join(self.out))
+            # Emptied in place, since lines are rendered through a bound
+            # out.append.
+            del self.out[:]
+
+    def boundary(self):
+        self._release(not self.exempt)
+        super(_Writer, self).boundary()
+        self._send()
+
+    def flush(self):
+        """
+        Write out the Markdown collected so far, or hold it back if it
+        has underscores whose escaping isn't decided yet.
+        """
+        if self.exempt:
+            # Nothing before the next URL will be escaped.
+            self._release(False)
+            self._send()
+            self.underscores = []
+        elif self.underscores or self.holding:
+            self.plain.write(u"".join(self.out))
+            for index in self.underscores:
+                self.out[index] = u"\\_"
+            self.escaped.write(u"".join(self.out))
+            del self.out[:]
+            self.underscores = []
+            self.holding = True
+        else:
+            self._send()
+
+    def close(self):
+        self.plain.clear()
+        self.escaped.clear()
+
+
+def _sticky(token):
+    """
+    Return whether token can take part in dropping a bad emoji along
+    with the whitespace next to it: a shortcode, or the dots that may
+    trail the last one.
+    """
+    kind, value = token
+    return kind == tokens.SHORTCODE or (
+        kind == tokens.TEXT and not value.strip().strip(u".")
+    )
+
+
+def _edges(line):
+    """
+    Return the first and last tokens in a line that aren't whitespace,
+    or None for a blank line.
+    """
+    solid = [
+        token
+        for token in line
+        if token[0] != tokens.NEWLINE
+        and not (token[0] == tokens.TEXT and not token[1].strip())
+    ]
+    if not solid:
+        return None
+    return solid[0], solid[-1]
+
+
+def _groups(converter, lines):
+    """
+    Yield lists of tokens for runs of lines that convert independently
+    of each other: single lines, except where a bad emoji to be removed
+    could take a newline with it.
+    """
+    if not converter.remove_bad_emoji:
+        for line in lines:
+            yield tokens.lex(converter, line)
+        return
+
+    group = []
+    last = None
+    for line in lines:
+        lexed = tokens.lex(converter, line)
+        edges = _edges(lexed)
+        if edges is not None:
+            if group and not (
+                (last is not None and _sticky(last)) or _sticky(edges[0])
+            ):
+                yield group
+                group = []
+            last = edges[1]
+        group.extend(lexed)
+    if group:
+        yield group
+
+
+def _prefetched(converter, source, chunksize):
+    size = batch.read_ahead(converter, chunksize)
+    for chunk in batch.chunks(source, size):
+        converter.prefetch(chunk)
+        for line in chunk:
+            yield line
+
+
+def mark_stream(converter, source, output, chunksize=256):
+    """
+    Convert the text read from source, a file-like object or any
+    iterable of lines, writing the Markdown to output. The users
+    mentioned in every chunksize lines are looked up together; see
+    Converter.prefetch.
+    """
+    writer = _Writer(output)
+    lines = _prefetched(converter, source, chunksize)
+    try:
+        for group in _groups(converter, lines):
+            if converter.remove_bad_emoji:
+                tokens.drop_bad_emoji(group)
+            tokens.write(group, writer)
+            writer.flush()
+        writer.boundary()
+    finally:
+        writer.close()
@@ -0,0 +1,146 @@
+import asyncio
+import gc
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from markslack import MarkSlack, aio
+
+marker = MarkSlack()
+LONG = "*long* message with a <http://a.com|link> " * 100
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+async def collect(messages):
+    return [markdown async for markdown in messages]
+
+
+def test_amark():
+    assert run(marker.amark("*a*")) == "**a**"
+    assert run(marker.amark(LONG)) == marker.mark(LONG)
+
+
+def test_amark_many():
+    messages = ["*a*", LONG, "_b_"] * 5
+    expected = [marker.mark(message) for message in messages]
+    assert run(collect(marker.amark_many(messages))) == expected
+
+    async def source():
+        for message in messages:
+            yield message
+
+    assert run(collect(marker.amark_many(source(), 2))) == expected
+
+
+def test_amark_many_reads_ahead_at_most_concurrency():
+    read = []
+
+    def messages():
+        for index in range(10):
+            read.append(index)
+            yield LONG
+
+    async def first(concurrency):
+        batch = marker.amark_many(messages(), concurrency)
+        await batch.__anext__()
+        await batch.aclose()
+
+    run(first(3))
+    assert len(read) == 3
+
+
+class Slow(object):
+    """
+    Take a while over each message, recording the most conversions that
+    ran at once.
+    """
+
+    def __init__(self):
+        self.running = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def mark(self, text):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            time.sleep(0.05)
+            return text
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+def test_concurrency_limit():
+    with pytest.raises(ValueError):
+        aio.AsyncConverter(marker.converter, concurrency=0)
+
+    slow = Slow()
+    # More threads than the limit, so only the limit keeps calls apart.
+    executor = ThreadPoolExecutor(8)
+
+    async def convert():
+        limited = aio.AsyncConverter(
+            slow, concurrency=2, executor=executor, inline_limit=0
+        )
+        return await asyncio.gather(*[limited.mark(str(i)) for i in range(8)])
+
+    try:
+        assert run(convert()) == [str(i) for i in range(8)]
+    finally:
+        executor.shutdown()
+    assert slow.peak == 2
+
+
+def test_amark_limits_executor():
+    slow = Slow()
+    executor = ThreadPoolExecutor(12)
+
+    async def convert():
+        texts = [str(i) for i in range(12)]
+        return await asyncio.gather(
+            *[
+                aio.amark(slow, text, executor=executor, inline_limit=0)
+                for text in texts
+            ]
+        )
+
+    try:
+        assert run(convert()) == [str(i) for i in range(12)]
+    finally:
+        executor.shutdown()
+    assert slow.peak == aio.CONCURRENCY
+
+
+def test_amark_many_error_retrieves_pending():
+    class Failing(object):
+        def mark(self, text):
+            raise ValueError(text)
+
+    unretrieved = []
+
+    async def first():
+        asyncio.get_event_loop().set_exception_handler(
+            lambda loop, context: unretrieved.append(context)
+        )
+        limited = aio.AsyncConverter(Failing(), concurrency=3, inline_limit=0)
+        batch = limited.mark_many(["a", "b", "c", "d"])
+        with pytest.raises(ValueError):
+            await batch.__anext__()
+        # Let the other conversions finish, then drop them.
+        await asyncio.sleep(0.05)
+        del batch
+        gc.collect()
+
+    run(first())
+    assert unretrieved == []
@@ -0,0 +1,49 @@
+import itertools
+import time
+
+from markslack import MarkSlack, batch
+from markslack.dedup import Deduplicator
+
+
+def test_mark_many():
+    marker = MarkSlack()
+    messages = ["*{0}* :thumbsup:".format(i) for i in range(200)]
+    expected = ["**{0}** 👍".format(i) for i in range(200)]
+
+    assert list(marker.mark_many(messages, workers=2, chunksize=16)) == (
+        expected
+    )
+    assert list(marker.mark_many(iter(messages), workers=1)) == expected
+
+    unordered = marker.mark_many(messages, workers=2, ordered=False)
+    assert sorted(unordered) == list(enumerate(expected))
+
+
+def test_mark_many_reads_a_bounded_distance_ahead():
+    read = []
+
+    def messages():
+        for i in itertools.count():
+            read.append(i)
+            yield "*{0}*".format(i % 100)
+
+    for ordered, dedup in (
+        (True, None),
+        (False, None),
+        (True, Deduplicator()),
+    ):
+        del read[:]
+        results = MarkSlack().mark_many(
+            messages(), workers=2, chunksize=16, ordered=ordered, dedup=dedup
+        )
+        first = next(results)
+        if not ordered:
+            # Whichever chunk finishes first comes first.
+            index, first = first
+            assert first == "**{0}**".format(index)
+        else:
+            assert first == "**0**"
+        # The consumer stalls, and the workers catch up.
+        time.sleep(0.3)
+        assert len(read) <= (2 * batch.IN_FLIGHT + 1) * 16
+        results.close()
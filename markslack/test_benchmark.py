@@ -0,0 +1,26 @@
+from markslack import benchmark
+
+
+def test_generate_corpus():
+    corpus = benchmark.generate_corpus(50, seed=1)
+    assert len(corpus) == 50
+    assert corpus == benchmark.generate_corpus(50, seed=1)
+    plain = benchmark.generate_corpus(
+        50, shares=dict((name, 0) for name in benchmark.SHARES), bullets=0
+    )
+    assert not any("<" in message or ":" in message for message in plain)
+
+
+def test_run():
+    corpus = benchmark.generate_corpus(20)
+    results = benchmark.run(corpus, {"default": {}}, repeat=1)
+    assert [result["config"] for result in results] == ["default"]
+    assert results[0]["messages_per_second"] > 0
+    assert results[0]["bytes_per_second"] > 0
+
+
+def test_run_imports():
+    results = benchmark.run_imports({"import": "import markslack"}, repeat=1)
+    assert [result["statement"] for result in results] == ["import"]
+    assert results[0]["seconds"] > 0
+    assert results[0]["import_microseconds"] > 0
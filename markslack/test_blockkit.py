@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+from markslack import MarkSlack
+
+
+def rich_text(*elements):
+    return [{"type": "rich_text", "elements": list(elements)}]
+
+
+def section(*elements):
+    return {"type": "rich_text_section", "elements": list(elements)}
+
+
+def text(value, **style):
+    element = {"type": "text", "text": value}
+    if style:
+        element["style"] = style
+    return element
+
+
+MESSAGE = rich_text(
+    section(
+        text("Hello ", bold=True),
+        text("world", bold=True, italic=True),
+        text(" a_b "),
+        text("gone", strike=True),
+        text(" "),
+        text("x_y*", code=True),
+        text(" "),
+        {"type": "emoji", "name": "wave", "skin_tone": 3},
+        text(" "),
+        {"type": "user", "user_id": "U1"},
+        text(" in "),
+        {"type": "channel", "channel_id": "C1"},
+        text(" "),
+        {"type": "broadcast", "range": "here"},
+        text(" "),
+        {"type": "link", "url": "http://a.com/x_y", "text": "a_site"},
+        text(" "),
+        {"type": "link", "url": "http://a.com/img.png"},
+        text("\n"),
+    ),
+    {
+        "type": "rich_text_list",
+        "style": "bullet",
+        "elements": [section(text("one")), section(text("two"))],
+    },
+    {
+        "type": "rich_text_list",
+        "style": "ordered",
+        "indent": 1,
+        "elements": [section(text("three"))],
+    },
+    {"type": "rich_text_quote", "elements": [text("quoted\nlines")]},
+    {
+        "type": "rich_text_preformatted",
+        "elements": [text("*raw* _code_")],
+    },
+)
+
+
+def test_mark_blocks():
+    marker = MarkSlack(user_templates={"U1": "Some One"})
+    assert marker.mark_blocks(MESSAGE) == (
+        u"**Hello** ***world*** a\\_b ~~gone~~ `x_y*` 👋🏼 Some One in #C1 "
+        u'<span class="slack-announcement">@here</span> '
+        u"[a\\_site](http://a.com/x_y) ![](http://a.com/img.png)\n"
+        u"+ one\n+ two\n    1. three\n> quoted\n> lines\n"
+        u"```\n*raw* _code_\n```"
+    )
+
+
+def test_mark_blocks_matches_mark():
+    marker = MarkSlack()
+    blocks = rich_text(
+        section(
+            text("bold", bold=True),
+            text(" and "),
+            text("italic", italic=True),
+            text(" snake_case "),
+            {"type": "link", "url": "http://a.com", "text": "a"},
+            text(" "),
+            {"type": "emoji", "name": "thumbsup"},
+        )
+    )
+    slack = "*bold* and _italic_ snake_case <http://a.com|a> :thumbsup:"
+    assert marker.mark_blocks(blocks) == marker.mark(slack)
+
+
+def test_mark_blocks_options():
+    emoji = rich_text(
+        section(
+            {"type": "emoji", "name": "not_an_emoji"},
+            {"type": "emoji", "name": "custom", "unicode": "1f600"},
+        )
+    )
+    assert MarkSlack().mark_blocks(emoji) == u":not_an_emoji:😀"
+    assert MarkSlack(remove_bad_emoji=True).mark_blocks(emoji) == u"😀"
+    assert MarkSlack(replace_emoji=False).mark_blocks(emoji) == (
+        ":not_an_emoji::custom:"
+    )
+
+    links = rich_text(
+        section(
+            {"type": "link", "url": "https://twitter.com/x", "text": "x"},
+            {"type": "link", "url": "http://a.com/b.jpg"},
+        )
+    )
+    marker = MarkSlack(
+        link_templates={"twitter.com": "<tweet {}>"},
+        image_template="<img {}>",
+    )
+    assert marker.mark_blocks(links) == (
+        "<tweet https://twitter.com/x><img http://a.com/b.jpg>"
+    )
+    skipped = [{"type": "section", "text": {"type": "mrkdwn", "text": "*a*"}}]
+    assert marker.mark_blocks(skipped) == ""
@@ -0,0 +1,66 @@
+import pickle
+
+import pytest
+
+import markslack
+from markslack import MarkSlack, tokens
+
+MESSAGE = u"*a* _b_ <@U_1> :thumbsup: ~c~ http://x.com/_q_ (d)"
+
+
+def test_max_length():
+    for engine in markslack.ENGINES:
+        marker = MarkSlack(engine=engine, max_length=10)
+        assert marker.mark(MESSAGE) == (
+            u"\\*a\\* \\_b\\_ @U\\_1 👍 \\~c\\~ http://x.com/_q_ (d)"
+        )
+        assert marker.mark(u"*short*") == u"**short**"
+        assert marker.fallback_info() == (1, 0)
+
+        marker.fallback = "escape"
+        assert marker.mark(MESSAGE) == (
+            u"\\*a\\* \\_b\\_ \\<@U\\_1\\> :thumbsup: \\~c\\~ "
+            u"http://x.com/\\_q\\_ \\(d\\)"
+        )
+    assert MarkSlack().fallback_info() is None
+    with pytest.raises(ValueError):
+        MarkSlack(fallback="drop")
+
+    converter = pickle.loads(pickle.dumps(MarkSlack(max_length=10).compile()))
+    assert converter.max_length == 10
+    assert converter.fallback_info() == (0, 0)
+
+
+def test_time_limit(monkeypatch):
+    # Every reading of the clock is a second later than the last.
+    clock = iter(range(1000))
+    monkeypatch.setattr(markslack, "timer", lambda: next(clock))
+    monkeypatch.setattr(tokens, "timer", lambda: next(clock))
+    for engine in markslack.ENGINES:
+        marker = MarkSlack(engine=engine, time_limit=1.5, instrument=True)
+        assert marker.mark(MESSAGE).startswith(u"\\*a\\*")
+        assert marker.fallback_info() == (0, 1)
+        assert marker.stats()["fallback"].calls == 1
+
+        marker.time_limit = 1000
+        assert marker.mark(MESSAGE).startswith(u"**a**")
+
+
+def test_fallbacks_not_cached(monkeypatch):
+    clock = iter(range(1000))
+    monkeypatch.setattr(markslack, "timer", lambda: next(clock))
+    lexed = []
+    lex = tokens.lex
+    monkeypatch.setattr(
+        tokens, "lex", lambda *args: lexed.append(args) or lex(*args)
+    )
+    marker = MarkSlack(engine="tokens", time_limit=0.5, cache_size=10)
+    assert marker.mark(MESSAGE).startswith(u"\\*a\\*")
+    # The fallback renders the tokens lexed before time ran out.
+    assert len(lexed) == 1
+    assert marker.cache_info().currsize == 0
+
+    marker.time_limit = 1000
+    assert marker.mark(MESSAGE).startswith(u"**a**")
+    assert marker.mark(MESSAGE).startswith(u"**a**")
+    assert marker.cache_info()[:2] == (1, 1)
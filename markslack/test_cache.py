@@ -0,0 +1,16 @@
+from markslack import MarkSlack
+
+
+def test_result_cache():
+    marker = MarkSlack(cache_size=2)
+    assert marker.mark("*a*") == "**a**"
+    assert marker.mark("*a*") == "**a**"
+    assert marker.mark("_b_") == "*b*"
+    assert marker.mark("~c~") == "~~c~~"
+    assert marker.mark("*a*") == "**a**"
+
+    info = marker.cache_info()
+    assert (info.hits, info.misses, info.evictions) == (1, 4, 2)
+    assert (info.maxsize, info.currsize) == (2, 2)
+
+    assert MarkSlack().cache_info() is None
@@ -0,0 +1,107 @@
+import io
+import itertools
+import json
+import time
+
+import pytest
+
+from markslack import MarkSlack, batch, cli
+
+RECORDS = [
+    {"ts": "1", "text": "*hello* :thumbsup: <@U1>"},
+    {"ts": "2", "text": "<https://twitter.com/x>"},
+    {"ts": "3"},
+]
+
+
+@pytest.fixture
+def messages(tmpdir):
+    path = tmpdir.join("messages.jsonl")
+    path.write_text(
+        u"\n".join(json.dumps(record) for record in RECORDS) + u"\n\n",
+        encoding="utf-8",
+    )
+    return str(path)
+
+
+def test_convert_lines():
+    lines = [json.dumps(record) + "\n" for record in RECORDS]
+    converter = MarkSlack().compile()
+    for workers in (1, 2):
+        output = list(
+            cli.convert_lines(converter, lines, workers=workers, chunksize=1)
+        )
+        assert [json.loads(line)["markdown"] for line in output] == [
+            u"**hello** 👍 @U1",
+            "[https://twitter.com/x](https://twitter.com/x)",
+            "",
+        ]
+    text = list(cli.convert_lines(converter, ["*a*\n", "_b_"], "text"))
+    assert text == ["**a**\n", "*b*\n"]
+
+
+def test_convert_lines_reads_a_bounded_distance_ahead():
+    read = []
+
+    def lines():
+        for i in itertools.count():
+            read.append(i)
+            yield "*{0}*\n".format(i)
+
+    converter = MarkSlack().compile()
+    output = cli.convert_lines(
+        converter, lines(), "text", workers=2, chunksize=8
+    )
+    assert next(output) == "**0**\n"
+    # Downstream stalls, like a full pipe.
+    time.sleep(0.3)
+    assert len(read) <= (2 * batch.IN_FLIGHT + 1) * 8
+    output.close()
+
+
+def test_main(messages, tmpdir, capfd):
+    users = tmpdir.join("users.json")
+    users.write_text(u'{"U1": "Some One"}', encoding="utf-8")
+    links = tmpdir.join("links.json")
+    links.write_text(u'{"twitter.com": "<tweet {}>"}', encoding="utf-8")
+    assert (
+        cli.main(
+            [
+                messages,
+                "--user-templates",
+                str(users),
+                "--link-templates",
+                str(links),
+                "--no-replace-emoji",
+                "--output-field",
+                "md",
+            ]
+        )
+        == 0
+    )
+    output = [json.loads(line) for line in capfd.readouterr().out.splitlines()]
+    assert [record["md"] for record in output] == [
+        "**hello** :thumbsup: Some One",
+        "<tweet https://twitter.com/x>",
+        "",
+    ]
+    assert output[0]["ts"] == "1"
+
+
+def test_main_bad_line(tmpdir, capfd):
+    path = tmpdir.join("bad.jsonl")
+    with io.open(str(path), "w", encoding="utf-8") as bad:
+        bad.write(u'{"text": "a"}\n[1]\n')
+    assert cli.main([str(path)]) == 1
+    assert "line 2" in capfd.readouterr().err
+
+    with io.open(str(path), "w", encoding="utf-8") as bad:
+        bad.write(u'{"text": null}\n{"text": 5}\n')
+    assert cli.main([str(path)]) == 1
+    assert "line 2: text is not a string" in capfd.readouterr().err
+
+
+def test_main_document_workers(capfd):
+    with pytest.raises(SystemExit):
+        cli.main(["--format", "document", "--workers", "2"])
+    assert "--workers" in capfd.readouterr().err
@@ -0,0 +1,132 @@
+import subprocess
+import sys
+
+from markslack import MarkSlack
+
+
+def test_compiled_converter():
+    import pickle
+
+    link_templates = {"twitter.com": "<tweet {}>"}
+    converter = MarkSlack(link_templates=link_templates).compile()
+
+    assert converter.mark("*bold* <https://twitter.com/jack>") == (
+        "**bold** <tweet https://twitter.com/jack>"
+    )
+
+    clone = pickle.loads(pickle.dumps(converter))
+    assert clone.mark("*bold* <https://twitter.com/jack>") == (
+        "**bold** <tweet https://twitter.com/jack>"
+    )
+
+    try:
+        converter.replace_emoji = False
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError("Converter should be immutable")
+
+
+def test_reconfigure_recompiles():
+    marker = MarkSlack()
+    assert marker.mark(":cry:") == "😢"
+    marker.replace_emoji = False
+    assert marker.mark(":cry:") == ":cry:"
+
+
+def test_template_changes_in_place():
+    users = {}
+    links = {"a.com": "<a {}>"}
+    marker = MarkSlack(user_templates=users, link_templates=links)
+    converter = marker.compile()
+
+    # User templates are shared with compiled converters.
+    users["U1"] = "<one>"
+    assert marker.mark("<@U1>") == "<one>"
+    assert converter.mark("<@U1>") == "<one>"
+
+    # Link templates are compiled, so changes need a recompile.
+    links["b.com"] = "<b {}>"
+    assert marker.mark("<http://b.com/x>") == (
+        "[http://b.com/x](http://b.com/x)"
+    )
+    marker.recompile()
+    assert marker.mark("<http://b.com/x>") == "<b http://b.com/x>"
+    assert converter.mark("<http://b.com/x>") == (
+        "[http://b.com/x](http://b.com/x)"
+    )
+
+
+def test_shared_across_threads():
+    import sys
+    import threading
+
+    options = {
+        "user_templates": {"someuser": "<someone>"},
+        "link_templates": {"twitter.com": "<tweet {}>"},
+    }
+    messages = []
+    for i in range(50):
+        if i % 3:
+            messages.append("a *test* of _italic_ and ~strike~ {0}".format(i))
+        else:
+            messages.append(
+                "<@someuser> at <https://twitter.com/{0}> :+1:".format(i)
+            )
+    # Expected output from a fresh converter per message
+    expected = [MarkSlack(**options).mark(message) for message in messages]
+
+    def work(shared, offset, failures):
+        for _ in range(20):
+            for i in range(len(messages)):
+                index = (i + offset) % len(messages)
+                if shared.mark(messages[index]) != expected[index]:
+                    failures.append(index)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        # Without and with a result cache smaller than the message set
+        for cache_size in (None, 8):
+            shared = MarkSlack(cache_size=cache_size, **options)
+            failures = []
+            threads = [
+                threading.Thread(target=work, args=(shared, n, failures))
+                for n in range(16)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert failures == []
+    finally:
+        sys.setswitchinterval(interval)
+
+
+def test_planned_stages():
+    regex = MarkSlack(engine="regex", instrument=True)
+    assert regex.mark("Just a plain sentence.") == "Just a plain sentence."
+    assert regex.stats() == {}
+    regex.mark("a ~b~ and :+1:")
+    assert set(regex.stats()) == set(["mark_emoji", "mark_strikethrough"])
+
+    # Templates can bring in characters that trigger later stages.
+    templated = MarkSlack(
+        engine="regex",
+        link_templates={"a.com": "<i>*{}*</i>"},
+        image_template="_{}_",
+    )
+    assert templated.mark("[x](http://a.com/b)") == "<i>**http://a.com/b**</i>"
+    assert templated.mark("<http://b.com/c.jpg>") == "*http://b.com/c.jpg*"
+
+
+def test_lazy_imports():
+    # The emoji tables and the modules for optional features load on
+    # first use.
+    script = (
+        "import sys, markslack; "
+        "markslack.MarkSlack(replace_emoji=False).mark(':a: *b*'); "
+        "print(sorted(set(sys.modules) & {0!r}))"
+    ).format(set(["emoji", "multiprocessing", "zipfile", "asyncio"]))
+    output = subprocess.check_output([sys.executable, "-c", script])
+    assert output.decode().strip() == "[]"
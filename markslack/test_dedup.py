@@ -0,0 +1,92 @@
+import io
+import json
+import zipfile
+
+import markslack
+from markslack import MarkSlack, convert_export
+from markslack.dedup import Deduplicator
+
+MESSAGES = ["*deploy* done", "_alert_", "*deploy* done", "hi", "_alert_"] * 4
+
+
+def test_deduplicator():
+    converter = MarkSlack().compile()
+    dedup = Deduplicator()
+    first = dedup.mark(converter, u"*deploy* " + u"done")
+    assert first == "**deploy** done"
+    assert dedup.mark(converter, u"*deploy* done") is first
+    assert dedup.info() == (2, 1, 0.5)
+
+    small = Deduplicator(maxsize=1)
+    for text in ("a", "b", "a"):
+        small.mark(converter, text)
+    assert small.info().converted == 3
+    assert len(small) == 1
+
+
+def test_fallbacks_not_kept(monkeypatch):
+    # Time runs out during the first conversion only.
+    clock = iter([0, 10])
+    monkeypatch.setattr(markslack, "timer", lambda: next(clock, 20))
+    converter = MarkSlack(engine="tokens", time_limit=1).compile()
+    dedup = Deduplicator()
+    assert dedup.mark(converter, u"*a* _b_") == u"\\*a\\* \\_b\\_"
+    assert len(dedup) == 0
+    assert dedup.mark(converter, u"*a* _b_") == u"**a** *b*"
+    assert dedup.mark(converter, u"*a* _b_") == u"**a** *b*"
+    assert dedup.info()[:2] == (3, 2)
+
+    # Fallback output from a worker is used once, then converted again.
+    dedup = Deduplicator()
+    messages = [u"*a*", u"_b_", u"*a*"]
+    keys, new = dedup.claim(messages)
+    fallbacks = dedup.store(new, [(u"\\*a\\*", False), (u"*b*", True)])
+    assert dedup.resolve(converter, messages, keys, fallbacks) == [
+        u"\\*a\\*",
+        u"*b*",
+        u"\\*a\\*",
+    ]
+    assert dedup.resolve(converter, messages[:1], keys[:1]) == [u"**a**"]
+    assert len(dedup) == 2
+
+
+def test_mark_many():
+    marker = MarkSlack()
+    expected = [marker.mark(message) for message in MESSAGES]
+    for workers in (1, 2):
+        dedup = Deduplicator()
+        converted = list(
+            marker.mark_many(MESSAGES, workers, chunksize=3, dedup=dedup)
+        )
+        assert converted == expected
+        # Every copy of a message shares one string.
+        assert converted[0] is converted[2] is converted[-3]
+        assert dedup.info() == (20, 3, 0.85)
+
+        unordered = marker.mark_many(
+            MESSAGES, workers=workers, ordered=False, dedup=Deduplicator()
+        )
+        assert sorted(unordered) == list(enumerate(expected))
+
+
+def test_convert_export(tmpdir):
+    path = str(tmpdir.join("export.zip"))
+    with zipfile.ZipFile(path, "w") as export:
+        for channel in ("alerts", "deploys", "general"):
+            messages = [{"text": text} for text in MESSAGES]
+            export.writestr(
+                "{0}/2020-01-01.json".format(channel), json.dumps(messages)
+            )
+
+    plain = io.StringIO()
+    convert_export(MarkSlack(), path, plain)
+    for workers in (1, 2):
+        dedup = Deduplicator()
+        output = io.StringIO()
+        convert_export(
+            MarkSlack(), path, output, workers=workers, dedup=dedup
+        )
+        assert output.getvalue() == plain.getvalue()
+        assert dedup.info().messages == 60
+        # Each worker process converts the messages it sees once.
+        assert dedup.info().converted in (3, 6)
@@ -0,0 +1,35 @@
+from markslack import MarkSlack
+from markslack.entities import Entity
+
+MESSAGE = (
+    u"Hi <@U1>, see <#C9|general> :thumbsup: :not_real: <!here>\n"
+    u"<https://x.com/a.png> <https://a.com|the docs> www.b.com/*q*"
+)
+
+
+def test_extract():
+    marker = MarkSlack(user_templates={"U1": "Some One"})
+    extraction = marker.extract(MESSAGE)
+    assert extraction.markdown == MarkSlack(
+        user_templates={"U1": "Some One"}, engine="tokens"
+    ).mark(MESSAGE)
+    assert extraction.entities == [
+        Entity("user", "U1", None, 3, 8),
+        Entity("channel", "C9", "general", 14, 27),
+        Entity("emoji", ":thumbsup:", u"👍", 28, 38),
+        Entity("announcement", "here", None, 50, 57),
+        Entity("image", "https://x.com/a.png", None, 58, 79),
+        Entity("link", "https://a.com", "the docs", 80, 104),
+        Entity("url", "www.b.com/*q*", None, 105, 118),
+    ]
+
+
+def test_offsets_survive_dropped_emoji():
+    marker = MarkSlack(remove_bad_emoji=True)
+    text = u":nope:  <@U2> :smile:"
+    extraction = marker.extract(text)
+    assert extraction.markdown == u"@U2 😄"
+    assert [
+        (entity.kind, text[entity.start:entity.end], entity.label)
+        for entity in extraction.entities
+    ] == [("user", "<@U2>", None), ("emoji", ":smile:", u"😄")]
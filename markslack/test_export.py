@@ -0,0 +1,70 @@
+import io
+import json
+import zipfile
+
+import pytest
+
+from markslack import MarkSlack, convert_export
+
+EXPORT = {
+    "channels.json": [{"name": "general"}, {"name": "random"}],
+    "general/2020-01-02.json": [{"user": "U2", "text": "_later_"}],
+    "general/2020-01-01.json": [
+        {"user": "U1", "text": "*hello* :thumbsup:"},
+        {"subtype": "bot_message", "text": "<https://site.com>"},
+    ],
+    "random/2020-01-01.json": [{"user": "U1", "text": "<#C1|general>"}],
+}
+
+
+@pytest.fixture
+def archive(tmpdir):
+    path = str(tmpdir.join("export.zip"))
+    with zipfile.ZipFile(path, "w") as export:
+        for name, messages in EXPORT.items():
+            export.writestr(name, json.dumps(messages))
+    return path
+
+
+def test_jsonl(archive):
+    output = io.StringIO()
+    assert convert_export(MarkSlack(), archive, output) == 4
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [(r["channel"], r["date"], r["markdown"]) for r in records] == [
+        ("general", "2020-01-01", "**hello** 👍"),
+        ("general", "2020-01-01", "[https://site.com](https://site.com)"),
+        ("general", "2020-01-02", "*later*"),
+        ("random", "2020-01-01", "#general"),
+    ]
+    assert records[0]["user"] == "U1"
+
+
+def test_markdown(archive):
+    output = io.StringIO()
+    marker = MarkSlack(user_templates={"U1": "Some One"})
+    convert_export(marker, archive, output, format="markdown")
+    assert output.getvalue() == (
+        "# general\n"
+        "\n## 2020-01-01\n"
+        "\nSome One: **hello** 👍\n"
+        "\n[https://site.com](https://site.com)\n"
+        "\n## 2020-01-02\n"
+        "\n@U2: *later*\n"
+        "\n"
+        "# random\n"
+        "\n## 2020-01-01\n"
+        "\nSome One: #general\n"
+        "\n"
+    )
+
+
+def test_parallel(archive):
+    serial = io.StringIO()
+    parallel = io.StringIO()
+    convert_export(MarkSlack(), archive, serial)
+    assert convert_export(MarkSlack(), archive, parallel, workers=2) == 4
+    assert parallel.getvalue() == serial.getvalue()
+
+    with open(archive, "rb") as handle:
+        with pytest.raises(ValueError):
+            convert_export(MarkSlack(), handle, parallel, workers=2)
@@ -0,0 +1,63 @@
+import timeit
+
+from markslack import MarkSlack
+
+LINES = [
+    "a_b :fake_emoji: and *bold*",
+    "see <http://a.com/x|a site>",
+    "plain_text",
+    "more at http://b.com/y_z",
+    "• item_one",
+    "_italic_ and <http://c.com>",
+    "last_line",
+]
+
+
+def test_remark_matches_mark():
+    for engine in ("regex", "tokens"):
+        marker = MarkSlack(engine=engine)
+        old = "\n".join(LINES)
+        output = marker.mark(old)
+        for index in range(len(LINES)):
+            for line in ("", "x_y", "http://d.com/_", ":fake:", "*b* ~s~"):
+                edited = list(LINES)
+                edited[index] = line
+                new = "\n".join(edited)
+                assert marker.remark(old, output, new) == marker.mark(new)
+            shorter = "\n".join(LINES[:index] + LINES[index + 1:])
+            assert marker.remark(old, output, shorter) == marker.mark(shorter)
+
+
+def test_remark_reuses_output():
+    marker = MarkSlack()
+    old = "\n".join(LINES)
+    # Lines far enough from the edit are taken from the old output.
+    output = "kept" + marker.mark(old)
+    new = old.replace("last_line", "last line")
+    assert marker.remark(old, output, new).startswith("kept")
+    assert marker.remark(old, output, old) == output
+
+
+def test_remark_falls_back():
+    marker = MarkSlack(remove_bad_emoji=True)
+    old = "a\n:fake_emoji:"
+    new = "b\n:fake_emoji:"
+    assert marker.remark(old, marker.mark(old), new) == marker.mark(new)
+
+
+def test_remark_beats_mark_without_urls():
+    for engine in ("regex", "tokens"):
+        marker = MarkSlack(engine=engine)
+        old = "\n".join(
+            "line {0} with _some_ words and *bold*".format(i)
+            for i in range(2000)
+        )
+        output = marker.mark(old)
+        new = old.replace("line 1000 ", "line 1000 edited ")
+        assert marker.remark(old, output, new) == marker.mark(new)
+
+        def best(convert):
+            return min(timeit.repeat(convert, number=1, repeat=3))
+
+        remarked = best(lambda: marker.remark(old, output, new))
+        assert remarked < best(lambda: marker.mark(new)) / 2, engine
@@ -1,5 +1,10 @@
+import pytest
+
 from markslack import MarkSlack
 
+# Every case runs with each engine, and through parse(); see conftest.py.
+pytestmark = pytest.mark.usefixtures("engine")
+
 marker = MarkSlack()
 
 
@@ -395,3 +400,11 @@ def test_remove_and_replace_emoji():
         )
         == "this is a test of only being removed 👍"
     )
+
+
+def test_slack_emoji():
+    assert marker.mark(":simple_smile: :-1:") == "🙂 👎"
+    assert marker.mark(":wave::skin-tone-3:") == "👋🏼"
+
+    marker_no_bad = MarkSlack(remove_bad_emoji=True)
+    assert marker_no_bad.mark("a :shrug: :fake_emoji: b") == "a 🤷 b"
@@ -0,0 +1,52 @@
+import random
+
+from markslack import MarkSlack
+from markslack.links import SCAN_LIMIT, LinkTemplates
+
+
+def first_match(templates, url):
+    for key, template in templates.items():
+        if key in url:
+            return template
+    return None
+
+
+def test_matches_scan_order():
+    random.seed(7)
+    keys = ["twitter.com", "twitter.com/jack", "t.co", "youtube", "tube"]
+    keys += ["host{0}.example.com".format(i) for i in range(40)]
+    random.shuffle(keys)
+    templates = dict((key, "<{0} {{}}>".format(key)) for key in keys)
+    index = LinkTemplates(templates)
+    assert len(index) > SCAN_LIMIT
+
+    urls = [
+        "https://twitter.com/jack/status/20",
+        "https://www.youtube.com/watch?v=1",
+        "https://host12.example.com/host3.example.com",
+        "https://t.co/abc",
+        "https://site.com/",
+        "",
+    ]
+    for url in urls:
+        assert index.find(url) == first_match(templates, url)
+
+
+def test_small_table():
+    index = LinkTemplates({"b": "B", "a": "A"})
+    assert index.find("xab") == "B"
+    assert index.find("xyz") is None
+
+
+def test_many_link_templates():
+    link_templates = dict(
+        ("host{0}.com".format(i), "<embed {{}} {0}>".format(i))
+        for i in range(100)
+    )
+    marker = MarkSlack(link_templates=link_templates)
+    assert marker.mark("<https://host42.com/a>") == (
+        "<embed https://host42.com/a 42>"
+    )
+    assert marker.mark("<https://other.com/a>") == (
+        "[https://other.com/a](https://other.com/a)"
+    )
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+from markslack import MarkSlack, benchmark, nodes
+
+
+MESSAGE = (
+    u"*Hi* <@U1>, _see_ <http://a.com?a=1&b=2|a_site> :+1: :fake:\n"
+    u"•one ~x~ <!here> in <#C1|general> http://b.com/x_y"
+)
+
+
+def test_parse():
+    marker = MarkSlack()
+    parsed = marker.parse(MESSAGE)
+    assert parsed[:4] == [
+        (nodes.BOLD, True),
+        (nodes.TEXT, u"Hi"),
+        (nodes.BOLD, False),
+        (nodes.TEXT, u" "),
+    ]
+    assert (nodes.USER, (u"U1", None)) in parsed
+    assert (nodes.LINK, (u"http://a.com?a=1&b=2", u"a_site", None)) in parsed
+    assert (nodes.EMOJI, (u":fake:", None)) in parsed
+    assert (nodes.BULLET, u" ") in parsed
+    assert (nodes.URL, u"http://b.com/x_y") in parsed
+    assert nodes.to_markdown(parsed) == MarkSlack(engine="tokens").mark(
+        MESSAGE
+    )
+
+
+def test_markdown_is_the_tokens_engines():
+    corpus = benchmark.generate_corpus(300, seed=3)
+    for options in benchmark.CONFIGURATIONS.values():
+        # parse() lexes with the tokens engine, whatever engine is set.
+        marker = MarkSlack(**options)
+        reference = MarkSlack(**dict(options, engine="tokens"))
+        for message in corpus:
+            assert nodes.to_markdown(marker.parse(message)) == (
+                reference.mark(message)
+            )
+
+
+def test_to_html():
+    marker = MarkSlack(user_templates={"U1": u"<b>Some One</b>"})
+    assert nodes.to_html(marker.parse(MESSAGE)) == (
+        u"<strong>Hi</strong> <b>Some One</b>, <em>see</em> "
+        u'<a href="http://a.com?a=1&amp;b=2">a_site</a> 👍 :fake:<br>\n'
+        u"• one <del>x</del> "
+        u'<span class="slack-announcement">@here</span> in #general '
+        u'<a href="http://b.com/x_y">http://b.com/x_y</a>'
+    )
+    links = marker.parse(u"<http://a.com?a&b|a & b> <http://a.com/b.png>")
+    assert nodes.to_html(links) == (
+        u'<a href="http://a.com?a&amp;b">a &amp; b</a> '
+        u'<img src="http://a.com/b.png" alt="">'
+    )
+    # Only web and mail URLs are linked.
+    unsafe = marker.parse(
+        u"see javascript:alert(1)x and _a_ <data:text/html;base64,PHA+|x>"
+        u" <mailto:a@b.com|mail> www.a.com <javascript:x.png>"
+    )
+    assert nodes.to_html(unsafe) == (
+        u"see javascript:alert(1)x and <em>a</em> x "
+        u'<a href="mailto:a@b.com">mail</a> '
+        u'<a href="www.a.com">www.a.com</a> javascript:x.png'
+    )
+    # Overlapping spans are closed and reopened to nest.
+    assert nodes.to_html(marker.parse(u"*a _b* c_")) == (
+        u"<strong>a <em>b</em></strong><em> c</em>"
+    )
+
+
+def test_to_text():
+    marker = MarkSlack(user_templates={"U1": u"<b>Some One</b>"})
+    assert nodes.to_text(marker.parse(MESSAGE)).splitlines() == [
+        u"Hi Some One, see a_site 👍 :fake:",
+        u"• one x @here in #general http://b.com/x_y",
+    ]
+    assert nodes.to_text(marker.parse(u"<http://a.com/b.png>")) == (
+        u"http://a.com/b.png"
+    )
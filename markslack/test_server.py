@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+from http.client import HTTPConnection
+
+import pytest
+
+from markslack import MarkSlack, server
+from markslack.users import UserDirectory
+
+
+def resolve(user_ids):
+    if "U_BAD" in user_ids:
+        raise LookupError("directory unavailable")
+    return {"U1": "Some One"}
+
+
+def exit_worker(user_ids):
+    os._exit(1)
+
+
+@pytest.fixture(params=[1, 2], ids=["inline", "workers"])
+def address(request):
+    httpd = server.make_server(
+        MarkSlack(user_templates=UserDirectory(resolve)),
+        port=0,
+        workers=request.param,
+        batch_wait=0.01,
+    )
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.start()
+    yield httpd.server_address
+    httpd.shutdown()
+    thread.join()
+    httpd.server_close()
+
+
+def _request(connection, method, path, body=None):
+    if body is not None:
+        body = json.dumps(body)
+    connection.request(method, path, body)
+    response = connection.getresponse()
+    return response.status, json.loads(response.read().decode("utf-8"))
+
+
+def test_convert(address):
+    connection = HTTPConnection(*address)
+    # One connection, kept alive, for every request.
+    assert _request(connection, "POST", "/convert", {"text": "*a* <@U1>"}) == (
+        200,
+        {"markdown": "**a** Some One"},
+    )
+    assert _request(
+        connection, "POST", "/convert", {"texts": ["_b_", ":+1:", ""]}
+    ) == (200, {"markdown": ["*b*", u"👍", ""]})
+    assert _request(connection, "POST", "/convert", {"texts": []}) == (
+        200,
+        {"markdown": []},
+    )
+    assert _request(connection, "POST", "/convert", {"text": 1})[0] == 400
+    # Messages over the server's max_length are converted with the
+    # fallback.
+    padding = " " * server.MAX_LENGTH
+    body = {"text": "*a*" + padding}
+    assert _request(connection, "POST", "/convert", body) == (
+        200,
+        {"markdown": "\\*a\\*" + padding},
+    )
+    assert _request(connection, "GET", "/nowhere")[0] == 404
+    connection.request("POST", "/convert", "{")
+    response = connection.getresponse()
+    assert response.status == 400
+    response.read()
+
+    status, stats = _request(connection, "GET", "/status")
+    assert status == 200
+    assert stats["requests"] == 4
+    assert stats["messages"] == 5
+    assert set(stats["latency_ms"]) == {"p50", "p90", "p99", "max"}
+    connection.close()
+
+
+def test_concurrent_requests_share_batches(address):
+    results = {}
+
+    def post(number):
+        connection = HTTPConnection(*address)
+        results[number] = _request(
+            connection, "POST", "/convert", {"text": "*{0}*".format(number)}
+        )
+        connection.close()
+
+    threads = [threading.Thread(target=post, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == dict(
+        (i, (200, {"markdown": "**{0}**".format(i)})) for i in range(20)
+    )
+    connection = HTTPConnection(*address)
+    stats = _request(connection, "GET", "/status")[1]
+    assert stats["messages"] == 20
+    assert stats["batches"] < 20
+    connection.close()
+
+
+def test_errors_are_per_message(address):
+    connection = HTTPConnection(*address)
+    status, body = _request(
+        connection, "POST", "/convert", {"texts": ["<@U_BAD>", "<@U1>"]}
+    )
+    assert status == 200
+    assert body["markdown"] == [None, "Some One"]
+    assert [error["index"] for error in body["errors"]] == [0]
+    assert "directory unavailable" in body["errors"][0]["error"]
+    status, body = _request(
+        connection, "POST", "/convert", {"text": "<@U_BAD>"}
+    )
+    assert status == 500
+    assert "directory unavailable" in body["error"]
+    assert _request(connection, "GET", "/status")[1]["errors"] == 2
+    connection.close()
+
+
+def test_lost_batches_time_out():
+    # A batch lost with its worker never calls back. Its messages fail
+    # after the timeout, and the pool slots it held are freed.
+    marker = MarkSlack(user_templates=UserDirectory(exit_worker))
+    service = server.ConversionService(marker, workers=2, timeout=0.5)
+    try:
+        for _ in range(5):
+            assert service.convert([u"<@U1>"]) == [(None, "Timed out")]
+        assert service.convert([u"*a*"]) == [(u"**a**", None)]
+        assert service.stats()["errors"] == 5
+    finally:
+        service.close()
+
+
+def test_limits():
+    converter = server.limit(MarkSlack())
+    assert (converter.max_length, converter.time_limit) == (
+        server.MAX_LENGTH,
+        server.TIME_LIMIT,
+    )
+    assert server.limit(converter) is converter
+    unlimited = server.limit(converter, None, None)
+    assert unlimited.max_length is None
+    assert unlimited.fallback_info() is None
@@ -0,0 +1,32 @@
+from markslack import STAGES, MarkSlack
+
+
+def test_stats():
+    assert MarkSlack().stats() is None
+
+    seen = []
+    instrumented = MarkSlack(instrument=lambda *args: seen.append(args))
+    assert instrumented.mark("*a* :+1: <http://a.com|a>") == (
+        "**a** 👍 [a](http://a.com)"
+    )
+    stats = instrumented.stats()
+    assert stats
+    assert all(stage.calls == 1 for stage in stats.values())
+    assert sum(stage.substitutions for stage in stats.values()) >= 2
+    assert len(seen) == len(stats)
+
+    instrumented.reset_stats()
+    assert instrumented.stats() == {}
+    instrumented.mark("a")
+    instrumented.replace_emoji = False
+    assert instrumented.stats() == {}
+
+
+def test_stats_stages():
+    regex = MarkSlack(engine="regex", instrument=True)
+    regex.mark("*a* :+1: <http://a.com|a> <@U1> ~b~\n• c")
+    stats = regex.stats()
+    assert set(stats) == set(STAGES)
+    assert stats["mark_emoji"].substitutions == 1
+    assert stats["mark_named_hyperlink"].substitutions == 1
+    assert stats["mark_emphasis"].substitutions == 1
@@ -0,0 +1,66 @@
+import io
+
+from markslack import MarkSlack, cli, stream
+
+DOCUMENT = (
+    u"*Digest* for <#C1|general>\n"
+    u"snake_case and more_snake\n"
+    u"\n"
+    u"• see <http://a.com/x_y|the_docs> _now_ :thumbsup:\n"
+    u"one_two :not_an_emoji: three_four\n"
+    u"http://b.com/_q_ five_six :nope:  \n"
+    u"  \n"
+    u"seven_eight\n"
+    u":gone:..."
+)
+
+
+class Output(object):
+    def __init__(self):
+        self.pieces = []
+
+    def write(self, text):
+        self.pieces.append(text)
+
+    def getvalue(self):
+        return u"".join(self.pieces)
+
+
+def test_mark_stream(monkeypatch):
+    # Hold every undecided line on disk.
+    monkeypatch.setattr(stream, "SPOOL_SIZE", 0)
+    for config in ({}, {"remove_bad_emoji": True}, {"replace_emoji": False}):
+        marker = MarkSlack(engine="tokens", **config)
+        for text in (DOCUMENT, DOCUMENT + u"\n", u"", u"\n\n"):
+            output = Output()
+            marker.mark_stream(io.StringIO(text), output, chunksize=2)
+            assert output.getvalue() == marker.mark(text)
+
+
+def test_mark_stream_writes_as_it_reads():
+    output = Output()
+    written = []
+
+    def lines():
+        yield u"*bold*\n"
+        written.append(output.getvalue())
+        yield u"a_b\n"
+        written.append(output.getvalue())
+        yield u"<http://a.com>\n"
+        written.append(output.getvalue())
+
+    MarkSlack().mark_stream(lines(), output)
+    # a_b waits on the URL to know its underscore is escaped.
+    assert written == [
+        u"**bold**\n",
+        u"**bold**\n",
+        u"**bold**\na\\_b\n[http://a.com](http://a.com)\n",
+    ]
+
+
+def test_main_document(tmpdir, capfd):
+    path = tmpdir.join("digest.txt")
+    path.write_text(DOCUMENT, encoding="utf-8")
+    assert cli.main([str(path), "--format", "document"]) == 0
+    expected = MarkSlack(engine="tokens").mark(DOCUMENT)
+    assert capfd.readouterr().out == expected
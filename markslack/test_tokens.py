@@ -0,0 +1,57 @@
+import functools
+
+import pytest
+
+from markslack import MarkSlack, tokens, urls
+
+TokensMarkSlack = functools.partial(MarkSlack, engine="tokens")
+
+
+def test_engine_option():
+    with pytest.raises(ValueError):
+        MarkSlack(engine="fast")
+
+
+def test_entities_on_one_line():
+    marker = TokensMarkSlack()
+    assert marker.mark("<http://a.com/a.jpg> and <http://b.com/b.png>") == (
+        "![](http://a.com/a.jpg) and ![](http://b.com/b.png)"
+    )
+    assert marker.mark("*see <http://a.com|a_site>*") == (
+        "**see [a\\_site](http://a.com)**"
+    )
+    # A bare URL ends where a markslack link's label starts.
+    assert marker.mark("http://a.com[n]<http://t.co>") == (
+        "http://a.com[n](http://t.co)"
+    )
+
+
+def test_tokens_stats():
+    tokens = TokensMarkSlack(instrument=True)
+    tokens.mark("*a* :+1: <http://a.com|a>")
+    stats = tokens.stats()
+    assert set(stats) == {"lex", "render"}
+    assert stats["lex"].substitutions == 2
+
+
+def test_bare_urls_lex_in_linear_time():
+    # Text between tokens used to be searched again after every URL.
+    searches = []
+
+    class Counting(object):
+        def search(self, *args):
+            searches.append(args)
+            return tokens._token_re.search(*args)
+
+    converter = TokensMarkSlack().converter
+    for text in (
+        "x_y " + "see http://example.com/page " * 1000,
+        "_ " + "http://a.com/((a)" * 1000,
+    ):
+        del searches[:]
+        lexed = []
+        scanner = urls.Scanner(text)
+        tokens._lex(
+            converter, Counting(), text, 0, len(text), lexed, scanner
+        )
+        assert len(searches) < 5
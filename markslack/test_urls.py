@@ -0,0 +1,71 @@
+import re
+import timeit
+
+from markslack import MarkSlack, benchmark, urls
+from markslack.patterns import url_pattern, url_pattern_body
+
+url_re = re.compile(url_pattern)
+
+SAMPLES = (
+    "see http://www.politico.com/story/1 now",
+    "(http://en.wikipedia.org/wiki/Python_(language)) and more",
+    "http://abc(de) and http://abc(de)f!",
+    "mail mailto:someone@example.com, or ftp:///x.",
+    "www.politico.com. Or www2.example.org/a?b=1",
+    "x.www.com/a and politico.com/story...",
+    "Dr. Who.com/x, a.b.c.de/f; and -a.com/b",
+    "<http://a.com/(b)> [a link]<http://b.com/c_(d)> <@U024BE7LH>",
+    "http://a.com/((b)) http://a.com/(b(c)d) http://a.com/)b",
+    u"Straße http://über.de/aß “http://q.com/x”",
+)
+
+
+def test_search_matches_url_pattern():
+    for text in SAMPLES:
+        expected = [match.span() for match in url_re.finditer(text)]
+        assert list(urls.Scanner(text).finditer()) == expected, text
+
+
+def test_search_endpos():
+    for text in SAMPLES:
+        first = urls.Scanner(text).search()
+        for endpos in range(len(text) + 1):
+            assert urls.Scanner(text).search(0, endpos) in (None, first)
+        assert urls.Scanner(text).search(0, len(text)) == first
+    # Only URLs anchored before endpos, here by the scheme's colon.
+    assert urls.Scanner("see http://a.com/b").search(0, 9) == (4, 18)
+    assert urls.Scanner("see http://a.com/b").search(0, 8) is None
+
+
+def test_bracketed_matches_url_pattern():
+    bracketed_re = re.compile(u"<({0})>".format(url_pattern_body), re.I)
+    for text in SAMPLES:
+        expected = [
+            (match.start(), match.end(), match.groups())
+            for match in bracketed_re.finditer(text)
+        ]
+        assert list(urls.bracketed(text)) == expected, text
+
+
+def test_split():
+    assert urls.split("a http://b.com/c d") == ["a ", "http://b.com/c", " d"]
+    assert urls.split("no links") == ["no links"]
+
+
+def test_adversarial_inputs_stay_fast():
+    for engine in ("regex", "tokens"):
+        marker = MarkSlack(engine=engine)
+        for make in benchmark.ADVERSARIAL.values():
+            message = make(5000)
+            seconds = min(
+                timeit.repeat(lambda: marker.mark(message), number=1, repeat=3)
+            )
+            assert seconds < 1, (engine, message[:40])
+
+
+def test_run_adversarial():
+    results = benchmark.run_adversarial(
+        (50, 100), engines=("regex",), repeat=1
+    )
+    assert len(results) == 2 * len(benchmark.ADVERSARIAL)
+    assert all(result["seconds"] >= 0 for result in results)
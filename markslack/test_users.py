@@ -0,0 +1,80 @@
+import pickle
+import sqlite3
+
+from markslack import MarkSlack, users
+
+MESSAGES = ["hi <@U1>", "<@U2> and <@U1>", "no one", "<@U3>"]
+
+
+class Resolver(object):
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, user_ids):
+        self.calls.append(sorted(user_ids))
+        return dict(
+            (user_id, "<b>{0}</b>".format(user_id))
+            for user_id in user_ids
+            if user_id != "U3"
+        )
+
+
+def test_mentions():
+    assert users.mentions(MESSAGES) == {"U1", "U2", "U3"}
+
+
+def test_mark_many_resolves_each_chunk_once():
+    for engine in ("regex", "tokens"):
+        resolver = Resolver()
+        directory = users.UserDirectory(resolver)
+        marker = MarkSlack(user_templates=directory, engine=engine)
+        assert list(marker.mark_many(MESSAGES, workers=1)) == [
+            "hi <b>U1</b>",
+            "<b>U2</b> and <b>U1</b>",
+            "no one",
+            "@U3",
+        ]
+        assert resolver.calls == [["U1", "U2", "U3"]]
+        assert directory.info().hits == 4
+
+
+def test_directory_limits(monkeypatch):
+    now = [0]
+    monkeypatch.setattr(users, "timer", lambda: now[0])
+    resolver = Resolver()
+    directory = users.UserDirectory(resolver, maxsize=2, ttl=10)
+    directory.prefetch(["U1", "U2"])
+    assert directory.get("U1") == "<b>U1</b>"
+    assert directory.get("U3", "@U3") == "@U3"
+    # U3 pushed out U2, the least recently used.
+    assert directory.info().evictions == 1
+    directory.prefetch(["U1", "U3"])
+    assert resolver.calls == [["U1", "U2"], ["U3"]]
+    now[0] = 10
+    directory.prefetch(["U1", "U3"])
+    assert resolver.calls[-1] == ["U1", "U3"]
+
+
+def test_sqlite_resolver(tmpdir):
+    path = str(tmpdir.join("users.db"))
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE users (id TEXT PRIMARY KEY, template)")
+    connection.executemany(
+        "INSERT INTO users VALUES (?, ?)",
+        [("U{0}".format(i), "User {0}".format(i)) for i in range(1200)],
+    )
+    connection.commit()
+    connection.close()
+
+    resolver = users.SQLiteResolver(path)
+    found = resolver(["U{0}".format(i) for i in range(0, 2400, 2)])
+    assert len(found) == 600
+    assert found["U2"] == "User 2"
+
+    directory = pickle.loads(pickle.dumps(users.UserDirectory(resolver)))
+    marker = MarkSlack(user_templates=directory)
+    messages = MESSAGES * 10
+    assert list(marker.mark_many(messages, workers=2, chunksize=8)) == [
+        marker.mark(message) for message in messages
+    ]
+    assert marker.mark("<@U1> <@U1999>") == "User 1 @U1999"
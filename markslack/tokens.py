@@ -0,0 +1,677 @@
+"""
+A single-pass engine for converting Slack mrkdwn to Markdown.
+
+Rather than running a chain of substitutions over the whole message, the
+tokens engine lexes a message once into entities, emoji, emphasis
+delimiters, bullets and plain text, then emits Markdown in one walk over
+those tokens. Template output is treated as finished markup and is never
+re-parsed for emphasis. parse() stops short of emitting Markdown and
+returns the list of nodes described in markslack.nodes.
+
+It gives the same Markdown as the regex engine for the syntax markslack
+supports, one entity or emphasis span at a time. Where the two differ,
+the regex engine's output comes from its substitutions running into
+each other:
+
+- A line with several angle-bracket entities, where the regex engine's
+  patterns can match from one entity to the next: with it,
+  ``<http://a.com/a.jpg> and <http://b.com/b.png>`` becomes one image.
+- A literal ``|*``, which the regex engine uses as a placeholder and
+  turns into ``*``.
+- A ``<`` before a bare URL with no closing ``>``, which the regex
+  engine wraps in ``~``.
+- A bare URL that runs into an entity or emoji with no space between.
+  The regex engine finds URLs after replacing those, so the URL can take
+  them in, which changes whether the underscores after it are escaped.
+- Unmatched underscores in a message with an unreplaced shortcode, where
+  the engines can disagree on which underscores the shortcode keeps from
+  being escaped.
+
+Select it with ``MarkSlack(engine="tokens")``.
+"""
+import os
+
+from markslack import nodes, shortcodes, urls
+from markslack.nodes import BREAK
+from markslack.patterns import LazyPattern, emoji_pattern
+from markslack.stats import timer
+
+
+TEXT = "text"
+NEWLINE = "newline"
+DELIM = "delim"
+BULLET = "bullet"
+SHORTCODE = "shortcode"
+EMOJI = "emoji"
+URL_START = "url_start"
+URL_END = "url_end"
+ENTITY = "entity"
+
+# The lookahead lets a search skip plain text without trying each
+# alternative at every character.
+_token_re = LazyPattern(
+    u"(?=[\\[<:*_~•\\n])"
+    u"(?:(?P<angle>(?:\\[(?P<label>[\\w ']+?)\\])?<(?P<body>[^<>\\n]+)>)"
+    u"|(?P<shortcode>{0})"
+    u"|(?P<delim>[*_~])"
+    u"|(?P<bullet>•)"
+    u"|(?P<newline>\\n))".format(emoji_pattern),
+)
+# Bare URLs are left as they are, except that emphasis and bullets inside
+# them still apply, as they do in the regex engine.
+_url_inner_re = LazyPattern(u"(?P<delim>[*_~])|(?P<bullet>•)")
+_shortcode_re = LazyPattern(emoji_pattern)
+_channel_re = LazyPattern(r"#[a-zA-Z0-9-]+\|(.+)")
+_tail_re = LazyPattern(r"(?:\s*|\.*)$")
+
+# Spelled out, since importing the string module compiles a pattern.
+_ALNUM = frozenset(
+    "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+)
+# Characters that keep a delimiter from opening a pair.
+_NO_OPEN = _ALNUM | frozenset("\\|")
+_PAIRED = {"*": u"**", "_": u"*", "~": u"~~"}
+# Token kinds the instrumented lex pass counts as substitutions.
+_SUBSTITUTED = frozenset((ENTITY, EMOJI, URL_START))
+
+
+def _entity_token(node, source):
+    # Entities carry their Markdown pieces, those pieces as plain text,
+    # their node and the Slack text they came from.
+    pieces = nodes.pieces(node)
+    flat = u"".join(
+        u"_" if piece is nodes.UNDERSCORE else piece
+        for piece in pieces
+        if piece is not BREAK
+    )
+    return (ENTITY, (pieces, flat, node, source))
+
+
+def _full_url(text):
+    return urls.Scanner(text).match() == len(text)
+
+
+def _is_image(converter, body):
+    if not converter.image_re.match(u"<{0}>".format(body)):
+        return False
+    extension = os.path.splitext(body)[1]
+    return extension.lower() in converter.image_extensions
+
+
+def _link(converter, name, url):
+    templated = None
+    if converter.link_templates:
+        templated = converter.template_link(url)
+    return (nodes.LINK, (url, name, templated))
+
+
+def _image(converter, url):
+    templated = None
+    if converter.image_template:
+        templated = converter.image_template.format(url)
+    return (nodes.IMAGE, (url, templated))
+
+
+def _user(converter, user):
+    templated = None
+    if converter.user_templates:
+        templated = converter.user_templates.get(user)
+    return (nodes.USER, (user, templated))
+
+
+def entity(converter, label, body):
+    """
+    Return the node for an angle-bracket entity, optionally preceded by a
+    markslack link label, or None if it isn't one.
+    """
+    if label is not None:
+        if (
+            not converter.markslack_links
+            or _is_image(converter, body)
+            or not _full_url(body)
+        ):
+            return None
+        return _link(converter, label, body)
+
+    if _is_image(converter, body):
+        return _image(converter, body)
+
+    head = body[0]
+    if head == "#":
+        match = _channel_re.match(body)
+        if match:
+            return (nodes.CHANNEL, match.group(1))
+    elif head == "!" and len(body) > 1:
+        return (nodes.ANNOUNCEMENT, body[1:])
+
+    url, separator, name = body.partition("|")
+    if _full_url(url):
+        if not separator:
+            return _link(converter, url, url)
+        if name:
+            return _link(converter, name, url)
+        return None
+
+    if head == "@" and len(body) > 1:
+        return _user(converter, body[1:])
+    return None
+
+
+def _shortcode_in(text, start, end):
+    colon = text.find(":", start, end)
+    while colon != -1:
+        match = _shortcode_re.match(text, colon)
+        if match is not None:
+            return match
+        colon = text.find(":", colon + 1, end)
+    return None
+
+
+def _lex(converter, pattern, text, pos, end, tokens, scanner=None):
+    """
+    Append tokens for text[pos:end] matched with pattern and, if a
+    urls.Scanner for text is given, the bare URLs it finds.
+    """
+    append = tokens.append
+    emoji_codes = shortcodes.index() if converter.replace_emoji else {}
+    url = None
+    # URLs anchored before searched have been looked for.
+    searched = pos
+    match = pattern.search(text, pos, end)
+    while pos < end:
+        # Both searches are kept until pos passes where they matched, so
+        # text between tokens is searched once however many URLs are in
+        # it.
+        if match is not None and match.start() < pos:
+            match = pattern.search(text, pos, end)
+        if url is not None and url[0] < pos:
+            url = None
+            searched = pos
+        following = end if match is None else match.start()
+        if scanner is not None and url is None and following >= searched:
+            # Only URLs starting before the next token matter. Any of
+            # those is anchored before the next bracket, so URLs in the
+            # entities further on aren't looked at yet.
+            bracket = text.find(u"<", following, end)
+            if bracket == -1:
+                searched = end + 1
+                url = scanner.search(pos)
+            else:
+                searched = bracket + 1
+                url = scanner.search(pos, searched)
+        if url is not None and (match is None or url[0] < match.start()):
+            start, stop = url
+            if start > pos:
+                append((TEXT, text[pos:start]))
+            # Emoji and links are replaced before URLs are found, so a URL
+            # can't run into a shortcode, or the label of a markslack link.
+            end_at = stop
+            shortcode = _shortcode_in(text, start, stop)
+            if shortcode is not None:
+                end_at = shortcode.start()
+            if (
+                match is not None
+                and match.start() < end_at
+                and match.lastgroup == "angle"
+            ):
+                label = match.group("label")
+                if entity(converter, label, match.group("body")) is not None:
+                    end_at = match.start()
+            if end_at < stop:
+                # The character before the URL is kept for the word
+                # boundary it starts on.
+                offset = max(start - 1, 0)
+                head = text[offset:end_at]
+                stop = urls.Scanner(head).match(start - offset)
+                if stop is None:
+                    append((TEXT, text[start]))
+                    pos = start + 1
+                    continue
+                stop += offset
+            append((URL_START, u""))
+            _lex(converter, _url_inner_re, text, start, stop, tokens)
+            append((URL_END, u""))
+            pos = stop
+            continue
+
+        if match is None:
+            append((TEXT, text[pos:end]))
+            return
+        start = match.start()
+        if start > pos:
+            append((TEXT, text[pos:start]))
+        kind = match.lastgroup
+        value = match.group()
+        if kind == "angle":
+            node = entity(converter, match.group("label"), match.group("body"))
+            if node is None:
+                # Not an entity, so the bracket is plain text and its
+                # contents are lexed as usual.
+                append((TEXT, text[start]))
+                pos = start + 1
+                continue
+            append(_entity_token(node, value))
+        elif kind == "shortcode":
+            if converter.replace_emoji and value in emoji_codes:
+                append((EMOJI, (emoji_codes[value], value)))
+            else:
+                append((SHORTCODE, value))
+        elif kind == "delim":
+            append((DELIM, value))
+        elif kind == "bullet":
+            append((BULLET, value))
+        else:
+            append((NEWLINE, value))
+        pos = match.end()
+
+
+def lex(converter, text):
+    """
+    Split Slack text into a list of (kind, value) tokens.
+    """
+    tokens = []
+    _lex(
+        converter, _token_re, text, 0, len(text), tokens, urls.Scanner(text)
+    )
+    return tokens
+
+
+def breaks(converter, text):
+    """
+    Return whether text has a URL or link in it, which ends the stretch
+    of text whose unmatched underscores are escaped together.
+    """
+    for kind, value in lex(converter, text):
+        if kind == URL_START or (kind == ENTITY and BREAK in value[0]):
+            return True
+    return False
+
+
+def _strip_before(tokens, index):
+    for i in range(index - 1, -1, -1):
+        kind, value = tokens[i]
+        if kind not in (TEXT, NEWLINE):
+            return
+        value = value.rstrip()
+        tokens[i] = (TEXT, value)
+        if value:
+            return
+
+
+def _strip_after(tokens, index):
+    for i in range(index, len(tokens)):
+        kind, value = tokens[i]
+        if kind not in (TEXT, NEWLINE):
+            return
+        value = value.lstrip()
+        tokens[i] = (TEXT, value)
+        if value:
+            return
+
+
+def _is_tail(tokens, index):
+    rest = tokens[index:]
+    if any(kind not in (TEXT, NEWLINE) for kind, _ in rest):
+        return False
+    return _tail_re.match(u"".join(value for _, value in rest)) is not None
+
+
+def drop_bad_emoji(tokens):
+    """
+    Remove runs of unreplaced shortcodes in place, with the same
+    whitespace handling as the regex engine: a trailing run takes the
+    whitespace before it, any other run takes the whitespace after it.
+    """
+    runs = []
+    i = 0
+    while i < len(tokens):
+        if tokens[i][0] == SHORTCODE:
+            j = i
+            while j < len(tokens) and tokens[j][0] == SHORTCODE:
+                j += 1
+            runs.append((i, j))
+            i = j
+        else:
+            i += 1
+    if not runs:
+        return
+
+    if _is_tail(tokens, runs[-1][1]):
+        start, end = runs.pop()
+        _strip_before(tokens, start)
+        tokens[start:end] = [(TEXT, u"")] * (end - start)
+
+    for start, end in runs:
+        _strip_after(tokens, end)
+        tokens[start:end] = [(TEXT, u"")] * (end - start)
+
+
+def emojize(text, replace=True, remove=False):
+    """
+    Replace shortcodes in text with emoji and, if remove is True, drop the
+    ones left over, in one scan that only looks at :shortcode: spans.
+    """
+    return emojize_count(text, replace, remove)[0]
+
+
+def emojize_count(text, replace=True, remove=False):
+    """
+    Like emojize, but return (text, number of shortcodes replaced or
+    removed).
+    """
+    tokens = []
+    index = shortcodes.index() if replace else {}
+    pos = 0
+    count = 0
+    for match in _shortcode_re.finditer(text):
+        start = match.start()
+        if start > pos:
+            tokens.append((TEXT, text[pos:start]))
+        code = match.group()
+        if replace and code in index:
+            tokens.append((EMOJI, index[code]))
+            count += 1
+        else:
+            tokens.append((SHORTCODE, code))
+            count += remove
+        pos = match.end()
+    if not tokens:
+        return text, 0
+    tokens.append((TEXT, text[pos:]))
+    if remove:
+        drop_bad_emoji(tokens)
+    return u"".join(value for _, value in tokens), count
+
+
+def _pair(delims, marks, filled, paired):
+    """
+    Pair delimiters the way the lazy emphasis regexes do: each opener
+    takes the nearest valid closer at least one character later.
+    filled[k] counts the tokens before line[k] with text.
+    """
+    closers = [
+        k
+        for k in delims
+        if marks[k][0] != "\\" and marks[k][1] not in _ALNUM
+    ]
+    c = 0
+    i = 0
+    while i < len(delims):
+        k = delims[i]
+        if marks[k][0] in _NO_OPEN:
+            i += 1
+            continue
+        while c < len(closers) and (
+            closers[c] <= k or filled[closers[c]] == filled[k + 1]
+        ):
+            c += 1
+        if c == len(closers):
+            return
+        closer = closers[c]
+        paired[k] = True
+        paired[closer] = False
+        c += 1
+        while i < len(delims) and delims[i] <= closer:
+            i += 1
+
+
+def _resolve(line, end):
+    """
+    Return the characters on either side of each delimiter and bullet in
+    a line of tokens, by index, and a dictionary mapping the indexes of
+    paired delimiters to True for openers and False for closers.
+    """
+    marks = {}
+    paired = {}
+    if not any(kind == DELIM or kind == BULLET for kind, _ in line):
+        return marks, paired
+
+    texts = [
+        value[1] if kind == ENTITY else value[0] if kind == EMOJI else value
+        for kind, value in line
+    ]
+    # One pass each way finds every token's neighbouring characters.
+    after = []
+    following = end
+    for text in reversed(texts):
+        after.append(following)
+        if text:
+            following = text[0]
+    after.reverse()
+    filled = [0] * (len(line) + 1)
+    delims = {"*": [], "_": [], "~": []}
+    prev = None
+    count = 0
+    for k, (kind, value) in enumerate(line):
+        filled[k] = count
+        if kind == DELIM:
+            delims[value].append(k)
+            marks[k] = (prev, after[k])
+        elif kind == BULLET:
+            marks[k] = (prev, after[k])
+        if texts[k]:
+            prev = texts[k][-1]
+            count += 1
+    filled[len(line)] = count
+
+    for char in _PAIRED:
+        if len(delims[char]) > 1:
+            _pair(delims[char], marks, filled, paired)
+    return marks, paired
+
+
+def _bullet_space(following):
+    """
+    Return the space to write after a bullet followed by following, or
+    None if it isn't a bullet point.
+    """
+    if following in _ALNUM:
+        return u" "
+    if following is not None and following.isspace():
+        return u""
+    return None
+
+
+def _render_line(line, writer, end):
+    marks, paired = _resolve(line, end)
+    write = writer.out.append
+    for k, (kind, value) in enumerate(line):
+        if kind == TEXT:
+            if value:
+                write(value)
+        elif kind == EMOJI:
+            write(value[0])
+        elif kind == DELIM:
+            if k in paired:
+                write(_PAIRED[value])
+            elif value == "_":
+                writer.underscore()
+            elif value == "*" and marks[k][0] not in ("\\", "|"):
+                write(u"\\*")
+            else:
+                write(value)
+        elif kind == ENTITY:
+            writer.pieces(value[0])
+        elif kind == SHORTCODE:
+            writer.shortcode(value)
+        elif kind == URL_START:
+            writer.boundary()
+            writer.in_url = True
+        elif kind == URL_END:
+            writer.boundary()
+            writer.in_url = False
+        elif kind == BULLET:
+            space = _bullet_space(marks[k][1])
+            write(value if space is None else u"+" + space)
+
+
+def write(tokens, writer):
+    """
+    Write the Markdown for a list of tokens to a nodes.Writer, a line at
+    a time.
+    """
+    line = []
+    for token in tokens:
+        if token[0] == NEWLINE:
+            _render_line(line, writer, u"\n")
+            writer.write(u"\n")
+            line = []
+        else:
+            line.append(token)
+    _render_line(line, writer, None)
+
+
+def render(tokens):
+    """
+    Emit Markdown for a list of tokens in one walk.
+    """
+    writer = nodes.Writer()
+    write(tokens, writer)
+    return writer.getvalue()
+
+
+_SPANS = {"*": nodes.BOLD, "_": nodes.ITALIC, "~": nodes.STRIKE}
+
+
+def _parse_line(line, end, out):
+    marks, paired = _resolve(line, end)
+    append = out.append
+    for k, (kind, value) in enumerate(line):
+        if kind == TEXT:
+            append((nodes.TEXT, value))
+        elif kind == EMOJI:
+            append((nodes.EMOJI, (value[1], value[0])))
+        elif kind == DELIM:
+            if k in paired:
+                append((_SPANS[value], paired[k]))
+            else:
+                append((nodes.TEXT, value))
+        elif kind == ENTITY:
+            append(value[2])
+        elif kind == SHORTCODE:
+            append((nodes.EMOJI, (value, None)))
+        elif kind == URL_START:
+            # The URL's text is in the tokens up to its URL_END.
+            first = stop = k + 1
+            while line[stop][0] != URL_END:
+                stop += 1
+            url = u"".join(token[1] for token in line[first:stop])
+            append((nodes.URL, url))
+        elif kind == URL_END:
+            append((nodes.URL, None))
+        elif kind == BULLET:
+            space = _bullet_space(marks[k][1])
+            if space is None:
+                append((nodes.TEXT, value))
+            else:
+                append((nodes.BULLET, space))
+
+
+def _join_text(parsed):
+    joined = []
+    text = []
+    for node in parsed:
+        if node[0] == nodes.TEXT:
+            text.append(node[1])
+            continue
+        if text:
+            joined.append((nodes.TEXT, u"".join(text)))
+            text = []
+        joined.append(node)
+    if text:
+        joined.append((nodes.TEXT, u"".join(text)))
+    return joined
+
+
+def parse(converter, text):
+    """
+    Parse text into a list of nodes with converter's options, pairing
+    emphasis exactly as render does. See markslack.nodes.
+    """
+    tokens = lex(converter, text)
+    if converter.remove_bad_emoji:
+        drop_bad_emoji(tokens)
+    parsed = []
+    line = []
+    for token in tokens:
+        if token[0] == NEWLINE:
+            _parse_line(line, u"\n", parsed)
+            parsed.append((nodes.TEXT, u"\n"))
+            line = []
+        else:
+            line.append(token)
+    _parse_line(line, None, parsed)
+    # Empty text is left where dropped shortcodes and whitespace were.
+    return [node for node in _join_text(parsed) if node != (nodes.TEXT, u"")]
+
+
+def render_basic(tokens):
+    """
+    Emit Markdown for a list of tokens without pairing emphasis: every
+    asterisk, underscore and tilde outside a URL is escaped, so the text
+    reads as it was written. Entities, emoji and URLs are kept.
+    """
+    out = []
+    write = out.append
+    in_url = False
+    for kind, value in tokens:
+        if kind == DELIM:
+            write(value if in_url else u"\\" + value)
+        elif kind == ENTITY:
+            for piece in value[0]:
+                if piece is nodes.UNDERSCORE:
+                    write(u"\\_")
+                elif piece is not BREAK:
+                    write(piece)
+        elif kind == EMOJI:
+            write(value[0])
+        elif kind == URL_START:
+            in_url = True
+        elif kind == URL_END:
+            in_url = False
+        else:
+            write(value)
+    return u"".join(out)
+
+
+def prepare(converter, text, recorder=None):
+    """
+    Lex text with converter's options, dropping bad emoji if it removes
+    them, ready for render() or render_basic(). If a stats Recorder is
+    given, this is timed as the lex pass, which counts the entities,
+    emoji and URLs it finds as substitutions.
+    """
+    if recorder is None:
+        tokens = lex(converter, text)
+        if converter.remove_bad_emoji:
+            drop_bad_emoji(tokens)
+        return tokens
+
+    start = timer()
+    tokens = lex(converter, text)
+    if converter.remove_bad_emoji:
+        drop_bad_emoji(tokens)
+    count = sum(1 for kind, _ in tokens if kind in _SUBSTITUTED)
+    recorder.record("lex", timer() - start, count)
+    return tokens
+
+
+def finish(tokens, recorder=None):
+    """
+    Render tokens from prepare(), timed as the render pass if a stats
+    Recorder is given.
+    """
+    if recorder is None:
+        return render(tokens)
+    start = timer()
+    markdown = render(tokens)
+    recorder.record("render", timer() - start, 0)
+    return markdown
+
+
+def mark(converter, text, recorder=None):
+    """
+    Convert text with converter's options. If a stats Recorder is given,
+    the lex and render passes are timed.
+    """
+    return finish(prepare(converter, text, recorder), recorder)
@@ -0,0 +1,524 @@
+"""
+A linear-time recognizer for ``patterns.url_pattern``.
+
+url_pattern nests quantified groups, so the regex engine backtracks
+exponentially on long runs of URL punctuation, and quadratically on long
+dotted or hyphenated words that never become a URL. A Scanner finds the
+same matches re would, by following the order in which re tries the
+pattern's alternatives, but it looks at each character a bounded number
+of times and remembers what it has worked out about a text.
+
+The rule re ends up applying is: a URL runs through alternating runs of
+URL characters and parenthesized runs, but never includes a closing
+parenthesis, unless it has to in order to end on a character other than
+trailing punctuation.
+"""
+import re
+
+from markslack.patterns import LazyPattern
+
+
+# Characters that may appear in the body of a URL, besides parentheses.
+_run_re = LazyPattern(r"[^\s()<>|]*")
+# Everything up to the end of a bracketed URL.
+_extent_re = LazyPattern(r"[^\s<>|]*")
+_closing_re = LazyPattern(r"\)*")
+_slashes_re = LazyPattern(r"/{0,3}")
+_word_re = LazyPattern(r"\w", re.U)
+_letter_re = LazyPattern(r"[a-z]", re.I)
+_scheme_re = LazyPattern(r"[\w-]*")
+_opaque_re = LazyPattern(r"[a-z0-9%]", re.I)
+_www_re = LazyPattern(r"www\d{0,3}[.]", re.I)
+_host_re = LazyPattern(r"[a-z0-9.\-]*", re.I)
+_tld_re = LazyPattern(r"[.][a-z]{2,4}/", re.I)
+# Where url_pattern's three kinds of prefix give themselves away: a
+# scheme's colon, "www." or the dot before a top-level domain.
+_anchor_re = LazyPattern(
+    r"(?=[:w.])(?:"
+    r"(?P<colon>:)(?<=[\w-][\w-]:)(?=/|[a-z0-9%])"
+    r"|(?P<www>w)(?=ww\d{0,3}[.])"
+    r"|(?P<tld>[.])(?=[a-z]{2,4}/))",
+    re.I,
+)
+# How far past its first character _anchor_re looks to match an anchor.
+_REACH = len(u"www999.")
+# url_pattern without its parenthesized groups, which is what it comes
+# down to in text without parentheses. With nothing nested, matching it
+# at one position takes time linear in the run of URL characters there.
+_plain_re = LazyPattern(
+    r"\b(?:[a-z][\w-]+:(?:/{1,3}|[a-z0-9%])|www\d{0,3}[.]|[a-z0-9.\-]+[.]"
+    r"[a-z]{2,4}/)[^\s()<>|]+"
+    r"""[^\s`!()\[\]{};:'".,<>|?«»“”‘’]""",
+    re.I,
+)
+_label_re = LazyPattern(r"\[([\w ']+?)\]<")
+
+# URL characters a URL can't end on.
+_TRAILING = frozenset(u"`![]{};:'\".,?«»“”‘’")
+
+
+class Scanner(object):
+    """
+    Find URLs in one text. Scanners cache what they learn about their
+    text, so use one per text and reuse it for every lookup in it.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self._run = (0, 0)
+        self._trailing = {}
+        self._tails = {}
+        self._bodies = {}
+        self._schemes = {}
+        self._reversed = None
+        self._hosts = {}
+
+    def _run_end(self, pos):
+        start, end = self._run
+        if start <= pos < end:
+            return end
+        end = _run_re.match(self.text, pos).end()
+        if end > pos:
+            self._run = (pos, end)
+        return end
+
+    def _last_end(self, start, end):
+        """
+        Return the end of the last character in text[start:end], part of
+        a run of URL characters, that a URL can end on, or -1.
+        """
+        count = self._trailing.get(end)
+        if count is None:
+            text = self.text
+            i = end - 1
+            while i >= 0 and text[i] in _TRAILING:
+                i -= 1
+            count = self._trailing[end] = end - 1 - i
+        last = end - count
+        return last if last > start else -1
+
+    def _boundary(self, pos):
+        text = self.text
+        before = pos > 0 and _word_re.match(text, pos - 1) is not None
+        return before != (_word_re.match(text, pos) is not None)
+
+    def _body(self, pos):
+        """
+        Return where the URL body starting at pos ends, or -1.
+
+        Each step either moves on to the next run or gives a result.
+        A step can also leave a fallback, which is the result if every
+        later step fails.
+        """
+        found = self._bodies.get(pos)
+        if found is not None:
+            return found
+        text = self.text
+        if not text.startswith(u"(", pos):
+            # Most bodies are one run of URL characters.
+            end = self._run_end(pos)
+            if not text.startswith(u"(", end):
+                found = self._last_end(pos + 1, end) if end > pos else -1
+                self._bodies[pos] = found
+                return found
+        size = len(text)
+        tails = self._tails
+        steps = []
+        result = -1
+        first = True
+        i = pos
+        while True:
+            if not first and i in tails:
+                result = tails[i]
+                break
+            char = text[i] if i < size else u""
+            if char == u"(":
+                end = self._run_end(i + 1)
+                if end == i + 1:
+                    break
+                last = self._last_end(i + 2, end)
+                # The first run of a body can't also be its final group.
+                own = -1 if first else end
+                after = text[end] if end < size else u""
+                if after == u"(":
+                    steps.append((i, first, own if last < 0 else last))
+                    i = end
+                elif after == u")":
+                    if last >= 0:
+                        steps.append((i, first, last))
+                        break
+                    steps.append((i, first, own))
+                    i = _closing_re.match(text, end).end()
+                else:
+                    steps.append((i, first, own if last < 0 else last))
+                    break
+            else:
+                end = self._run_end(i)
+                if end == i:
+                    break
+                steps.append(
+                    (i, first, self._last_end(i + 1 if first else i, end))
+                )
+                i = end
+            first = False
+
+        for i, first, fallback in reversed(steps):
+            if result < 0:
+                result = fallback
+            if not first:
+                tails[i] = result
+        self._bodies[pos] = result
+        return result
+
+    def _scheme(self, pos):
+        """
+        Match ``[a-z][\\w-]+:(?:/{1,3}|[a-z0-9%])`` and the body after it.
+        """
+        text = self.text
+        if not _letter_re.match(text, pos):
+            return -1
+        colon = _scheme_re.match(text, pos + 1).end()
+        if colon < pos + 2 or not text.startswith(u":", colon):
+            return -1
+        return self._scheme_body(colon)
+
+    def _after_colon(self, colon):
+        """
+        Return where the body can start after a scheme's colon, in the
+        order re tries them.
+        """
+        text = self.text
+        end = _slashes_re.match(text, colon + 1).end()
+        if end > colon + 1:
+            return range(end, colon + 1, -1)
+        if _opaque_re.match(text, colon + 1):
+            return (colon + 2,)
+        return ()
+
+    def _scheme_body(self, colon):
+        found = self._schemes.get(colon)
+        if found is None:
+            found = -1
+            for start in self._after_colon(colon):
+                found = self._body(start)
+                if found >= 0:
+                    break
+            self._schemes[colon] = found
+        return found
+
+    def _www(self, pos):
+        match = _www_re.match(self.text, pos)
+        if match is None:
+            return -1
+        return self._body(match.end())
+
+    def _tld(self, end):
+        """
+        Return the position of the dot before the top-level domain in a
+        host ending at end, or -1.
+        """
+        text = self.text
+        for dot in (end - 3, end - 4, end - 5):
+            if dot >= 0 and text[dot] == u"." and _tld_re.match(text, dot):
+                return dot
+        return -1
+
+    def _host(self, pos):
+        text = self.text
+        end = _host_re.match(text, pos).end()
+        if not text.startswith(u"/", end) or self._tld(end) <= pos:
+            return -1
+        return self._body(end + 1)
+
+    def _prefixes(self, pos):
+        """
+        Yield each position a URL starting at pos can have its body at.
+        """
+        text = self.text
+        if _letter_re.match(text, pos):
+            colon = _scheme_re.match(text, pos + 1).end()
+            if colon >= pos + 2 and text.startswith(u":", colon):
+                for start in self._after_colon(colon):
+                    yield start
+        match = _www_re.match(text, pos)
+        if match is not None:
+            yield match.end()
+        end = _host_re.match(text, pos).end()
+        if text.startswith(u"/", end) and self._tld(end) > pos:
+            yield end + 1
+
+    def _plain(self, start, end):
+        text = self.text
+        return text.find(u"(", start, end) < 0 and (
+            text.find(u")", start, end) < 0
+        )
+
+    def match(self, pos=0):
+        """
+        Return the end of the URL starting at pos, as url_pattern would
+        match it, or None.
+        """
+        if self._plain(pos, _extent_re.match(self.text, pos).end()):
+            found = _plain_re.match(self.text, pos)
+            return None if found is None else found.end()
+        if not self._boundary(pos):
+            return None
+        end = self._scheme(pos)
+        if end < 0:
+            end = self._www(pos)
+        if end < 0:
+            end = self._host(pos)
+        return end if end >= 0 else None
+
+    def _is_body(self, start, end):
+        text = self.text
+        if end <= start or text[start] == u")":
+            return False
+        i = start
+        while i < end:
+            if text[i] == u"(":
+                run = min(self._run_end(i + 1), end)
+                if run == i + 1:
+                    return False
+                i = min(_closing_re.match(text, run).end(), end)
+            else:
+                i = min(self._run_end(i), end)
+                if i < end and text[i] == u")":
+                    return False
+        return True
+
+    def _is_url_body(self, start, end):
+        text = self.text
+        if end - start < 2:
+            return False
+        last = text[end - 1]
+        if (
+            last not in _TRAILING
+            and last not in u"()"
+            and self._is_body(start, end - 1)
+        ):
+            return True
+        paren = text.rfind(u"(", start, end)
+        if paren <= start:
+            return False
+        run = min(self._run_end(paren + 1), end)
+        return (
+            run > paren + 1
+            and _closing_re.match(text, run).end() >= end
+            and self._is_body(start, paren)
+        )
+
+    def fullmatch(self, start, end):
+        """
+        Return whether url_pattern can match exactly text[start:end].
+        """
+        if end > _extent_re.match(self.text, start).end():
+            return False
+        if not self._boundary(start):
+            return False
+        return any(
+            self._is_url_body(body, end) for body in self._prefixes(start)
+        )
+
+    def bracketed(self, start):
+        """
+        Return the end of a URL starting at start and running up to a
+        closing ``>``, as ``<(url_pattern)>`` would match it, or None.
+        """
+        end = _extent_re.match(self.text, start).end()
+        if not self.text.startswith(u">", end):
+            return None
+        if self._plain(start, end):
+            # Any URL here ends on the run's last possible character.
+            found = _plain_re.match(self.text, start)
+            found = found is not None and found.end() == end
+        else:
+            found = self.fullmatch(start, end)
+        return end if found else None
+
+    def _run_start(self, pattern, end, pos):
+        """
+        Return where the run of pattern's characters ending at end
+        starts, looking no further back than pos.
+        """
+        if self._reversed is None:
+            self._reversed = self.text[::-1]
+        back = len(self.text) - end
+        run = pattern.match(self._reversed, back).end() - back
+        return max(pos, end - run)
+
+    def _start(self, pattern, end, pos, letter=False):
+        """
+        Return the first position at or after pos that a URL can start
+        at in the run of pattern's characters ending at end, or -1.
+        """
+        text = self.text
+        for start in range(self._run_start(pattern, end, pos), end):
+            if (not letter or _letter_re.match(text, start)) and (
+                self._boundary(start)
+            ):
+                return start
+        return -1
+
+    def _host_around(self, at, pos):
+        """
+        Return the start of the host name whose run of characters has
+        at in it, and where its body starts, or (-1, -1).
+        """
+        key = (at, pos)
+        found = self._hosts.get(key)
+        if found is None:
+            found = (-1, -1)
+            end = _host_re.match(self.text, at).end()
+            if self.text.startswith(u"/", end):
+                dot = self._tld(end)
+                if dot > at:
+                    found = (self._start(_host_re, dot, pos), end + 1)
+            self._hosts[key] = found
+        return found
+
+    def search(self, pos=0, endpos=None):
+        """
+        Return the (start, end) of the first URL at or after pos, as
+        url_pattern would find it, or None. If endpos is given, only
+        URLs whose scheme, "www." or top-level domain starts before it
+        are looked for.
+        """
+        text = self.text
+        # A URL can only start in the run of characters before one of
+        # these anchors, and the runs don't overlap, so the first anchor
+        # that gives a URL gives the first URL.
+        if endpos is None:
+            anchors = _anchor_re.finditer(text, pos)
+        else:
+            # Stop scanning where the last anchor's lookahead does.
+            anchors = _anchor_re.finditer(text, pos, endpos + _REACH)
+        for anchor in anchors:
+            kind = anchor.lastgroup
+            at = anchor.start()
+            if endpos is not None and at >= endpos:
+                return None
+            if kind == "colon":
+                start = self._start(_scheme_re, at, pos, letter=True)
+                if 0 <= start < at - 1:
+                    end = self._scheme_body(at)
+                    if end >= 0:
+                        return start, end
+            elif kind == "www":
+                # A host name can take in "www." and start before it.
+                start, end = self._host_around(at, pos)
+                if 0 <= start < at:
+                    end = self._body(end)
+                    if end >= 0:
+                        return start, end
+                if self._boundary(at):
+                    end = self._body(_www_re.match(text, at).end())
+                    if end >= 0:
+                        return at, end
+            else:
+                start = self._start(_host_re, at, pos)
+                if start >= 0:
+                    end = self._body(_tld_re.match(text, at).end())
+                    if end >= 0:
+                        return start, end
+        return None
+
+    def finditer(self, pos=0):
+        """
+        Yield the (start, end) of each URL, as re.finditer would.
+        """
+        found = self.search(pos)
+        while found is not None:
+            yield found
+            found = self.search(found[1])
+
+
+def search(text, pos=0):
+    """
+    Return the (start, end) of the first URL in text, or None.
+    """
+    return Scanner(text).search(pos)
+
+
+def split(text):
+    """
+    Split text around its URLs, keeping them, like re.split with
+    ``(url_pattern)``.
+    """
+    pieces = []
+    pos = 0
+    for start, end in Scanner(text).finditer():
+        pieces.append(text[pos:start])
+        pieces.append(text[start:end])
+        pos = end
+    pieces.append(text[pos:])
+    return pieces
+
+
+def opened(text):
+    """
+    Yield (start, end, (url,)) for each URL right after a ``<``, as
+    ``<(url_pattern)`` would find them.
+    """
+    scanner = Scanner(text)
+    bracket = text.find(u"<")
+    while bracket != -1:
+        start = bracket + 1
+        end = scanner.match(start)
+        if end is None:
+            bracket = text.find(u"<", start)
+        else:
+            yield start, end, (text[start:end],)
+            bracket = text.find(u"<", end)
+
+
+def bracketed(text):
+    """
+    Yield (start, end, (url,)) for each ``<url>``, as
+    ``<(url_pattern)>`` would find them.
+    """
+    scanner = Scanner(text)
+    bracket = text.find(u"<")
+    while bracket != -1:
+        start = bracket + 1
+        end = scanner.bracketed(start)
+        if end is None:
+            bracket = text.find(u"<", start)
+        else:
+            yield bracket, end + 1, (text[start:end],)
+            bracket = text.find(u"<", end + 1)
+
+
+def labelled(text):
+    """
+    Yield (start, end, (label, url)) for each markslack link,
+    ``[label]<url>``.
+    """
+    scanner = Scanner(text)
+    match = _label_re.search(text)
+    while match is not None:
+        start = match.end()
+        end = scanner.bracketed(start)
+        if end is None:
+            match = _label_re.search(text, match.start() + 1)
+        else:
+            yield match.start(), end + 1, (match.group(1), text[start:end])
+            match = _label_re.search(text, end + 1)
+
+
+def sub(repl, found, text):
+    """
+    Replace each (start, end, groups) span found in text with
+    repl(*groups), and return the new text and the number of spans
+    replaced, like re.subn.
+    """
+    pieces = []
+    pos = 0
+    for start, end, groups in found:
+        pieces.append(text[pos:start])
+        pieces.append(repl(*groups))
+        pos = end
+    if not pieces:
+        return text, 0
+    pieces.append(text[pos:])
+    return u"".join(pieces), len(pieces) // 2
@@ -0,0 +1,205 @@
+"""
+User templates from a directory too large to load whole.
+
+Pass a UserDirectory as ``user_templates`` and templates are looked up
+through a resolver as users are mentioned, then cached. Batch entry
+points, like mark_many, collect the users mentioned in each chunk of
+messages and resolve them in one lookup before converting the chunk, so
+converting a message costs one dictionary lookup per mention.
+
+A resolver is any callable that takes a list of user IDs and returns a
+mapping of the ones it knows to their templates. SQLiteResolver reads
+them from a SQLite file.
+"""
+import collections
+import threading
+
+from markslack.cache import CacheInfo
+from markslack.patterns import LazyPattern
+from markslack.stats import timer
+
+_mention_re = LazyPattern(r"<@(.+?)>")
+
+
+def mentions(messages):
+    """
+    Return the set of user IDs mentioned in an iterable of messages.
+    """
+    users = set()
+    for message in messages:
+        if u"<@" in message:
+            users.update(_mention_re.findall(message))
+    return users
+
+
+class UserDirectory(object):
+    """
+    Map user IDs to templates found by resolver, caching each answer,
+    including "no such user", for ttl seconds. Past maxsize users, the
+    least recently used are evicted. Safe to share between threads.
+
+    When pickled, for worker processes, the cache is left behind and the
+    resolver goes along, so it must be picklable too.
+    """
+
+    def __init__(self, resolver, maxsize=100000, ttl=3600):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.resolver = resolver
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lookups = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # User ID to (expiry time, template or None)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {
+            "resolver": self.resolver,
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __bool__(self):
+        # An empty directory can still resolve users.
+        return True
+
+    __nonzero__ = __bool__
+
+    def _resolve(self, user_ids, now):
+        found = self.resolver(user_ids)
+        expires = now + self.ttl
+        with self._lock:
+            self.lookups += 1
+            entries = self._entries
+            for user_id in user_ids:
+                entries.pop(user_id, None)
+                entries[user_id] = (expires, found.get(user_id))
+            while len(entries) > self.maxsize:
+                entries.popitem(last=False)
+                self.evictions += 1
+        return found
+
+    def prefetch(self, user_ids):
+        """
+        Resolve the user_ids that aren't cached, or have expired, in one
+        call to the resolver.
+        """
+        now = timer()
+        missing = []
+        with self._lock:
+            entries = self._entries
+            for user_id in set(user_ids):
+                entry = entries.pop(user_id, None)
+                if entry is None or entry[0] <= now:
+                    missing.append(user_id)
+                else:
+                    # Re-inserting moves the entry to the most recent end.
+                    entries[user_id] = entry
+        if missing:
+            self._resolve(missing, now)
+
+    def get(self, user_id, default=None):
+        """
+        Return the template for user_id, or default if the resolver
+        doesn't know it. Users that weren't prefetched are resolved one
+        at a time.
+        """
+        now = timer()
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+            if entry is not None and entry[0] > now:
+                self._entries[user_id] = entry
+                self.hits += 1
+                template = entry[1]
+                return default if template is None else template
+            self.misses += 1
+        template = self._resolve([user_id], now).get(user_id)
+        return default if template is None else template
+
+    def values(self):
+        """
+        Return the templates cached now.
+        """
+        with self._lock:
+            return [
+                template
+                for _, template in self._entries.values()
+                if template is not None
+            ]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def info(self):
+        """
+        Return hit, miss and eviction counts for the cache. lookups
+        counts the calls to the resolver.
+        """
+        with self._lock:
+            return CacheInfo(
+                self.hits,
+                self.misses,
+                self.evictions,
+                self.maxsize,
+                len(self._entries),
+            )
+
+
+class SQLiteResolver(object):
+    """
+    Resolve user IDs from a table in a SQLite database file, by default
+    one made with ``CREATE TABLE users (id TEXT PRIMARY KEY, template
+    TEXT)``. The file is opened on first use in each process.
+    """
+
+    # Bound parameters per query, under SQLite's default limit of 999.
+    BATCH_SIZE = 500
+
+    def __init__(
+        self, path, table="users", id_column="id", template_column="template"
+    ):
+        self.path = path
+        self.table = table
+        self.id_column = id_column
+        self.template_column = template_column
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["_connection"], state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def __call__(self, user_ids):
+        query = u'SELECT "{0}", "{1}" FROM "{2}" WHERE "{0}" IN ({{0}})'
+        query = query.format(self.id_column, self.template_column, self.table)
+        found = {}
+        with self._lock:
+            if self._connection is None:
+                # Imported here, since most converters never need it.
+                import sqlite3
+
+                self._connection = sqlite3.connect(
+                    self.path, check_same_thread=False
+                )
+            for start in range(0, len(user_ids), self.BATCH_SIZE):
+                stop = start + self.BATCH_SIZE
+                batch = user_ids[start:stop]
+                marks = u", ".join(u"?" * len(batch))
+                found.update(
+                    self._connection.execute(query.format(marks), batch)
+                )
+        return found
@@ -23,5 +23,11 @@ setup(
     keywords="slack markdown",
     packages=find_packages(exclude=["contrib", "docs", "tests"]),
     install_requires=["emoji"],
+    entry_points={
+        "console_scripts": [
+            "markslack=markslack.cli:main",
+            "markslack-server=markslack.server:main",
+        ]
+    },
     extras_require={"test": ["pytest"]},
 )